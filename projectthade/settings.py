@@ -75,7 +75,8 @@ WSGI_APPLICATION = 'projectthade.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
-db_config = yaml.safe_load(open(BASE_DIR / 'config.yaml'))['DATABASE']
+config = yaml.safe_load(open(BASE_DIR / 'config.yaml'))
+db_config = config['DATABASE']
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -95,6 +96,18 @@ DATABASES = {
 #     }
 # }
 
+# Scraper's HTTP session and rate limit (see config.yaml.example)
+
+SCRAPER = config.get('SCRAPER') or {}
+
+# Trade bots' algorithms registered on top of the built-in ones (see config.yaml.example)
+
+TRADE_BOT = config.get('TRADE_BOT') or {}
+
+# Keeps the tests away from the page and price caches of the database in use
+
+TEST_RUNNER = 'thade.tests.runner.TestRunner'
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -0,0 +1,106 @@
+from threading import Lock
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from projectthade.settings import SCRAPER
+
+COPHIEU68_URL = "https://www.cophieu68.vn"
+
+
+class HttpSession:
+    def __init__(
+        self,
+        base_url: str = COPHIEU68_URL,
+        timeout: float = 10.0,
+        retries: int = 3,
+        backoff_factor: float = 0.5,
+        pool_size: int = 10,
+        verify: bool = False,
+    ):
+        """
+        Keep-alive HTTP session shared by the scraper.
+
+        :param base_url: Where requests to https://www.cophieu68.vn are sent (e.g. a local stand-in server)
+        :param timeout: Seconds to wait for the server to connect or send data
+        :param retries: Retries on connection errors and 429/5xx responses
+        :param backoff_factor: Retries sleep backoff_factor * 2 ** (retry - 1) seconds in between
+        :param pool_size: Connections kept alive per host, should be >= scraping workers
+        :param verify: Verify the server's TLS certificate
+        """
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.verify = verify
+
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=Retry(
+                total=retries,
+                backoff_factor=backoff_factor,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=("GET",),
+                raise_on_status=False,
+            ),
+        )
+        self.session = requests.Session()
+        self.session.headers["Accept-Encoding"] = "gzip, deflate"
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get(self, url: str, headers: dict = None) -> requests.Response:
+        """GET url through the pooled connections"""
+        if url.startswith(COPHIEU68_URL):
+            url = self.base_url + url[len(COPHIEU68_URL) :]
+        return self.session.get(
+            url, headers=headers, timeout=self.timeout, verify=self.verify
+        )
+
+    def close(self):
+        self.session.close()
+
+
+_session = None
+_session_lock = Lock()
+
+
+def _options(**kwargs) -> dict:
+    """HttpSession's arguments from the SCRAPER settings, overridden by kwargs"""
+    options = {
+        "base_url": SCRAPER.get("BASE_URL", COPHIEU68_URL),
+        "timeout": SCRAPER.get("TIMEOUT", 10.0),
+        "retries": SCRAPER.get("RETRIES", 3),
+        "backoff_factor": SCRAPER.get("BACKOFF_FACTOR", 0.5),
+        "pool_size": SCRAPER.get("POOL_SIZE", 10),
+    }
+    options.update(kwargs)
+    return options
+
+
+def configure(**kwargs) -> HttpSession:
+    """
+    Replace the shared session. Keyword arguments override the SCRAPER settings.
+
+    :param kwargs: HttpSession's arguments
+    """
+    global _session
+
+    options = _options(**kwargs)
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = HttpSession(**options)
+    return _session
+
+
+def get_session() -> HttpSession:
+    """Get the shared session, created from the SCRAPER settings on first use"""
+    global _session
+
+    # Scraping workers may ask for it at once, only one of them creates it
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = HttpSession(**_options())
+    return _session
@@ -0,0 +1,177 @@
+import gzip
+import json
+import os
+from hashlib import sha256
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from threading import Lock
+from time import time
+
+from projectthade.settings import BASE_DIR, SCRAPER
+
+
+class CachedPage:
+    def __init__(
+        self, url: str, text: str, fetched_at: float, etag=None, last_modified=None
+    ):
+        """
+        A page stored in PageCache.
+
+        :param url: The fetched url
+        :param text: html source code of the page
+        :param fetched_at: Unix time the page was last fetched or revalidated
+        :param etag: ETag response header, sent back as If-None-Match
+        :param last_modified: Last-Modified response header, sent back as If-Modified-Since
+        """
+        self.url = url
+        self.text = text
+        self.fetched_at = fetched_at
+        self.etag = etag
+        self.last_modified = last_modified
+
+    def validators(self) -> dict:
+        """Headers asking the server to answer 304 if the page did not change"""
+        headers = {}
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class PageCache:
+    def __init__(
+        self, directory: Path, ttl: float = 6 * 3600, max_bytes: int = 256 * 2**20
+    ):
+        """
+        On-disk cache of fetched pages keyed by url, evicting the least recently used pages.
+
+        :param directory: Where pages are stored (one gzipped JSON file per url)
+        :param ttl: Seconds a page may be served without asking the server again
+        :param max_bytes: Size of the directory above which pages are evicted
+        """
+        self.directory = Path(directory)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = Lock()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Running total of the pages' size, counted again by every eviction
+        # (other processes sharing the directory are only seen then)
+        self.size = sum(size for _, size, _ in self._entries())
+
+    def _path(self, url: str) -> Path:
+        return self.directory / "{}.json.gz".format(sha256(url.encode()).hexdigest())
+
+    def get(self, url: str) -> CachedPage:
+        """
+        Get a cached page whether it is fresh or not
+
+        :return: None if the url is not cached
+        """
+        path = self._path(url)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(path)  # Mark as recently used
+        except (FileNotFoundError, EOFError, json.JSONDecodeError):
+            return None
+        return CachedPage(**entry)
+
+    def is_fresh(self, page: CachedPage) -> bool:
+        return time() - page.fetched_at < self.ttl
+
+    def set(self, page: CachedPage):
+        path = self._path(page.url)
+        # Write then rename, readers in other threads/processes never see half a page
+        with NamedTemporaryFile(dir=self.directory, suffix=".tmp", delete=False) as f:
+            with gzip.open(f, "wt", encoding="utf-8") as gz:
+                json.dump(page.__dict__, gz)
+        size = os.path.getsize(f.name)
+        with self.lock:
+            try:
+                replaced_size = path.stat().st_size
+            except FileNotFoundError:
+                replaced_size = 0
+            os.replace(f.name, path)
+            self.size += size - replaced_size
+            if self.size > self.max_bytes:
+                self._evict()
+
+    def revalidated(self, page: CachedPage):
+        """Restart the ttl of a page the server answered 304 Not Modified for"""
+        page.fetched_at = time()
+        self.set(page)
+
+    def _entries(self) -> list:
+        """(mtime, size, path) of the cached pages, without pages being written"""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".tmp"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def evict(self):
+        """Remove the least recently used pages until the cache is under 90% of max_bytes"""
+        with self.lock:
+            self._evict()
+
+    def _evict(self):
+        # With some room left, the next pages are written without scanning the directory
+        entries = self._entries()
+        self.size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, entry_path in sorted(entries):
+            if self.size <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(entry_path)
+            except FileNotFoundError:
+                pass
+            self.size -= entry_size
+
+    def clear(self):
+        with self.lock:
+            for _, _, entry_path in self._entries():
+                os.remove(entry_path)
+            self.size = 0
+
+
+_cache = None
+_configured = False
+_cache_lock = Lock()
+
+
+def configure(**kwargs) -> PageCache:
+    """
+    Replace the shared cache. Keyword arguments override the SCRAPER settings.
+
+    :param kwargs: PageCache's arguments, directory=None disables caching
+    """
+    global _cache, _configured
+
+    options = {
+        "directory": SCRAPER.get("CACHE_DIR", BASE_DIR / ".cache/cophieu68"),
+        "ttl": SCRAPER.get("CACHE_TTL", 6 * 3600),
+        "max_bytes": SCRAPER.get("CACHE_MAX_BYTES", 256 * 2**20),
+    }
+    options.update(kwargs)
+
+    with _cache_lock:
+        if options["directory"] is None:
+            _cache = None
+        else:
+            options["directory"] = BASE_DIR / options["directory"]
+            _cache = PageCache(**options)
+        _configured = True
+    return _cache
+
+
+def get_page_cache() -> PageCache:
+    """Get the shared cache (None if disabled), created from the SCRAPER settings on first use"""
+    if not _configured:
+        configure()
+    return _cache
@@ -0,0 +1,330 @@
+import fcntl
+import json
+import os
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from functools import cached_property
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from threading import Lock
+
+import numpy as np
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import BigIntegerField, Count, F, Func, Max, Sum
+
+from projectthade.settings import BASE_DIR, SCRAPER
+from thade.models import Company
+
+# Record fields cached per company, one column file each
+COLUMNS = {
+    "id": np.dtype(np.int64),
+    "rid": np.dtype("S16"),  # ASCII, Record.rid's max_length
+    "utc_trading_date": np.dtype("datetime64[us]"),
+    "reference_price_vnd": np.dtype(np.int64),
+    "open_vnd": np.dtype(np.int64),
+    "highest_vnd": np.dtype(np.int64),
+    "lowest_vnd": np.dtype(np.int64),
+    "close_vnd": np.dtype(np.int64),
+    "volume": np.dtype(np.int64),
+}
+
+# Hash of a record's cached columns, summed into the checksum of a series
+ROW_HASH = Func(
+    *(F(name) for name in COLUMNS),
+    template="hashtextextended(ROW(%(expressions)s)::text, 0)",
+    output_field=BigIntegerField(),
+)
+
+# Layout of the cached files, caches written with another one are rebuilt
+FORMAT = 2
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def to_datetime64(date: datetime) -> np.datetime64:
+    """Convert an aware datetime to the (UTC, microsecond precision like the database) dtype of utc_trading_date"""
+    return np.datetime64((date - EPOCH) // timedelta(microseconds=1), "us")
+
+
+def to_datetime(date: np.datetime64) -> datetime:
+    """Convert a utc_trading_date back to an aware datetime"""
+    return EPOCH + timedelta(microseconds=int(date.astype(np.int64)))
+
+
+class PriceSeries:
+    def __init__(self, company_id: int, columns: dict, checksum: int = None):
+        """
+        Record ids and OHLCV columns of a company ordered by utc_trading_date (oldest first).
+
+        :param company_id: The company the records belong to
+        :param columns: An array per name of COLUMNS, all of the same length
+        :param checksum: Sum of the ROW_HASH of the records the columns were read from
+        """
+        self.company_id = company_id
+        self.checksum = checksum
+        self.id = columns["id"]
+        self.rid = columns["rid"]
+        self.utc_trading_date = columns["utc_trading_date"]
+        self.reference_price_vnd = columns["reference_price_vnd"]
+        self.open_vnd = columns["open_vnd"]
+        self.highest_vnd = columns["highest_vnd"]
+        self.lowest_vnd = columns["lowest_vnd"]
+        self.close_vnd = columns["close_vnd"]
+        self.volume = columns["volume"]
+
+    @classmethod
+    def from_records(cls, company: Company) -> "PriceSeries":
+        """Load a company's records from the database into memory"""
+        rows = list(
+            company.record_set.order_by("utc_trading_date").values_list(*COLUMNS)
+        )
+        return cls(company.id, to_columns(rows))
+
+    def __len__(self):
+        return len(self.utc_trading_date)
+
+    @cached_property
+    def cumulative_close_vnd(self) -> np.ndarray:
+        """
+        Prefix sums of close_vnd, cumulative_close_vnd[i] is the sum of close_vnd[:i].
+        Computed once and shared by every moving average of the series, whatever its window.
+        """
+        return np.concatenate(([0], np.cumsum(self.close_vnd, dtype=np.int64)))
+
+    def count_until(self, date: datetime) -> int:
+        """Number of records traded on or before date"""
+        return int(
+            np.searchsorted(self.utc_trading_date, to_datetime64(date), side="right")
+        )
+
+    def is_current(self, stats: dict) -> bool:
+        """
+        Whether the series still holds the company's records, short of records edited in place
+        (see PriceCache.verify)
+
+        :param stats: record_stats of the company
+        """
+        if len(self) != stats["count"]:
+            return False
+        elif not len(self):
+            return True
+        newest = to_datetime64(stats["newest"])
+        return (
+            int(self.id.max()) == stats["max_id"]
+            and self.utc_trading_date[-1] == newest
+        )
+
+
+def to_columns(rows: list) -> dict:
+    """Transpose values_list(*COLUMNS) rows into an array per column"""
+    values = list(zip(*rows)) if rows else [()] * len(COLUMNS)
+    columns = {}
+    for (name, dtype), column in zip(COLUMNS.items(), values):
+        if name == "utc_trading_date":
+            column = [to_datetime64(date) for date in column]
+        columns[name] = np.array(column, dtype=dtype)
+    return columns
+
+
+def record_stats(company: Company) -> dict:
+    """Cheap fingerprint of a company's records, compared against PriceSeries.is_current"""
+    return company.record_set.aggregate(
+        count=Count("id"), max_id=Max("id"), newest=Max("utc_trading_date")
+    )
+
+
+def record_checksum(company: Company) -> int:
+    """Sum of the ROW_HASH of a company's records, hashing every row of the company"""
+    return int(company.record_set.aggregate(checksum=Sum(ROW_HASH))["checksum"] or 0)
+
+
+class PriceCache:
+    def __init__(self, directory: Path):
+        """
+        On-disk OHLCV columns per company. Series are memory-mapped read-only,
+        so every process reading a company shares the same pages without going through the ORM.
+
+        :param directory: Where columns are stored (one sub directory per database and company code)
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def company_directory(self, company: Company) -> Path:
+        """Where a company's columns are stored, databases sharing the cache don't share companies"""
+        database = connections[company._state.db or DEFAULT_DB_ALIAS].settings_dict
+        return self.directory / database["NAME"] / company.code
+
+    def _path(self, company: Company, name: str) -> Path:
+        return self.company_directory(company) / name
+
+    @contextmanager
+    def _locked(self, company: Company, exclusive: bool):
+        """Hold the company's file lock, shared by readers and exclusive to writers"""
+        path = self._path(company, "lock")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+
+    def _read_meta(self, company: Company) -> dict:
+        try:
+            with open(self._path(company, "meta.json")) as f:
+                meta = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        # Codes are unique but a company may be deleted then created again
+        if meta["company_id"] != company.id or meta.get("format") != FORMAT:
+            return None
+        return meta
+
+    def _write_meta(self, company: Company, meta: dict):
+        # Write then rename, readers never see half of it
+        path = self._path(company, "meta.json")
+        with NamedTemporaryFile("w", dir=path.parent, suffix=".tmp", delete=False) as f:
+            json.dump(meta, f)
+        os.replace(f.name, path)
+
+    def get(self, company: Company) -> PriceSeries:
+        """
+        Map a company's cached columns whether they are current or not
+
+        :return: None if the company is not cached
+        """
+        with self._locked(company, exclusive=False):
+            meta = self._read_meta(company)
+            if meta is None:
+                return None
+
+            columns = {}
+            for name, dtype in COLUMNS.items():
+                if meta["length"] == 0:
+                    columns[name] = np.empty(
+                        0, dtype=dtype
+                    )  # Empty files can't be mapped
+                else:
+                    # Appends never touch the first length rows, the mapping stays valid
+                    columns[name] = np.memmap(
+                        self._path(company, name),
+                        dtype=dtype,
+                        mode="r",
+                        shape=(meta["length"],),
+                    )
+        return PriceSeries(company.id, columns, meta["checksum"])
+
+    def extend(self, company: Company) -> PriceSeries:
+        """Append the company's records newer than the cached ones, caching all of them if it is not cached"""
+        with self._locked(company, exclusive=True):
+            meta = self._read_meta(company) or {
+                "format": FORMAT,
+                "company_id": company.id,
+                "length": 0,
+                "checksum": 0,
+            }
+
+            records = company.record_set.order_by("utc_trading_date")
+            if meta["length"]:
+                newest = self._newest(company, meta["length"])
+                records = records.filter(utc_trading_date__gt=newest)
+            rows = list(
+                records.annotate(row_hash=ROW_HASH).values_list(*COLUMNS, "row_hash")
+            )
+            columns = to_columns([row[:-1] for row in rows])
+
+            for name, dtype in COLUMNS.items():
+                with open(self._path(company, name), "ab") as f:
+                    # Drop rows of an interrupted append, they are not counted in meta
+                    f.truncate(meta["length"] * dtype.itemsize)
+                    f.write(columns[name].tobytes())
+            meta["length"] += len(rows)
+            meta["checksum"] += sum(row[-1] for row in rows)
+            self._write_meta(company, meta)
+        return self.get(company)
+
+    def _newest(self, company: Company, length: int) -> datetime:
+        """utc_trading_date of the last cached record"""
+        dates = np.memmap(
+            self._path(company, "utc_trading_date"),
+            dtype=COLUMNS["utc_trading_date"],
+            mode="r",
+            shape=(length,),
+        )
+        return to_datetime(dates[-1])
+
+    def load(self, company: Company) -> PriceSeries:
+        """
+        Get a company's series, appending records saved since it was cached
+        and caching it again if records were deleted or inserted before the newest one.
+        Records edited in place are only caught by verify.
+        """
+        stats = record_stats(company)
+        series = self.get(company)
+        if series is not None and series.is_current(stats):
+            return series
+
+        series = self.extend(company)
+        if not series.is_current(stats):
+            self.invalidate(company)
+            series = self.extend(company)
+        return series
+
+    def verify(self, company: Company) -> PriceSeries:
+        """
+        Get a company's series like load, then cache it again if the checksum of the records
+        in database differs from the cached one, e.g. after records were edited in place.
+        Hashes every record of the company, meant to run after writes rather than on every load.
+        """
+        series = self.load(company)
+        if series.checksum != record_checksum(company):
+            self.invalidate(company)
+            series = self.extend(company)
+        return series
+
+    def invalidate(self, company: Company):
+        """Forget a company's columns, processes which mapped them keep their copy"""
+        with self._locked(company, exclusive=True):
+            for name in ("meta.json", *COLUMNS):
+                try:
+                    os.remove(self._path(company, name))
+                except FileNotFoundError:
+                    pass
+
+
+_cache = None
+_configured = False
+_cache_lock = Lock()
+
+
+def configure(**kwargs) -> PriceCache:
+    """
+    Replace the shared cache. Keyword arguments override the SCRAPER settings.
+
+    :param kwargs: PriceCache's arguments, directory=None disables caching
+    """
+    global _cache, _configured
+
+    options = {"directory": SCRAPER.get("PRICE_CACHE_DIR", BASE_DIR / ".cache/prices")}
+    options.update(kwargs)
+
+    with _cache_lock:
+        if options["directory"] is None:
+            _cache = None
+        else:
+            options["directory"] = BASE_DIR / options["directory"]
+            _cache = PriceCache(**options)
+        _configured = True
+    return _cache
+
+
+def get_price_cache() -> PriceCache:
+    """Get the shared cache (None if disabled), created from the SCRAPER settings on first use"""
+    if not _configured:
+        configure()
+    return _cache
+
+
+def load_price_series(company: Company) -> PriceSeries:
+    """Get a company's series from the shared cache, or from the database if caching is disabled"""
+    price_cache = get_price_cache()
+    if price_cache is None:
+        return PriceSeries.from_records(company)
+    return price_cache.load(company)
@@ -1,18 +1,50 @@
 import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from time import sleep
+from threading import Lock
+from time import monotonic, sleep, time
 
-import requests
-from bs4 import BeautifulSoup, element
+import lxml.html
+from bs4 import BeautifulSoup
+from django.db import transaction
 from django.utils import timezone
 
-from projectthade.settings import HCM_TZ
+from projectthade.settings import HCM_TZ, SCRAPER
+from thade.backtesting.http_session import get_session
+from thade.backtesting.page_cache import CachedPage, get_page_cache
+from thade.backtesting.price_cache import get_price_cache
+from thade.instrumentation import phase
 from thade.models import Bot, Company, Record
 
 
-def make_soup(url: str) -> BeautifulSoup:
+class RateLimiter:
+    def __init__(self, interval: float):
+        """
+        Space out requests made from any thread by at least interval seconds.
+
+        :param interval: Minimum number of seconds between two requests
+        """
+        self.interval = interval
+        self.lock = Lock()
+        self.next_request = 0.0
+
+    def wait(self):
+        """Block until the caller is allowed to send its request"""
+        with self.lock:
+            now = monotonic()
+            request_at = max(now, self.next_request)
+            self.next_request = request_at + self.interval
+        sleep(request_at - now)
+
+
+# Shared by every company scraped in this process
+RATE_LIMITER = RateLimiter(interval=SCRAPER.get("REQUEST_INTERVAL", 1.0))
+
+
+def request_page(url: str) -> str:
     """
-    Fetch html source code from url and Parse to Beautiful soup
+    Fetch html source code from url
 
     :param url: must be from "www.cophieu68.vn/..."
     """
@@ -29,10 +61,47 @@ def make_soup(url: str) -> BeautifulSoup:
             + url
         )
 
-    response = requests.get(url, verify=False)
+    # Serve fresh pages from disk and revalidate stale ones with the server.
+    # History pages gain a row every trading day (rows shift to the next pages),
+    # they are always revalidated.
+    page_cache = get_page_cache()
+    cached_page = None if page_cache is None else page_cache.get(url)
+    if (
+        cached_page is not None
+        and not match_his_price
+        and page_cache.is_fresh(cached_page)
+    ):
+        return cached_page.text
+
+    RATE_LIMITER.wait()
+    response = get_session().get(
+        url, headers=None if cached_page is None else cached_page.validators()
+    )
+    if response.status_code == 304 and cached_page is not None:
+        page_cache.revalidated(cached_page)
+        return cached_page.text
+
     response.encoding = "utf-8"
+    if page_cache is not None and response.ok:
+        page_cache.set(
+            CachedPage(
+                url,
+                response.text,
+                fetched_at=time(),
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+            )
+        )
+    return response.text
+
 
-    soup = BeautifulSoup(response.text, "lxml")
+def make_soup(url: str) -> BeautifulSoup:
+    """
+    Fetch html source code from url and Parse to Beautiful soup
+
+    :param url: must be from "www.cophieu68.vn/..."
+    """
+    soup = BeautifulSoup(request_page(url), "lxml")
     if soup.title is None:
         raise Exception(
             "Given url doesn't fit scraping structure (Probably due to invalid company code): "
@@ -42,45 +111,116 @@ def make_soup(url: str) -> BeautifulSoup:
     return soup
 
 
-def request_records(company_instance: Company, last_update: datetime = None):
-    """Scrape and add new records to SQL session"""
-    page_number = 1
+def request_records(company_instance: Company, last_update: datetime = None, workers=4):
+    """
+    Scrape and add new records to SQL session
+
+    :param company_instance: The company to scrape records for
+    :param last_update: Stop at the first record which is not newer than this date
+    :param workers: Number of history pages downloaded and parsed concurrently
+    """
     rows_added = 0
-    is_adding = True
+    next_page = 1
+    executor = ThreadPoolExecutor(max_workers=workers)
+    pending = deque()
+    # Incremental updates usually end on the first page, the next ones are prefetched
+    # only once a page turns out to be newer than last_update as a whole
+    in_flight = workers if last_update is None else 1
+    try:
+        is_adding = True
+        while is_adding:
+            # Keep a page in flight per worker, pages are still saved in order
+            while len(pending) < in_flight:
+                pending.append(
+                    executor.submit(request_history_rows, company_instance, next_page)
+                )
+                next_page += 1
+
+            is_adding = False
+            records = []
+            # Pages are downloaded and parsed by the workers, this is the time left waiting for them
+            with phase("scraper.wait_history_page") as stats:
+                rows = pending.popleft().result()
+                stats.rows += len(rows)
+            with phase("scraper.parse_records") as stats:
+                for stripped_strings in rows:
+                    record = parse_record(
+                        stripped_strings, company_instance, last_update
+                    )
+                    is_adding = record is not None
+                    if is_adding:
+                        records.append(record)
+                    else:
+                        break
+                stats.rows += len(records)
+
+            rows_added += save_records(records)
+            in_flight = workers
+    finally:
+        executor.shutdown(cancel_futures=True)
 
-    while is_adding:
-        print(f"Current {company_instance.code} page number: {page_number}")
-        url = f"https://www.cophieu68.vn/historyprice.php?currentPage={page_number}&id={company_instance.code}"
+    print("{} {} record(s) added".format(rows_added, company_instance.code))
 
-        soup = make_soup(url)
 
-        stock_history = soup.select_one("table[class='stock']")
-        cursor = stock_history.tr
+def request_history_rows(company_instance: Company, page_number: int) -> list:
+    """Scrape a history price page into the stripped strings of its record rows"""
+    print(f"Current {company_instance.code} page number: {page_number}")
+    url = f"https://www.cophieu68.vn/historyprice.php?currentPage={page_number}&id={company_instance.code}"
 
-        is_adding = False
-        while cursor is not None:
-            # Condition to skip table Header and Label for additional info on ngày giao dịch không hưởng quyền
-            if type(cursor) is not element.NavigableString and len(cursor.attrs) == 0:
-                is_adding = parse_and_save_record(
-                    cursor.stripped_strings, company_instance, last_update
-                )
-                if is_adding:
-                    rows_added += 1
-                else:
-                    break
+    rows = parse_history_rows(request_page(url))
+    if rows is None:
+        raise Exception(
+            "Given url doesn't fit scraping structure (Probably due to invalid company code): "
+            + url
+        )
 
-            cursor = cursor.next_sibling
+    return rows
 
-        page_number += 1
-        sleep(1)
 
-    print("{} {} record(s) added".format(rows_added, company_instance.code))
+def parse_history_rows(page: str) -> list:
+    """
+    Extract the record rows of a history price page without building a soup
+
+    :param page: html source code of "www.cophieu68.vn/historyprice.php?..."
+    :return: A tuple of stripped strings per record row, None if the page doesn't fit scraping structure
+    """
+    tree = lxml.html.fromstring(page)
+    if tree.find(".//title") is None:
+        return None
+
+    stock_history = tree.xpath("(//table[@class='stock'])[1]")
+    if not stock_history:
+        return None
+
+    # Skip table Header and Label for additional info on ngày giao dịch không hưởng quyền
+    return [
+        tuple(text.strip() for text in row.itertext() if text.strip())
+        for row in stock_history[0].xpath("./tr[not(@*)] | ./tbody/tr[not(@*)]")
+    ]
 
 
 def parse_and_save_record(
     stripped_strings, company_instance: Company, last_update: datetime = None
 ) -> bool:
     """Parse stripped string to initialize Record instance and add new instance to SQLSession"""
+    with phase("scraper.parse_and_save_record") as stats:
+        record = parse_record(stripped_strings, company_instance, last_update)
+        if record is None:
+            return False
+
+        record.save()
+        stats.rows += 1
+    return True
+
+
+def parse_record(
+    stripped_strings, company_instance: Company, last_update: datetime = None
+) -> Record:
+    """
+    Parse stripped string to initialize an unsaved Record instance
+
+    :return: None if the record is not newer than last_update
+    """
     raw_data = list(stripped_strings)
 
     # VN Market opens at 09:00:00+07:00
@@ -92,7 +232,7 @@ def parse_and_save_record(
 
     # Exit if the fetched record is already the latest
     if last_update is not None and utc_trading_date <= last_update:
-        return False
+        return None
 
     rid = "{}{:%Y%m%d}".format(
         company_instance.code, utc_trading_date
@@ -104,7 +244,7 @@ def parse_and_save_record(
     highest_vnd = int(float(raw_data[8]) * 1000)
     lowest_vnd = int(float(raw_data[9]) * 1000)
 
-    record = Record(
+    return Record(
         company=company_instance,
         rid=rid,
         utc_trading_date=utc_trading_date,
@@ -116,8 +256,26 @@ def parse_and_save_record(
         lowest_vnd=lowest_vnd,
     )
 
-    record.save()
-    return True
+
+def save_records(records: list, batch_size=1000) -> int:
+    """
+    Insert parsed records in bulk within a single transaction.
+    Records whose rid (or company and utc_trading_date) already exists in database are skipped.
+
+    :param records: Unsaved Record instances
+    :param batch_size: Number of rows per INSERT statement
+    :return: Number of records inserted
+    """
+    # ignore_conflicts doesn't tell which rows were inserted, they are counted instead
+    saved = Record.objects.filter(rid__in=[record.rid for record in records])
+    with phase("scraper.save_records") as stats, transaction.atomic():
+        existing = saved.count()
+        Record.objects.bulk_create(
+            records, batch_size=batch_size, ignore_conflicts=True
+        )
+        inserted = saved.count() - existing
+        stats.rows += inserted
+    return inserted
 
 
 def request_company_desc(company_instance: Company):
@@ -164,11 +322,7 @@ def fetch_records(company_instance: Company):
 
     :param company_instance: The company to fetch records for.
     """
-    latest_record = (
-        Record.objects.filter(company__code__exact=company_instance.code)
-        .order_by("-utc_trading_date")
-        .first()
-    )
+    latest_record = company_instance.record_set.order_by("-utc_trading_date").first()
     if latest_record is None:
         last_update = None
     else:
@@ -179,14 +333,25 @@ def fetch_records(company_instance: Company):
                 "The latest record is not timezone aware: {}", latest_record
             )
 
-    request_records(company_instance, last_update)
+    with phase("scraper.request_records"):
+        request_records(company_instance, last_update)
     company_instance.last_records_fetched = timezone.now()
     company_instance.save()
 
+    # Append the new records to the company's price series, checking the cached ones
+    price_cache = get_price_cache()
+    if price_cache is not None:
+        with phase("price_cache.verify"):
+            price_cache.verify(company_instance)
+
 
 def clear_records(company_instance: Company):
     company_instance.record_set.all().delete()
 
+    price_cache = get_price_cache()
+    if price_cache is not None:
+        price_cache.invalidate(company_instance)
+
 
 def update_records(company_code: str, clear=False):
     """
@@ -0,0 +1,183 @@
+import csv
+import gzip
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from decimal import Decimal
+from itertools import product
+
+from django.db import connections
+from django.utils import timezone
+
+from thade.backtesting.price_cache import load_price_series
+from thade.backtesting.vectorized import (
+    backtest_moving_average,
+    moving_average_signals,
+    start_index,
+)
+from thade.models import Company
+from thade.trade_bot.runner import init_worker
+
+# Columns of every row yielded by sweep() and written by write_sweep()
+FIELDS = (
+    "company",
+    "short_window",
+    "long_window",
+    "stocks_per_trade",
+    "fee",
+    "deploy_date",
+    "roi",
+    "control_roi",
+    "all_time_min_total_vnd",
+    "all_time_max_total_vnd",
+)
+
+
+def sweep_windows(
+    company_id: int,
+    company_code: str,
+    windows: list,
+    combinations: list,
+    balance_vnd: Decimal,
+) -> list:
+    """
+    Backtest one company and some pairs of windows for every combination of the other parameters.
+    Every pair reads its means off the series' cumulative sum, and its signals are computed once
+    and shared by every combination.
+
+    :param company_id: Primary key of the company
+    :param company_code: Code of the company (names its price cache)
+    :param windows: (short_window, long_window) pairs of the moving averages
+    :param combinations: (stocks_per_trade, fee, deploy_date) tuples
+    :param balance_vnd: The Balance every backtest starts with (VND)
+    :return: A row of FIELDS per pair and combination, roi is None if there is nothing to backtest
+    """
+    prices = load_price_series(Company(id=company_id, code=company_code))
+
+    rows = []
+    for short_window, long_window in windows:
+        signals = moving_average_signals(
+            prices.close_vnd, short_window, long_window, prices.cumulative_close_vnd
+        )
+        for stocks_per_trade, fee, deploy_date in combinations:
+            row = [
+                company_code,
+                short_window,
+                long_window,
+                stocks_per_trade,
+                fee,
+                deploy_date.isoformat(),
+            ]
+            try:
+                result = backtest_moving_average(
+                    prices.close_vnd,
+                    balance_vnd=balance_vnd,
+                    fee=fee,
+                    stocks_per_trade=stocks_per_trade,
+                    start=start_index(prices, deploy_date),
+                    short_window=short_window,
+                    long_window=long_window,
+                    signals=signals,
+                )
+            except UserWarning:
+                row += [None, None, None, None]
+            else:
+                row += [
+                    round(result.roi, 4),
+                    round(result.control_roi, 4),
+                    round(result.all_time_min_total_vnd, 1),
+                    round(result.all_time_max_total_vnd, 1),
+                ]
+            rows.append(tuple(row))
+    return rows
+
+
+def sweep(
+    companies,
+    short_windows=(50,),
+    long_windows=(200,),
+    stocks_per_trade=(50,),
+    fees=(Decimal("0.0035"),),
+    deploy_dates=None,
+    balance_vnd=Decimal(20 * 1000000),
+    workers: int = None,
+):
+    """
+    Backtest MovingAverage over a grid of parameters and companies, spread across processes.
+
+    :param companies: Companies to backtest
+    :param short_windows: Lengths of the short moving average
+    :param long_windows: Lengths of the long moving average (pairs with short >= long are skipped)
+    :param stocks_per_trade: Amounts of stocks to trade on every action
+    :param fees: Trading fees/taxes
+    :param deploy_dates: Aware datetimes the backtests start from (default: 365 days ago)
+    :param balance_vnd: The Balance every backtest starts with (VND)
+    :param workers: Worker processes (default: number of CPUs). Set 0 to backtest in this process
+    :return: Generator of FIELDS rows, yielded as soon as a task of the pool is done
+    """
+    if deploy_dates is None:
+        deploy_dates = (timezone.now() - timezone.timedelta(days=365),)
+    combinations = list(product(stocks_per_trade, fees, deploy_dates))
+    windows = [
+        (short_window, long_window)
+        for short_window, long_window in product(short_windows, long_windows)
+        if short_window < long_window
+    ]
+    companies = list(companies)
+
+    if workers == 0:
+        for company in companies:
+            yield from sweep_windows(
+                company.id, company.code, windows, combinations, balance_vnd
+            )
+        return
+
+    workers = workers or os.cpu_count()
+
+    # Split the pairs of windows of a company only as much as needed to keep the workers busy
+    chunks = min(len(windows), -(-2 * workers // max(len(companies), 1))) or 1
+    tasks = [
+        (company.id, company.code, windows[i::chunks], combinations, balance_vnd)
+        for company in companies
+        for i in range(chunks)
+    ]
+
+    # Forked workers must not inherit and share the parent's connections
+    connections.close_all()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+        pending = set()
+        for task in tasks:
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+            pending.add(executor.submit(sweep_windows, *task))
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+
+
+def write_sweep(rows, path) -> int:
+    """
+    Stream rows of sweep() into a CSV file, gzipped if path ends with .gz
+
+    :return: Number of rows written
+    """
+    path = str(path)
+    opener = gzip.open if path.endswith(".gz") else open
+    count = 0
+    with opener(path, "wt", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDS)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def parse_deploy_date(value: str, tz) -> datetime:
+    """Deploy on YYYY-MM-DD at market open (09:00 in tz)"""
+    return tz.localize(datetime.strptime(value, "%Y-%m-%d").replace(hour=9))
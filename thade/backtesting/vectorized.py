@@ -0,0 +1,239 @@
+from decimal import Decimal
+
+import numpy as np
+
+from thade.backtesting.price_cache import load_price_series
+from thade.models import BotLog, Company
+from thade.trade_bot.Algorithm import Algorithm
+from thade.trade_bot.MovingAverage import MovingAverage
+
+NO_SIGNAL = -1
+
+
+def moving_average_signals(
+    close_vnd: np.ndarray,
+    short_window=MovingAverage.SHORT_WINDOW,
+    long_window=MovingAverage.LONG_WINDOW,
+    cumulative: np.ndarray = None,
+) -> np.ndarray:
+    """
+    Compute MovingAverage's signal for every trading day at once.
+
+    :param close_vnd: Close prices ordered by utc_trading_date (oldest first)
+    :param short_window: Length of the short moving average
+    :param long_window: Length of the long moving average
+    :param cumulative: Prefix sums of close_vnd (PriceSeries.cumulative_close_vnd),
+        pass it to share one pass over the prices between window pairs
+    :return: Algorithm.BUY/Algorithm.SELL per day, NO_SIGNAL while there are fewer
+        than long_window records
+    """
+    if not 0 < short_window < long_window:
+        raise ValueError(
+            f"Windows must satisfy 0 < short < long: {short_window}, {long_window}"
+        )
+    close_vnd = np.asarray(close_vnd, dtype=np.int64)
+    if cumulative is None:
+        cumulative = np.concatenate(([0], np.cumsum(close_vnd)))
+    signals = np.full(len(close_vnd), NO_SIGNAL, dtype=np.int8)
+    if len(close_vnd) < long_window:
+        return signals
+
+    # Means of the windows ending on each day from index long_window - 1 onwards
+    ends = np.arange(long_window, len(close_vnd) + 1)
+    moving_short = (cumulative[ends] - cumulative[ends - short_window]) / short_window
+    moving_long = (cumulative[ends] - cumulative[ends - long_window]) / long_window
+
+    signals[long_window - 1 :] = np.where(
+        moving_short >= moving_long, Algorithm.BUY, Algorithm.SELL
+    )
+    return signals
+
+
+class BacktestResult:
+    def __init__(
+        self,
+        signals: np.ndarray,
+        balance_vnd: np.ndarray,
+        stocks: np.ndarray,
+        control_balance_vnd: np.ndarray,
+        control_stocks: np.ndarray,
+        close_vnd: np.ndarray,
+        investment_vnd: float,
+        all_time_min_total_vnd: float,
+        all_time_max_total_vnd: float,
+    ):
+        """
+        Trajectory of a backtest, one entry per simulated trading day (oldest first).
+
+        :param signals: BotLog.Signal value of every simulated day
+        :param balance_vnd: Balance after every simulated day
+        :param stocks: Held stocks after every simulated day
+        :param control_balance_vnd: BUY and HOLD balance after every simulated day
+        :param control_stocks: BUY and HOLD stocks after every simulated day
+        :param close_vnd: Close price of every simulated day
+        :param investment_vnd: Total investment put into the backtest
+        :param all_time_min_total_vnd: The lowest total reached
+        :param all_time_max_total_vnd: The highest total reached
+        """
+        self.signals = signals
+        self.balance_vnd = balance_vnd
+        self.stocks = stocks
+        self.control_balance_vnd = control_balance_vnd
+        self.control_stocks = control_stocks
+        self.close_vnd = close_vnd
+        self.investment_vnd = investment_vnd
+        self.all_time_min_total_vnd = all_time_min_total_vnd
+        self.all_time_max_total_vnd = all_time_max_total_vnd
+
+    @property
+    def total_vnd(self) -> float:
+        return float(self.balance_vnd[-1] + self.close_vnd[-1] * self.stocks[-1])
+
+    @property
+    def control_total_vnd(self) -> float:
+        return float(
+            self.control_balance_vnd[-1] + self.close_vnd[-1] * self.control_stocks[-1]
+        )
+
+    @property
+    def roi(self) -> float:
+        return (self.total_vnd / self.investment_vnd - 1) * 100
+
+    @property
+    def control_roi(self) -> float:
+        return (self.control_total_vnd / self.investment_vnd - 1) * 100
+
+
+def backtest_moving_average(
+    close_vnd: np.ndarray,
+    balance_vnd,
+    fee,
+    stocks=0,
+    stocks_per_trade=50,
+    start=0,
+    short_window=MovingAverage.SHORT_WINDOW,
+    long_window=MovingAverage.LONG_WINDOW,
+    signals: np.ndarray = None,
+) -> BacktestResult:
+    """
+    Backtest MovingAverage over a whole price history without stepping TradeBot.
+
+    Reproduces TradeBot.run: the bot starts on close_vnd[start] and trades on every
+    following day. Money is tracked as float64, so balances match the Decimal ones
+    of TradeBot.run up to float rounding.
+
+    :param close_vnd: Close prices ordered by utc_trading_date (oldest first)
+    :param balance_vnd: The Balance to start with (VND)
+    :param fee: Trading fee/tax
+    :param stocks: Stocks to start with
+    :param stocks_per_trade: Amount of stocks to trade on every action (BUY/SELL)
+    :param start: Index of the bot's last_updated_record in close_vnd
+    :param short_window: Length of the short moving average
+    :param long_window: Length of the long moving average
+    :param signals: moving_average_signals(close_vnd, short_window, long_window),
+        pass it to share the signals between backtests of the same prices
+    """
+    close_vnd = np.asarray(close_vnd, dtype=np.int64)
+    if start >= len(close_vnd) - 1:
+        raise UserWarning(
+            f"Nothing to backtest after record {start} of {len(close_vnd)} record(s)"
+        )
+
+    if signals is None:
+        signals = moving_average_signals(close_vnd, short_window, long_window)
+    signals = signals[start + 1 :]
+    closes = close_vnd[start + 1 :]
+    buy_rate = 1 + float(fee)
+    sell_rate = 1 - float(fee)
+
+    # Position logic depends on the running balance, so it is a single scalar pass
+    days = len(closes)
+    outcomes = np.empty(days, dtype=object)
+    balance_path = np.empty(days)
+    stocks_path = np.empty(days, dtype=np.int64)
+    control_balance_path = np.empty(days)
+    control_stocks_path = np.empty(days, dtype=np.int64)
+
+    balance = float(balance_vnd)
+    control_balance = balance
+    control_stocks = stocks
+    for day, (signal, close) in enumerate(zip(signals.tolist(), closes.tolist())):
+        if signal == NO_SIGNAL:
+            outcomes[day] = BotLog.Signal.ERR
+        else:
+            if signal == Algorithm.BUY:
+                buy_cost = close * stocks_per_trade * buy_rate
+                if balance >= buy_cost:
+                    balance -= buy_cost
+                    stocks += stocks_per_trade
+                    outcomes[day] = BotLog.Signal.BUY
+                else:
+                    outcomes[day] = BotLog.Signal.NOT_BUY
+            elif stocks >= stocks_per_trade:
+                balance += close * stocks_per_trade * sell_rate
+                stocks -= stocks_per_trade
+                outcomes[day] = BotLog.Signal.SELL
+            else:
+                outcomes[day] = BotLog.Signal.NOT_SELL
+
+            buy_stocks = int(control_balance // (close * buy_rate))
+            control_balance -= buy_stocks * close * buy_rate
+            control_stocks += buy_stocks
+
+        balance_path[day] = balance
+        stocks_path[day] = stocks
+        control_balance_path[day] = control_balance
+        control_stocks_path[day] = control_stocks
+
+    # Statistics are only updated on days the algorithm produced a signal
+    traded = signals != NO_SIGNAL
+    totals = balance_path[traded] + closes[traded] * stocks_path[traded]
+    all_time_min_total_vnd = float(np.min(totals, initial=float(balance_vnd)))
+    all_time_max_total_vnd = float(np.max(totals, initial=float(balance_vnd)))
+
+    return BacktestResult(
+        signals=outcomes,
+        balance_vnd=balance_path,
+        stocks=stocks_path,
+        control_balance_vnd=control_balance_path,
+        control_stocks=control_stocks_path,
+        close_vnd=closes,
+        investment_vnd=float(balance_vnd),
+        all_time_min_total_vnd=all_time_min_total_vnd,
+        all_time_max_total_vnd=all_time_max_total_vnd,
+    )
+
+
+def start_index(prices, deploy_date) -> int:
+    """Index of the record nearest to deploy_date (or the first one), where TradeBot would start"""
+    return max(prices.count_until(deploy_date) - 1, 0)
+
+
+def backtest_company(
+    company: Company,
+    deploy_date,
+    balance_vnd=Decimal(20 * 1000000),
+    fee=Decimal(0.0035),
+    stocks=0,
+    stocks_per_trade=50,
+    short_window=MovingAverage.SHORT_WINDOW,
+    long_window=MovingAverage.LONG_WINDOW,
+) -> BacktestResult:
+    """Backtest MovingAverage on a company's records from deploy_date until its newest record"""
+    prices = load_price_series(company)
+    if not len(prices):
+        raise UserWarning(f"{company} has no records to backtest")
+
+    return backtest_moving_average(
+        prices.close_vnd,
+        balance_vnd=balance_vnd,
+        fee=fee,
+        stocks=stocks,
+        stocks_per_trade=stocks_per_trade,
+        start=start_index(prices, deploy_date),
+        short_window=short_window,
+        long_window=long_window,
+        signals=moving_average_signals(
+            prices.close_vnd, short_window, long_window, prices.cumulative_close_vnd
+        ),
+    )
@@ -0,0 +1,188 @@
+import os
+from contextlib import contextmanager, redirect_stdout
+from decimal import Decimal
+from glob import glob
+from tempfile import TemporaryDirectory
+from timeit import default_timer, repeat
+
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from projectthade.settings import BASE_DIR
+from thade.backtesting import price_cache
+from thade.benchmarks.record_queries import SEED_CODE, Rollback
+from thade.models import Bot, Company
+from thade.tests.models_factory import CompanyFactory, RecordFactory, seed
+from thade.trade_bot.CompanySeries import CompanySeries
+from thade.trade_bot.MovingAverage import MovingAverage
+from thade.trade_bot.TradeBot import TradeBot, get_trade_bot, get_trade_bots
+
+
+@contextmanager
+def isolated():
+    """
+    Roll seeded rows back, cache prices in a throwaway directory
+    and silence the logs TradeBot prints or writes before bots are tracked
+    """
+    with TemporaryDirectory() as directory, open(os.devnull, "w") as devnull:
+        price_cache.configure(directory=directory)
+        try:
+            with redirect_stdout(devnull), transaction.atomic():
+                yield
+                raise Rollback
+        except Rollback:
+            pass
+        finally:
+            price_cache.configure()
+            for path in glob(str(BASE_DIR / "thade/trade_bot/logs/Benchmark*_*.txt")):
+                os.remove(path)
+
+
+def seed_company(number=0) -> Company:
+    """A fake company of the rolled back transaction, its code can't be a real ticker"""
+    return CompanyFactory(code=SEED_CODE.format(number))
+
+
+def fixture_company() -> Company:
+    """A company with the records of records_fixture, one per day until today"""
+    from thade.tests.records_fixture import close_records
+
+    company = seed_company()
+    today = timezone.now().replace(hour=2, minute=0, second=0, microsecond=0)
+    for i, close_record in enumerate(close_records):
+        RecordFactory(
+            company=company,
+            close_vnd=close_record,
+            utc_trading_date=today - timezone.timedelta(days=i),
+        )
+    return company
+
+
+def deploy(company: Company, days: int) -> TradeBot:
+    bot = TradeBot(
+        name="Benchmark",
+        balance_vnd=Decimal(200 * 1000000),
+        company=company,
+        fee=Decimal("0.0035"),
+        algorithm=MovingAverage(),
+        deploy_date=timezone.now() - timezone.timedelta(days=days),
+    )
+    bot.track()
+    bot.toggle()
+    return bot
+
+
+def bench_trade_bot_run(days=(50, 150, 300), rounds=3) -> dict:
+    """
+    Time TradeBot.run catching a freshly deployed bot up on records_fixture.
+    Every round deploys a new bot, seeded rows and logs are rolled back.
+
+    :param days: Days between the deploy date and today, one result each
+    :param rounds: Rounds to take the best of
+    :return: Best seconds per run and per caught up day
+    """
+    results = {}
+    with isolated():
+        company = fixture_company()
+        for replay in (True, False):
+            for n in days:
+                timings = []
+                for _ in range(rounds):
+                    bot = deploy(company, n)
+                    started = default_timer()
+                    bot.run(replay=replay)
+                    timings.append(default_timer() - started)
+                    bot.model.delete()
+                best = min(timings)
+                mode = "replay" if replay else "query_each_day"
+                results[f"trade_bot_run.{mode}.{n}"] = {
+                    "seconds": best,
+                    "seconds_per_day": best / n,
+                }
+    return results
+
+
+def bench_moving_average_step(steps=300, rounds=3) -> dict:
+    """
+    Time one MovingAverage step (feed, action) on every kind of data it accepts.
+
+    :param steps: Consecutive trading days stepped through per round
+    :param rounds: Rounds to take the best of
+    :return: Best seconds per step of each kind of data
+    """
+    results = {}
+    with isolated():
+        company = fixture_company()
+        company_series = CompanySeries(company)
+        prices = company_series.prices
+        bars = company_series.bars
+        records = company.record_set.order_by("utc_trading_date")
+        dates = [bar.utc_trading_date for bar in bars[-steps:]]
+        ends = range(len(bars) - steps + 1, len(bars) + 1)
+
+        def step_series(series):
+            moving_average = MovingAverage()
+            for end in ends:
+                moving_average.update_series(series, end)
+                moving_average.action()
+
+        def step_queryset():
+            moving_average = MovingAverage()
+            for date in dates:
+                moving_average.update_data(records.filter(utc_trading_date__lte=date))
+                moving_average.action()
+
+        for name, step in (
+            ("price_series", lambda: step_series(prices)),
+            ("bars", lambda: step_series(bars)),
+            ("queryset", step_queryset),
+        ):
+            best = min(repeat(step, number=1, repeat=rounds))
+            results[f"moving_average_step.{name}"] = {"seconds_per_step": best / steps}
+    return results
+
+
+def bench_get_trade_bot(bots=20, number=5) -> dict:
+    """
+    Time get_trade_bot rebuilding tracked bots from their models and last logs one by one,
+    then get_trade_bots rebuilding them all at once.
+
+    :param bots: Bots tracked on a seeded company
+    :param number: Times every bot is rebuilt per round
+    :return: Best seconds per bot, and the queries of get_trade_bots
+    """
+    results = {}
+    with isolated():
+        company = seed(records=300, days_from_now=1, company=seed_company())
+        models = []
+        for i in range(bots):
+            bot = TradeBot(
+                name=f"Benchmark{i}",
+                balance_vnd=Decimal(200 * 1000000),
+                company=company,
+                fee=Decimal("0.0035"),
+                algorithm=MovingAverage(),
+                deploy_date=timezone.now() - timezone.timedelta(days=100),
+            )
+            bot.track()
+            models.append(bot.model)
+
+        best = min(
+            repeat(
+                lambda: [get_trade_bot(model) for model in models],
+                number=number,
+                repeat=3,
+            )
+        )
+        results["get_trade_bot"] = {"seconds_per_bot": best / number / bots}
+
+        bot_models = Bot.objects.filter(id__in=[model.id for model in models])
+        best = min(repeat(lambda: get_trade_bots(bot_models), number=number, repeat=3))
+        with CaptureQueriesContext(connection) as queries:
+            get_trade_bots(bot_models)
+        results["get_trade_bots"] = {
+            "seconds_per_bot": best / number / bots,
+            "queries": len(queries),
+        }
+    return results
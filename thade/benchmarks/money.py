@@ -0,0 +1,54 @@
+from decimal import Decimal
+from timeit import repeat
+
+from thade.benchmarks.engine import isolated
+from thade.benchmarks.record_queries import seed_records
+from thade.trade_bot.Algorithm import Algorithm
+from thade.trade_bot.TradeBot import TradeBot
+
+
+def trade(bot: TradeBot, records: list, signals: list):
+    """The money math of TradeBot._act, without logging"""
+    for record, signal in zip(records, signals):
+        bot.last_updated_record = record
+        bot.action(signal)
+        bot.statistics()
+
+
+def bench_money(records=5000, number=5) -> dict:
+    """
+    Time TradeBot.action and statistics with Decimal and fixed-point money.
+    The seeded company and bot are rolled back.
+
+    :param records: Trading days traded per round
+    :param number: Times the days are traded per round
+    :return: Best seconds per trading day of each mode
+    """
+    results = {}
+    with isolated():
+        company = seed_records(1, records)[0]
+        series = list(company.record_set.order_by("utc_trading_date"))
+        # Runs of BUY then SELL so both branches trade and fail
+        signals = [
+            Algorithm.BUY if day % 40 < 20 else Algorithm.SELL for day in range(records)
+        ]
+        bot = TradeBot(
+            name="Benchmark",
+            balance_vnd=Decimal(200 * 1000000),
+            company=company,
+            fee=Decimal("0.0035"),
+            algorithm=Algorithm(),
+            deploy_date=series[0].utc_trading_date,
+        )
+        bot.track()
+
+        for mode, fixed_point in (("decimal", False), ("fixed_point", True)):
+            if fixed_point:
+                bot._to_fixed_point()
+            best = min(
+                repeat(lambda: trade(bot, series, signals), number=number, repeat=3)
+            )
+            if fixed_point:
+                bot._to_decimal()
+            results[f"money.{mode}"] = {"seconds_per_day": best / number / records}
+    return results
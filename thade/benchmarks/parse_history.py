@@ -0,0 +1,57 @@
+from timeit import repeat
+
+from bs4 import BeautifulSoup, element
+
+from projectthade.settings import BASE_DIR
+from thade.backtesting.scrape_stock import parse_history_rows
+
+PAGES_DIR = BASE_DIR / "thade/tests/pages"
+
+
+def soup_history_rows(page: str) -> list:
+    """The BeautifulSoup path request_records used before parse_history_rows"""
+    soup = BeautifulSoup(page, "lxml")
+    stock_history = soup.select_one("table[class='stock']")
+    cursor = stock_history.tr
+
+    rows = []
+    while cursor is not None:
+        if type(cursor) is not element.NavigableString and len(cursor.attrs) == 0:
+            rows.append(list(cursor.stripped_strings))
+        cursor = cursor.next_sibling
+    return rows
+
+
+def bench_parse_history(number=50, rounds=5) -> dict:
+    """
+    Compare parse_history_rows against the BeautifulSoup path on the saved history pages.
+
+    :param number: Times every page is parsed per round
+    :param rounds: Rounds to take the best of
+    :return: Best seconds per page of each path
+    """
+    pages = [path.read_text() for path in sorted(PAGES_DIR.glob("historyprice_*.html"))]
+    for page in pages:
+        soup_rows = [tuple(row) for row in soup_history_rows(page)]
+        if soup_rows != parse_history_rows(page):
+            raise UserWarning("Both parsing paths must extract the same rows")
+
+    results = {}
+    for name, parse in (
+        ("parse_history.soup", soup_history_rows),
+        ("parse_history.lxml", parse_history_rows),
+    ):
+        best = min(
+            repeat(
+                lambda: [parse(page) for page in pages], number=number, repeat=rounds
+            )
+        )
+        results[name] = {
+            "seconds_per_page": best / number / len(pages),
+            "pages": len(pages),
+        }
+    results["parse_history.speedup"] = (
+        results["parse_history.soup"]["seconds_per_page"]
+        / results["parse_history.lxml"]["seconds_per_page"]
+    )
+    return results
@@ -0,0 +1,110 @@
+from decimal import Decimal
+from itertools import count
+from timeit import default_timer
+
+from thade.backtesting.scrape_stock import (
+    parse_and_save_record,
+    parse_history_rows,
+    parse_record,
+    save_records,
+)
+from thade.benchmarks.engine import isolated, seed_company
+from thade.benchmarks.parse_history import PAGES_DIR
+from thade.models import BotLog, Record
+from thade.tests.models_factory import BotFactory, seed
+from thade.trade_bot.BotLogBuffer import BotLogBuffer, save_bot_logs
+
+
+def bench_parse_and_save(rounds=3) -> dict:
+    """
+    Time saving the rows of the saved history pages one by one with parse_and_save_record
+    and in bulk with parse_record and save_records. Saved rows are rolled back.
+
+    :param rounds: Rounds to take the best of, each on a new company
+    :return: Best rows per second of each path
+    """
+    pages = [path.read_text() for path in sorted(PAGES_DIR.glob("historyprice_*.html"))]
+    rows = [row for page in pages for row in parse_history_rows(page)]
+
+    def one_by_one(company):
+        for row in rows:
+            parse_and_save_record(row, company)
+
+    def in_bulk(company):
+        save_records([parse_record(row, company) for row in rows])
+
+    results = {}
+    companies = count()
+    with isolated():
+        for name, save in (
+            ("parse_and_save_record", one_by_one),
+            ("save_records", in_bulk),
+        ):
+            timings = []
+            for _ in range(rounds):
+                company = seed_company(next(companies))
+                started = default_timer()
+                save(company)
+                timings.append(default_timer() - started)
+                if company.record_set.count() != len(rows):
+                    raise UserWarning("Every parsed row must be saved")
+            results[f"parse_and_save.{name}"] = {
+                "rows_per_second": len(rows) / min(timings),
+                "rows": len(rows),
+            }
+    return results
+
+
+def bench_botlog_write(rows=2000, flush_size=256, rounds=3) -> dict:
+    """
+    Time writing BotLog rows (and the bot's BotState) one by one as unbuffered bots do,
+    and through BotLogBuffer. Written rows are rolled back.
+
+    :param rows: BotLog rows written per round
+    :param flush_size: BotLogBuffer's flush_size
+    :param rounds: Rounds to take the best of
+    :return: Best rows per second of each path
+    """
+
+    def bot_logs(bot, record):
+        return [
+            BotLog(
+                bot=bot,
+                last_updated_record=record,
+                utc_trading_date=record.utc_trading_date,
+                decimal_balance_vnd=Decimal(200 * 1000000),
+                stocks=i,
+                signal=BotLog.Signal.HOLD,
+                decimal_investment_vnd=Decimal(200 * 1000000),
+                all_time_min_total_vnd=Decimal(200 * 1000000),
+                all_time_max_total_vnd=Decimal(200 * 1000000),
+                control_decimal_balance_vnd=Decimal(200 * 1000000),
+                control_stocks=0,
+            )
+            for i in range(rows)
+        ]
+
+    def one_by_one(logs):
+        for bot_log in logs:
+            save_bot_logs([bot_log])
+
+    def buffered(logs):
+        buffer = BotLogBuffer(flush_size)
+        for bot_log in logs:
+            buffer.add(bot_log)
+        buffer.flush()
+
+    results = {}
+    with isolated():
+        company = seed(records=1, days_from_now=1, company=seed_company())
+        bot = BotFactory(company=company)
+        record = Record.objects.get(company=company)
+        for name, write in (("save", one_by_one), ("buffer", buffered)):
+            timings = []
+            for _ in range(rounds):
+                logs = bot_logs(bot, record)
+                started = default_timer()
+                write(logs)
+                timings.append(default_timer() - started)
+            results[f"botlog_write.{name}"] = {"rows_per_second": rows / min(timings)}
+    return results
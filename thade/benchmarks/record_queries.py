@@ -0,0 +1,135 @@
+from timeit import repeat
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from thade.models import Company, Record
+
+# Queries run against a temporary copy of thade_record: temporary tables shadow
+# the ones of the same name in this session only, the live table is neither
+# locked nor altered.
+COPY_SQL = [
+    "CREATE TEMPORARY TABLE thade_record"
+    " (LIKE thade_record INCLUDING DEFAULTS) ON COMMIT DROP",
+    "ALTER TABLE pg_temp.thade_record ADD PRIMARY KEY (id)",
+    "ALTER TABLE pg_temp.thade_record ADD UNIQUE (rid)",
+]
+# Schema of Record after 0020_record_unique_company_trading_date
+AFTER_SQL = [
+    "ALTER TABLE pg_temp.thade_record ADD CONSTRAINT bench_unique_company_trading_date"
+    " UNIQUE (company_id, utc_trading_date)",
+    "ANALYZE pg_temp.thade_record",
+]
+# Schema of Record before it
+BEFORE_SQL = [
+    "ALTER TABLE pg_temp.thade_record DROP CONSTRAINT bench_unique_company_trading_date",
+    "CREATE INDEX bench_record_company_id ON pg_temp.thade_record (company_id)",
+    "ANALYZE pg_temp.thade_record",
+]
+# Scraped codes are made of letters, seeded ones never collide with them
+SEED_CODE = "~B{:02}"
+
+
+class Rollback(Exception):
+    pass
+
+
+def hot_queries(company: Company) -> dict:
+    """The Record queries issued by TradeBot, fetch_records and MovingAverage"""
+    newest_date = (
+        company.record_set.order_by("-utc_trading_date").first().utc_trading_date
+    )
+    middle_date = newest_date - timezone.timedelta(days=company.record_set.count() // 2)
+    return {
+        # TradeBot.__init__
+        "nearest_to_deploy_date": company.record_set.filter(
+            utc_trading_date__lte=middle_date
+        ).order_by("-utc_trading_date")[:1],
+        # TradeBot.run(replay=False)
+        "next_record": company.record_set.filter(
+            utc_trading_date__gt=middle_date
+        ).order_by("utc_trading_date")[:1],
+        # TradeBot.run(replay=True)
+        "replay_series": company.record_set.order_by("utc_trading_date"),
+        # fetch_records
+        "latest_record": company.record_set.order_by("-utc_trading_date")[:1],
+        # MovingAverage._extract
+        "close_200": company.record_set.filter(utc_trading_date__lte=middle_date)
+        .order_by("-utc_trading_date")
+        .values_list("close_vnd", flat=True)[:200],
+    }
+
+
+def seed_records(companies: int, records: int) -> list:
+    """Bulk insert synthetic companies with one record per day"""
+    first_date = timezone.now().replace(hour=2, minute=0, second=0, microsecond=0)
+    seeded = []
+    for i in range(companies):
+        company = Company.objects.create(
+            code=SEED_CODE.format(i),
+            name="Benchmark",
+            website="",
+            stock_exchange="HOSE",
+        )
+        Record.objects.bulk_create(
+            (
+                Record(
+                    company=company,
+                    rid=f"{company.code}{day}",
+                    utc_trading_date=first_date - timezone.timedelta(days=day),
+                    reference_price_vnd=50000,
+                    close_vnd=50000 + day % 1000,
+                    volume=1000000,
+                    open_vnd=50000,
+                    highest_vnd=51000,
+                    lowest_vnd=49000,
+                )
+                for day in range(records)
+            ),
+            batch_size=10000,
+        )
+        seeded.append(company)
+    return seeded
+
+
+def measure(queries: dict, number: int) -> dict:
+    results = {}
+    for name, queryset in queries.items():
+        plan = queryset.explain(analyze=True)
+        best = min(repeat(lambda: list(queryset.all()), number=number, repeat=3))
+        results[name] = {"seconds": best / number, "plan": plan}
+    return results
+
+
+def bench_record_queries(companies=8, records=50000, number=5) -> dict:
+    """
+    Explain and time the hot Record queries with and without the composite
+    (company, utc_trading_date) index, on a temporary copy of thade_record.
+    Seeded rows are rolled back.
+
+    :param companies: Synthetic companies to seed
+    :param records: Records seeded per company
+    :param number: Times every query is run per round
+    :return: Plans and best seconds per query, before and after the index
+    """
+    results = {}
+    try:
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                for sql in COPY_SQL:
+                    cursor.execute(sql)
+            company = seed_records(companies, records)[companies // 2]
+
+            with connection.cursor() as cursor:
+                for sql in AFTER_SQL:
+                    cursor.execute(sql)
+            results["record_queries.after"] = measure(hot_queries(company), number)
+
+            with connection.cursor() as cursor:
+                for sql in BEFORE_SQL:
+                    cursor.execute(sql)
+            results["record_queries.before"] = measure(hot_queries(company), number)
+            raise Rollback
+    except Rollback:
+        pass
+    return results
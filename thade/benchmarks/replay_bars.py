@@ -0,0 +1,41 @@
+import tracemalloc
+from time import perf_counter
+
+from django.db import transaction
+
+from thade.benchmarks.record_queries import Rollback, seed_records
+from thade.trade_bot.Bar import Bar
+
+
+def measure(load) -> dict:
+    tracemalloc.start()
+    started = perf_counter()
+    loaded = load()
+    seconds = perf_counter() - started
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del loaded
+    return {"seconds": seconds, "bytes": size}
+
+
+def bench_replay_bars(records=50000) -> dict:
+    """
+    Compare the memory and load time of a company's history as Record instances
+    and as the Bars CompanySeries replays. Seeded rows are rolled back.
+
+    :param records: Records seeded for the company
+    :return: Seconds and retained bytes of each representation
+    """
+    results = {}
+    try:
+        with transaction.atomic():
+            company = seed_records(1, records)[0]
+            queryset = company.record_set.order_by("utc_trading_date")
+            results["replay_bars.records"] = measure(lambda: list(queryset.all()))
+            results["replay_bars.bars"] = measure(
+                lambda: [Bar(*row) for row in queryset.values_list(*Bar._fields)]
+            )
+            raise Rollback
+    except Rollback:
+        pass
+    return results
@@ -0,0 +1,125 @@
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.db import connection
+
+
+class PhaseStats:
+    __slots__ = ("calls", "seconds", "queries", "rows")
+
+    def __init__(self, calls=0, seconds=0.0, queries=0, rows=0):
+        """
+        Totals of a phase over a run.
+
+        :param calls: Times the phase was entered
+        :param seconds: Wall time spent in the phase, phases nested in it included
+        :param queries: Database queries issued in the phase, phases nested in it included
+        :param rows: Rows processed in the phase, as reported by its code
+        """
+        self.calls = calls
+        self.seconds = seconds
+        self.queries = queries
+        self.rows = rows
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class Instrumentation:
+    def __init__(self):
+        """Per-phase timings, query counts and rows of the code run under instrument()"""
+        self.phases = {}  # name: PhaseStats, in the order phases were first entered
+        self._stack = []  # PhaseStats of the phases currently entered
+
+    @contextmanager
+    def phase(self, name: str):
+        stats = self.phases.get(name)
+        if stats is None:
+            stats = self.phases[name] = PhaseStats()
+        stats.calls += 1
+        self._stack.append(stats)
+        started = perf_counter()
+        try:
+            yield stats
+        finally:
+            stats.seconds += perf_counter() - started
+            self._stack.pop()
+
+    def _count_query(self, execute, sql, params, many, context):
+        for stats in self._stack:
+            stats.queries += 1
+        return execute(sql, params, many, context)
+
+    def merge(self, report: dict):
+        """Add a report() of another run (e.g. of a worker process) to this one"""
+        for name, values in report.items():
+            stats = self.phases.setdefault(name, PhaseStats())
+            for field, value in values.items():
+                setattr(stats, field, getattr(stats, field) + value)
+
+    def report(self) -> dict:
+        """{phase: {calls, seconds, queries, rows}}"""
+        return {name: stats.as_dict() for name, stats in self.phases.items()}
+
+    def prometheus(self, prefix="thade") -> str:
+        """The report in Prometheus' text exposition format, one counter per field"""
+        lines = []
+        for field, help_text in (
+            ("calls", "Times the phase was entered"),
+            ("seconds", "Wall time spent in the phase"),
+            ("queries", "Database queries issued in the phase"),
+            ("rows", "Rows processed in the phase"),
+        ):
+            metric = f"{prefix}_phase_{field}_total"
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} counter")
+            for name, stats in self.phases.items():
+                lines.append(f'{metric}{{phase="{name}"}} {getattr(stats, field)}')
+        return "\n".join(lines) + "\n"
+
+    def __str__(self):
+        output_str = "{:32} {:>8} {:>10} {:>8} {:>8}\n".format(
+            "Phase", "Calls", "Seconds", "Queries", "Rows"
+        )
+        for name, stats in self.phases.items():
+            output_str += "{:32} {:>8} {:>10.4f} {:>8} {:>8}\n".format(
+                name, stats.calls, stats.seconds, stats.queries, stats.rows
+            )
+        return output_str
+
+
+_current = ContextVar("instrumentation", default=None)
+
+# Entered instead of a phase while nothing is instrumented, rows reported to it are dropped
+_untracked = nullcontext(PhaseStats())
+
+
+@contextmanager
+def instrument(instrumentation: Instrumentation = None):
+    """
+    Instrument the phases run in this context (off by default, phases cost a lookup then).
+
+    :param instrumentation: Add to an existing Instrumentation (default: a new one)
+    :return: The Instrumentation collecting the phases
+    """
+    instrumentation = instrumentation or Instrumentation()
+    token = _current.set(instrumentation)
+    try:
+        with connection.execute_wrapper(instrumentation._count_query):
+            yield instrumentation
+    finally:
+        _current.reset(token)
+
+
+def phase(name: str):
+    """
+    Time a phase of the current instrument() context, if any.
+
+    :param name: Dotted name of the phase, e.g. "trade_bot.run"
+    :return: Context manager entering the PhaseStats of the phase, add processed rows to its rows
+    """
+    instrumentation = _current.get()
+    if instrumentation is None:
+        return _untracked
+    return instrumentation.phase(name)
@@ -0,0 +1,122 @@
+import json
+import platform
+import subprocess
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from projectthade.settings import BASE_DIR
+from thade.benchmarks.engine import (
+    bench_get_trade_bot,
+    bench_moving_average_step,
+    bench_trade_bot_run,
+)
+from thade.benchmarks.money import bench_money
+from thade.benchmarks.parse_history import bench_parse_history
+from thade.benchmarks.persistence import bench_botlog_write, bench_parse_and_save
+from thade.benchmarks.record_queries import bench_record_queries
+from thade.benchmarks.replay_bars import bench_replay_bars
+
+BENCHMARKS = {
+    "parse_history": bench_parse_history,
+    "record_queries": bench_record_queries,
+    "money": bench_money,
+    "replay_bars": bench_replay_bars,
+    "trade_bot_run": bench_trade_bot_run,
+    "moving_average_step": bench_moving_average_step,
+    "get_trade_bot": bench_get_trade_bot,
+    "parse_and_save": bench_parse_and_save,
+    "botlog_write": bench_botlog_write,
+}
+
+
+def flatten(results: dict, prefix="") -> dict:
+    """Numeric leaves of nested results, keyed by their dotted path"""
+    flat = {}
+    for name, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{name}"] = value
+    return flat
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = "Benchmark hot paths of the scraper, the trade bots and the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "benchmarks",
+            nargs="*",
+            choices=list(BENCHMARKS),
+            default=list(BENCHMARKS),
+            help="Benchmarks to run (default: all)",
+        )
+
+        parser.add_argument(
+            "--output",
+            default=None,
+            help="JSON file to save the results into, with the commit and machine they ran on",
+        )
+
+        parser.add_argument(
+            "--compare",
+            default=None,
+            help="JSON file saved by --output to compare the results against",
+        )
+
+    def handle(self, *args, **options):
+        baseline = {}
+        if options["compare"]:
+            try:
+                with open(options["compare"]) as f:
+                    baseline = flatten(json.load(f)["results"])
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f"Invalid baseline {options['compare']}: {e}")
+
+        results = {}
+        for benchmark in options["benchmarks"]:
+            for name, result in BENCHMARKS[benchmark]().items():
+                results[name] = result
+                self.stdout.write(f"{name}: {result}")
+
+        if baseline:
+            self.stdout.write("\nCompared to {}:".format(options["compare"]))
+            for name, value in flatten(results).items():
+                if baseline.get(name):
+                    self.stdout.write(
+                        "{}: {:.6g} -> {:.6g} ({:+.1f}%)".format(
+                            name,
+                            baseline[name],
+                            value,
+                            (value / baseline[name] - 1) * 100,
+                        )
+                    )
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(
+                    {
+                        "commit": git_commit(),
+                        "created": timezone.now().isoformat(),
+                        "python": platform.python_version(),
+                        "machine": platform.platform(),
+                        "results": results,
+                    },
+                    f,
+                    indent=2,
+                )
+            self.stdout.write(f"Results saved to {options['output']}")
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from thade.trade_bot.retention import compact_bot_logs
+
+
+class Command(BaseCommand):
+    help = "Roll daily HOLD/NOT_BUY/NOT_SELL BotLogs older than the retention up into monthly summaries"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retention-months",
+            type=int,
+            default=None,
+            help="Months of daily logs to keep, the current one included (default: TRADE_BOT.BOT_LOG_RETENTION_MONTHS, 12)",
+        )
+
+    def handle(self, *args, **options):
+        deleted = compact_bot_logs(options["retention_months"])
+        for month, rows in deleted.items():
+            self.stdout.write(f"{month:%Y-%m}: {rows} row(s) compacted")
+        self.stdout.write(f"{sum(deleted.values())} row(s) compacted")
@@ -0,0 +1,67 @@
+import os
+from tempfile import NamedTemporaryFile
+
+from django.core.management.base import BaseCommand, CommandError
+
+from thade.models import Bot
+from thade.trade_bot.export import FORMATS, export_bot_logs
+
+
+class Command(BaseCommand):
+    help = "Export BotLogs of some or all bots into compressed CSV, Parquet or Arrow IPC, in constant memory"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "bids", nargs="*", help="Bids of the bots to export (default: all bots)"
+        )
+
+        parser.add_argument(
+            "--format",
+            choices=list(FORMATS),
+            default="csv.gz",
+            help="parquet and arrow (IPC stream) require pyarrow",
+        )
+
+        parser.add_argument(
+            "--output",
+            default=None,
+            help="File to export into (default: bot_logs.<format>)",
+        )
+
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=10000,
+            help="Rows fetched from the database and written at once",
+        )
+
+    def handle(self, *args, **options):
+        bot_ids = None
+        if options["bids"]:
+            bot_ids = dict(
+                Bot.objects.filter(bid__in=options["bids"]).values_list("bid", "id")
+            )
+            missing = set(options["bids"]) - set(bot_ids)
+            if missing:
+                raise CommandError(f"Unknown bots: {', '.join(sorted(missing))}")
+            bot_ids = bot_ids.values()
+
+        output = options["output"] or f"bot_logs.{options['format']}"
+        # Write then rename, a failed export leaves no truncated file behind
+        try:
+            with NamedTemporaryFile(
+                dir=os.path.dirname(os.path.abspath(output)),
+                suffix=".tmp",
+                delete=False,
+            ) as f:
+                try:
+                    written = export_bot_logs(
+                        f, options["format"], bot_ids, options["chunk_size"]
+                    )
+                except BaseException:
+                    os.remove(f.name)
+                    raise
+        except (UserWarning, ImportError) as e:
+            raise CommandError(e)
+        os.replace(f.name, output)
+        self.stdout.write(f"{written} bytes exported to {output}")
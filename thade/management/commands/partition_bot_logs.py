@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from thade.trade_bot.partitions import partition_bot_logs
+
+
+class Command(BaseCommand):
+    help = "Create the missing monthly partitions of BotLog, moving their rows out of the default partition"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months-ahead",
+            type=int,
+            default=3,
+            help="Months after the current one to create partitions for",
+        )
+
+    def handle(self, *args, **options):
+        created = partition_bot_logs(options["months_ahead"])
+        for name, moved in created.items():
+            self.stdout.write(f"{name}: {moved} row(s) moved")
+        self.stdout.write(f"{len(created)} partition(s) created")
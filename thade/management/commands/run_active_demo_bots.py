@@ -14,5 +14,19 @@ class Command(BaseCommand):
             help="Update active TradeBots' company records",
         )
 
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Worker processes running the bots (default: number of CPUs, 0: no pool)",
+        )
+        parser.add_argument(
+            "--metrics",
+            default=None,
+            help="Instrument the bots and save their phases into this file as Prometheus metrics",
+        )
+
     def handle(self, *args, **options):
-        run_active_demo_bots(options["update"])
+        run_active_demo_bots(
+            options["update"], workers=options["workers"], metrics=options["metrics"]
+        )
@@ -23,5 +23,22 @@ class Command(BaseCommand):
             help="Days from now that the bot is deployed",
         )
 
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Worker processes running the bots (default: number of CPUs, 0: no pool)",
+        )
+        parser.add_argument(
+            "--metrics",
+            default=None,
+            help="Instrument the bots and save their phases into this file as Prometheus metrics",
+        )
+
     def handle(self, *args, **options):
-        run_demo_bots(balance_vnd=options["balance_vnd"], days=options["days"])
+        run_demo_bots(
+            balance_vnd=options["balance_vnd"],
+            days=options["days"],
+            workers=options["workers"],
+            metrics=options["metrics"],
+        )
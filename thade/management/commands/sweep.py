@@ -0,0 +1,148 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from projectthade.settings import HCM_TZ
+from thade.backtesting.sweep import FIELDS, parse_deploy_date, sweep, write_sweep
+from thade.models import Company
+
+
+class Command(BaseCommand):
+    help = "Backtest MovingAverage over a grid of parameters and companies"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "codes",
+            nargs="*",
+            help="Codes of the companies to backtest (default: every company)",
+        )
+
+        parser.add_argument(
+            "--short-windows",
+            type=int,
+            nargs="+",
+            default=[50],
+            help="Lengths of the short moving average",
+        )
+
+        parser.add_argument(
+            "--long-windows",
+            type=int,
+            nargs="+",
+            default=[200],
+            help="Lengths of the long moving average",
+        )
+
+        parser.add_argument(
+            "--stocks-per-trade",
+            type=int,
+            nargs="+",
+            default=[50],
+            help="Amounts of stocks to trade on every action",
+        )
+
+        parser.add_argument(
+            "--fees",
+            type=Decimal,
+            nargs="+",
+            default=[Decimal("0.0035")],
+            help="Trading fees/taxes",
+        )
+
+        parser.add_argument(
+            "--deploy-dates",
+            nargs="+",
+            default=[],
+            help="Dates (YYYY-MM-DD) that the bots are deployed",
+        )
+
+        parser.add_argument(
+            "--days",
+            type=int,
+            nargs="+",
+            default=[],
+            help="Days from now that the bots are deployed (default: 365 if no --deploy-dates)",
+        )
+
+        parser.add_argument(
+            "--balance_vnd",
+            type=int,
+            default=Decimal(20 * 1000000),
+            help="Balance for each backtest to start with",
+        )
+
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Worker processes running the backtests (default: number of CPUs, 0: no pool)",
+        )
+
+        parser.add_argument(
+            "--output",
+            default="sweep.csv.gz",
+            help="CSV file the results are streamed to, gzipped if it ends with .gz",
+        )
+
+        parser.add_argument(
+            "--top",
+            type=int,
+            default=10,
+            help="Best combinations to print, ranked by ROI over the control ROI",
+        )
+
+    def handle(self, *args, **options):
+        companies = Company.objects.order_by("code")
+        if options["codes"]:
+            companies = companies.filter(code__in=options["codes"])
+            missing = set(options["codes"]) - {company.code for company in companies}
+            if missing:
+                raise CommandError(f"Unknown companies: {', '.join(sorted(missing))}")
+
+        try:
+            deploy_dates = [
+                parse_deploy_date(value, HCM_TZ) for value in options["deploy_dates"]
+            ]
+        except ValueError as e:
+            raise CommandError(e)
+        deploy_dates += [
+            timezone.now() - timezone.timedelta(days=days) for days in options["days"]
+        ]
+
+        rows = sweep(
+            list(companies),
+            short_windows=options["short_windows"],
+            long_windows=options["long_windows"],
+            stocks_per_trade=options["stocks_per_trade"],
+            fees=options["fees"],
+            deploy_dates=deploy_dates or None,
+            balance_vnd=Decimal(options["balance_vnd"]),
+            workers=options["workers"],
+        )
+
+        # Keep only the ranking in memory, every row is streamed to the output
+        roi = FIELDS.index("roi")
+        control_roi = FIELDS.index("control_roi")
+        ranked = []
+        beaten = 0
+
+        def collect():
+            nonlocal beaten
+            for row in rows:
+                if row[roi] is not None:
+                    beaten += row[roi] > row[control_roi]
+                    ranked.append(row)
+                    ranked.sort(key=lambda r: r[roi] - r[control_roi], reverse=True)
+                    del ranked[options["top"] :]
+                yield row
+
+        count = write_sweep(collect(), options["output"])
+        self.stdout.write(
+            f"{count} backtest(s) written to {options['output']}, "
+            f"{beaten} beat BUY and HOLD"
+        )
+        for row in ranked:
+            self.stdout.write(
+                ", ".join(f"{name}={value}" for name, value in zip(FIELDS, row))
+            )
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.25 on 2026-10-17 00:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('thade', '0019_auto_20210727_1606'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='record',
+            constraint=models.UniqueConstraint(fields=('company', 'utc_trading_date'), name='unique_company_trading_date'),
+        ),
+        migrations.AlterField(
+            model_name='record',
+            name='company',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='thade.company'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.25 on 2026-10-17 01:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('thade', '0020_record_unique_company_trading_date'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='botlog',
+            index=models.Index(fields=['bot', 'id'], name='botlog_bot_id_idx'),
+        ),
+        migrations.AlterField(
+            model_name='botlog',
+            name='bot',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='thade.bot'),
+        ),
+    ]
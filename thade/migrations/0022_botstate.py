@@ -0,0 +1,28 @@
+# Generated by Django 3.2.25 on 2026-10-17 01:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('thade', '0021_botlog_bot_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BotState',
+            fields=[
+                ('bot', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='state', serialize=False, to='thade.bot')),
+                ('decimal_balance_vnd', models.DecimalField(decimal_places=4, max_digits=16)),
+                ('stocks', models.IntegerField()),
+                ('decimal_investment_vnd', models.DecimalField(decimal_places=4, max_digits=16)),
+                ('all_time_min_total_vnd', models.DecimalField(decimal_places=4, max_digits=16)),
+                ('all_time_max_total_vnd', models.DecimalField(decimal_places=4, max_digits=16)),
+                ('control_decimal_balance_vnd', models.DecimalField(decimal_places=4, max_digits=16)),
+                ('control_stocks', models.IntegerField()),
+                ('last_updated_record', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='thade.record')),
+            ],
+        ),
+    ]
@@ -0,0 +1,49 @@
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+# BotState.FIELDS, historical models have no class attributes
+FIELDS = (
+    'last_updated_record_id',
+    'decimal_balance_vnd',
+    'stocks',
+    'decimal_investment_vnd',
+    'all_time_min_total_vnd',
+    'all_time_max_total_vnd',
+    'control_decimal_balance_vnd',
+    'control_stocks',
+)
+
+
+def backfill_bot_states(apps, schema_editor):
+    """Copy the latest BotLog of every bot into its BotState"""
+    Bot = apps.get_model('thade', 'Bot')
+    BotLog = apps.get_model('thade', 'BotLog')
+    BotState = apps.get_model('thade', 'BotState')
+
+    # One backward scan of botlog_bot_id_idx per bot
+    last_log_ids = Bot.objects.annotate(
+        last_log_id=Subquery(
+            BotLog.objects.filter(bot=OuterRef('id')).order_by('-id').values('id')[:1]
+        )
+    ).values('last_log_id')
+
+    states = []
+    for bot_log in BotLog.objects.filter(id__in=last_log_ids).iterator(chunk_size=1000):
+        states.append(
+            BotState(bot_id=bot_log.bot_id, **{field: getattr(bot_log, field) for field in FIELDS})
+        )
+        if len(states) >= 1000:
+            BotState.objects.bulk_create(states)
+            states = []
+    BotState.objects.bulk_create(states)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('thade', '0022_botstate'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_bot_states, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('thade', '0023_backfill_botstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='botlog',
+            name='utc_trading_date',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunSQL(
+            'UPDATE thade_botlog SET utc_trading_date = thade_record.utc_trading_date'
+            ' FROM thade_record WHERE thade_record.id = thade_botlog.last_updated_record_id',
+            migrations.RunSQL.noop,
+        ),
+        migrations.AlterField(
+            model_name='botlog',
+            name='utc_trading_date',
+            field=models.DateTimeField(),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.2.25 on 2026-10-17 01:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('thade', '0024_botlog_utc_trading_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BotLogSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateTimeField()),
+                ('signal', models.CharField(choices=[('BUY', 'Buy'), ('SELL', 'Sell'), ('HOLD', 'Hold'), ('NOT_BUY', 'Cannot afford to Buy'), ('NOT_SELL', 'Not enough stocks to Sell'), ('INVEST', 'Invest'), ('WITHDRAW', 'Withdraw'), ('ERR', 'Invalid signal'), ('DEPLOY', 'Deployed')], max_length=16)),
+                ('count', models.IntegerField()),
+                ('first_utc_trading_date', models.DateTimeField()),
+                ('last_utc_trading_date', models.DateTimeField()),
+                ('bot', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='thade.bot')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='botlogsummary',
+            constraint=models.UniqueConstraint(fields=('bot', 'month', 'signal'), name='unique_bot_month_signal'),
+        ),
+    ]
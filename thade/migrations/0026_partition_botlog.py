@@ -0,0 +1,52 @@
+from django.db import migrations
+
+# Rows are copied into thade_botlog_default, partition_bot_logs moves them into monthly partitions.
+# The primary key has to include the partition key, ids still come from thade_botlog_id_seq.
+PARTITION_BOTLOG = '''
+CREATE TABLE thade_botlog_partitioned (LIKE thade_botlog INCLUDING DEFAULTS)
+    PARTITION BY RANGE (utc_trading_date);
+CREATE TABLE thade_botlog_default PARTITION OF thade_botlog_partitioned DEFAULT;
+INSERT INTO thade_botlog_partitioned SELECT * FROM thade_botlog;
+
+ALTER SEQUENCE thade_botlog_id_seq OWNED BY NONE;
+DROP TABLE thade_botlog;
+ALTER TABLE thade_botlog_partitioned RENAME TO thade_botlog;
+ALTER SEQUENCE thade_botlog_id_seq OWNED BY thade_botlog.id;
+
+ALTER TABLE thade_botlog ADD CONSTRAINT thade_botlog_pkey PRIMARY KEY (id, utc_trading_date);
+CREATE INDEX botlog_bot_id_idx ON thade_botlog (bot_id, id);
+CREATE INDEX thade_botlog_last_updated_record_id_45d9e22e ON thade_botlog (last_updated_record_id);
+ALTER TABLE thade_botlog ADD CONSTRAINT thade_botlog_bot_id_2b57adf8_fk_thade_bot_id
+    FOREIGN KEY (bot_id) REFERENCES thade_bot (id) DEFERRABLE INITIALLY DEFERRED;
+ALTER TABLE thade_botlog ADD CONSTRAINT thade_botlog_last_updated_record_id_45d9e22e_fk_thade_record_id
+    FOREIGN KEY (last_updated_record_id) REFERENCES thade_record (id) DEFERRABLE INITIALLY DEFERRED;
+'''
+
+UNPARTITION_BOTLOG = '''
+CREATE TABLE thade_botlog_plain (LIKE thade_botlog INCLUDING DEFAULTS);
+INSERT INTO thade_botlog_plain SELECT * FROM thade_botlog;
+
+ALTER SEQUENCE thade_botlog_id_seq OWNED BY NONE;
+DROP TABLE thade_botlog;
+ALTER TABLE thade_botlog_plain RENAME TO thade_botlog;
+ALTER SEQUENCE thade_botlog_id_seq OWNED BY thade_botlog.id;
+
+ALTER TABLE thade_botlog ADD CONSTRAINT thade_botlog_pkey PRIMARY KEY (id);
+CREATE INDEX botlog_bot_id_idx ON thade_botlog (bot_id, id);
+CREATE INDEX thade_botlog_last_updated_record_id_45d9e22e ON thade_botlog (last_updated_record_id);
+ALTER TABLE thade_botlog ADD CONSTRAINT thade_botlog_bot_id_2b57adf8_fk_thade_bot_id
+    FOREIGN KEY (bot_id) REFERENCES thade_bot (id) DEFERRABLE INITIALLY DEFERRED;
+ALTER TABLE thade_botlog ADD CONSTRAINT thade_botlog_last_updated_record_id_45d9e22e_fk_thade_record_id
+    FOREIGN KEY (last_updated_record_id) REFERENCES thade_record (id) DEFERRABLE INITIALLY DEFERRED;
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('thade', '0025_botlogsummary'),
+    ]
+
+    operations = [
+        migrations.RunSQL(PARTITION_BOTLOG, UNPARTITION_BOTLOG),
+    ]
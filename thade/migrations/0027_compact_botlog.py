@@ -0,0 +1,72 @@
+from django.db import migrations, models
+
+# log_str was "<logged at>: <message>", the message is parsed back into the columns it is now rendered from
+LOG_STR_TO_COLUMNS = r'''
+UPDATE thade_botlog SET
+    quantity = CASE WHEN signal IN ('BUY', 'SELL', 'NOT_BUY', 'NOT_SELL')
+        THEN substring(log_str from '(?:BUY|SELL) (\d+) ')::integer END,
+    price_vnd = CASE WHEN signal IN ('BUY', 'SELL', 'NOT_BUY', 'NOT_SELL')
+        THEN (SELECT close_vnd FROM thade_record WHERE thade_record.id = last_updated_record_id) END,
+    amount_vnd = CASE WHEN signal IN ('INVEST', 'WITHDRAW')
+        THEN substring(log_str from '(?:Invest|Withdraw) (\S+) VND')::numeric END,
+    detail = CASE WHEN signal NOT IN ('BUY', 'SELL', 'HOLD', 'NOT_BUY', 'NOT_SELL', 'INVEST', 'WITHDRAW', 'DEPLOY')
+        THEN left(coalesce(substring(log_str from '^\S+ \S+: (.*)$'), log_str), 128) ELSE '' END;
+'''
+
+# The time rows were logged at is gone, their trading date stands in for it
+COLUMNS_TO_LOG_STR = r'''
+UPDATE thade_botlog SET log_str = left(
+    to_char(utc_trading_date AT TIME ZONE 'UTC', 'YYYY-MM-DD') || ': ' || CASE signal
+        WHEN 'BUY' THEN 'BUY ' || quantity || ' ' || thade_company.code
+        WHEN 'SELL' THEN 'SELL ' || quantity || ' ' || thade_company.code
+        WHEN 'HOLD' THEN 'HOLD'
+        WHEN 'NOT_BUY' THEN 'Cannot afford to BUY ' || quantity || ' ' || thade_company.code
+        WHEN 'NOT_SELL' THEN 'Not enough stocks to SELL ' || quantity || ' ' || thade_company.code
+        WHEN 'INVEST' THEN 'Invest ' || trim_scale(amount_vnd) || ' VND'
+        WHEN 'WITHDRAW' THEN 'Withdraw ' || trim_scale(amount_vnd) || ' VND'
+        WHEN 'DEPLOY' THEN thade_bot.name || ' is deployed'
+        ELSE detail
+    END, 128)
+FROM thade_bot JOIN thade_company ON thade_company.id = thade_bot.company_id
+WHERE thade_bot.id = thade_botlog.bot_id;
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('thade', '0026_partition_botlog'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='botlog',
+            name='amount_vnd',
+            field=models.DecimalField(decimal_places=4, max_digits=16, null=True),
+        ),
+        migrations.AddField(
+            model_name='botlog',
+            name='detail',
+            field=models.CharField(blank=True, default='', max_length=128),
+        ),
+        migrations.AddField(
+            model_name='botlog',
+            name='price_vnd',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='botlog',
+            name='quantity',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='botlog',
+            name='log_str',
+            field=models.CharField(default='', max_length=128),
+        ),
+        migrations.RunSQL(LOG_STR_TO_COLUMNS, COLUMNS_TO_LOG_STR),
+        migrations.RemoveField(
+            model_name='botlog',
+            name='log_str',
+        ),
+    ]
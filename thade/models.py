@@ -16,7 +16,8 @@ class Company(models.Model):
 
 
 class Record(models.Model):
-    company = models.ForeignKey(Company, on_delete=models.CASCADE)
+    # Indexed by unique_company_trading_date
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, db_index=False)
     rid = models.CharField(max_length=16, unique=True)  # ID format: CODE+YYYY+MM+DD
     utc_trading_date = models.DateTimeField()  # Low frequency trading
     reference_price_vnd = models.IntegerField()
@@ -26,6 +27,15 @@ class Record(models.Model):
     highest_vnd = models.IntegerField()
     lowest_vnd = models.IntegerField()
 
+    class Meta:
+        constraints = [
+            # Also serves every "company's records ordered by utc_trading_date" query
+            models.UniqueConstraint(
+                fields=["company", "utc_trading_date"],
+                name="unique_company_trading_date",
+            )
+        ]
+
     def __str__(self):
         return f"Record(rid={self.rid!r})"
 
@@ -48,8 +58,11 @@ class Bot(models.Model):
 
 
 class BotLog(models.Model):
-    bot = models.ForeignKey(Bot, on_delete=models.CASCADE)
+    # Indexed by botlog_bot_id_idx
+    bot = models.ForeignKey(Bot, on_delete=models.CASCADE, db_index=False)
     last_updated_record = models.ForeignKey(Record, on_delete=models.PROTECT)
+    # last_updated_record's, the table is partitioned by its month (see thade.trade_bot.partitions)
+    utc_trading_date = models.DateTimeField()
 
     # Driving attributes
     decimal_balance_vnd = models.DecimalField(max_digits=16, decimal_places=4)
@@ -68,7 +81,27 @@ class BotLog(models.Model):
 
     signal = models.CharField(max_length=16, choices=Signal.choices, default=Signal.ERR)
 
-    log_str = models.CharField(max_length=128)
+    # What log_str is rendered from, besides the signal
+    QUANTITY_SIGNALS = (Signal.BUY, Signal.SELL, Signal.NOT_BUY, Signal.NOT_SELL)
+    AMOUNT_SIGNALS = (Signal.INVEST, Signal.WITHDRAW)
+    MESSAGES = {
+        Signal.BUY: "BUY {quantity} {code}",
+        Signal.SELL: "SELL {quantity} {code}",
+        Signal.HOLD: "HOLD",
+        Signal.NOT_BUY: "Cannot afford to BUY {quantity} {code}",
+        Signal.NOT_SELL: "Not enough stocks to SELL {quantity} {code}",
+        Signal.INVEST: "Invest {amount_vnd} VND",
+        Signal.WITHDRAW: "Withdraw {amount_vnd} VND",
+        Signal.ERR: "{detail}",
+        Signal.DEPLOY: "{name} is deployed",
+    }
+
+    quantity = models.IntegerField(null=True)  # Stocks of QUANTITY_SIGNALS
+    price_vnd = models.IntegerField(null=True)  # Close price of QUANTITY_SIGNALS
+    amount_vnd = models.DecimalField(
+        max_digits=16, decimal_places=4, null=True
+    )  # Invested or withdrawn
+    detail = models.CharField(max_length=128, blank=True, default="")  # ERR's message
 
     # Statistical attributes
     decimal_investment_vnd = models.DecimalField(max_digits=16, decimal_places=4)
@@ -78,5 +111,95 @@ class BotLog(models.Model):
     control_decimal_balance_vnd = models.DecimalField(max_digits=16, decimal_places=4)
     control_stocks = models.IntegerField()
 
+    class Meta:
+        indexes = [
+            # Also serves every "bot's logs ordered by id" query, e.g. its latest log
+            models.Index(fields=["bot", "id"], name="botlog_bot_id_idx")
+        ]
+
+    @property
+    def message(self) -> str:
+        """What the bot printed. Loads the bot and its company for DEPLOY and QUANTITY_SIGNALS"""
+        message = self.MESSAGES.get(self.signal, "{detail}")
+        bot = self.bot if "{code}" in message or "{name}" in message else None
+        return message.format(
+            quantity=self.quantity,
+            code=bot and bot.company.code,
+            name=bot and bot.name,
+            amount_vnd=self.amount_vnd and "{:f}".format(self.amount_vnd.normalize()),
+            detail=self.detail,
+        )
+
+    @property
+    def log_str(self) -> str:
+        return f"{self.utc_trading_date:%Y-%m-%d}: {self.message}"
+
     def __str__(self):
         return f"BotLog(bot={self.bot!r}, record={self.last_updated_record!r})"
+
+
+class BotLogSummary(models.Model):
+    """Daily BotLogs of a bot rolled up by month and signal (see thade.trade_bot.retention)"""
+
+    # Indexed by unique_bot_month_signal
+    bot = models.ForeignKey(Bot, on_delete=models.CASCADE, db_index=False)
+    month = models.DateTimeField()  # First day of the month, in UTC
+    signal = models.CharField(max_length=16, choices=BotLog.Signal.choices)
+    count = models.IntegerField()
+    first_utc_trading_date = models.DateTimeField()
+    last_utc_trading_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["bot", "month", "signal"], name="unique_bot_month_signal"
+            )
+        ]
+
+    def __str__(self):
+        return "BotLogSummary(bot={!r}, month={:%Y-%m}, signal={!r})".format(
+            self.bot_id, self.month, self.signal
+        )
+
+
+class BotState(models.Model):
+    """The state of a bot as of its latest BotLog, written along with it"""
+
+    # Fields copied from the bot's latest BotLog
+    FIELDS = (
+        "last_updated_record_id",
+        "decimal_balance_vnd",
+        "stocks",
+        "decimal_investment_vnd",
+        "all_time_min_total_vnd",
+        "all_time_max_total_vnd",
+        "control_decimal_balance_vnd",
+        "control_stocks",
+    )
+
+    bot = models.OneToOneField(
+        Bot, on_delete=models.CASCADE, primary_key=True, related_name="state"
+    )
+    last_updated_record = models.ForeignKey(Record, on_delete=models.PROTECT)
+
+    # Driving attributes
+    decimal_balance_vnd = models.DecimalField(max_digits=16, decimal_places=4)
+    stocks = models.IntegerField()
+
+    # Statistical attributes
+    decimal_investment_vnd = models.DecimalField(max_digits=16, decimal_places=4)
+    all_time_min_total_vnd = models.DecimalField(max_digits=16, decimal_places=4)
+    all_time_max_total_vnd = models.DecimalField(max_digits=16, decimal_places=4)
+
+    control_decimal_balance_vnd = models.DecimalField(max_digits=16, decimal_places=4)
+    control_stocks = models.IntegerField()
+
+    @classmethod
+    def from_log(cls, bot_log: BotLog) -> "BotState":
+        return cls(
+            bot_id=bot_log.bot_id,
+            **{field: getattr(bot_log, field) for field in cls.FIELDS},
+        )
+
+    def __str__(self):
+        return f"BotState(bot={self.bot_id!r}, record={self.last_updated_record_id!r})"
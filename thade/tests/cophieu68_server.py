@@ -0,0 +1,100 @@
+import gzip
+from hashlib import sha256
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from urllib.parse import parse_qs, urlparse
+
+from projectthade.settings import BASE_DIR
+from thade.backtesting import http_session, page_cache
+from thade.backtesting.scrape_stock import RATE_LIMITER
+
+PAGES_DIR = BASE_DIR / "thade/tests/pages"
+
+
+class Cophieu68Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep connections alive
+
+    def do_GET(self):
+        server: Cophieu68Server = self.server.stand_in
+        server.requests.append(self.path)
+        server.client_ports.add(self.client_address[1])
+
+        if server.failures > 0:
+            server.failures -= 1
+            self.send_page(503, b"")
+            return
+
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == "/historyprice.php":
+            page = PAGES_DIR / "historyprice_{}_{}.html".format(
+                query["id"][0].upper(), query["currentPage"][0]
+            )
+        elif url.path == "/profilesymbol.php":
+            page = PAGES_DIR / "profilesymbol_{}.html".format(query["id"][0].upper())
+        else:
+            page = None
+
+        if page is not None and page.exists():
+            body = page.read_bytes()
+            etag = '"{}"'.format(sha256(body).hexdigest())
+            if self.headers.get("If-None-Match") == etag:
+                server.not_modified += 1
+                self.send_page(304, b"", etag)
+            else:
+                self.send_page(200, body, etag)
+        else:
+            # cophieu68 answers unknown companies with a page lacking the scraping structure
+            self.send_page(200, b"<html><body></body></html>")
+
+    def send_page(self, status: int, body: bytes, etag: str = None):
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        if etag is not None:
+            self.send_header("ETag", etag)
+        if body and "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Cophieu68Server:
+    def __init__(self, failures=0, cache_dir=None):
+        """
+        Local stand-in for https://www.cophieu68.vn serving pages saved in thade/tests/pages.
+        The scraper's shared HTTP session is pointed at it, without rate limit, while the context is open.
+
+        :param failures: Number of requests answered with 503 before serving pages
+        :param cache_dir: Page cache used while the context is open (None: no caching)
+        """
+        self.cache_dir = cache_dir
+        self.failures = failures
+        self.not_modified = 0
+        self.requests = []
+        self.client_ports = set()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Cophieu68Handler)
+        self.httpd.stand_in = self
+        self.thread = Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return "http://{}:{}".format(*self.httpd.server_address)
+
+    def __enter__(self):
+        self.thread.start()
+        http_session.configure(base_url=self.url, backoff_factor=0)
+        page_cache.configure(directory=self.cache_dir)
+        self.interval, RATE_LIMITER.interval = RATE_LIMITER.interval, 0
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        http_session.configure()
+        page_cache.configure()
+        RATE_LIMITER.interval = self.interval
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -130,19 +130,36 @@ class BotLogFactory(factory.django.DjangoModelFactory):
 
     bot = factory.Iterator(Bot.objects.all())
     last_updated_record = factory.Iterator(Record.objects.all())
+    utc_trading_date = factory.LazyAttribute(
+        lambda this: this.last_updated_record.utc_trading_date
+    )
     decimal_balance_vnd = factory.Faker(
         "pydecimal", min_value=0, max_value=50000000, right_digits=3
     )
     stocks = factory.Faker("random_int", min=0, max=1000)
     signal = fuzzy.FuzzyChoice(BotLog.Signal, getter=lambda c: c[0])
-    log_str = factory.LazyAttribute(
-        lambda this: "{} - {}: {} __ {}\n".format(
-            timezone.now(),
-            this.last_updated_record.rid,
-            this.signal,
-            this.bot.company.code,
+    quantity = factory.LazyAttribute(
+        lambda this: (
+            this.bot.stocks_per_trade
+            if this.signal in BotLog.QUANTITY_SIGNALS
+            else None
+        )
+    )
+    price_vnd = factory.LazyAttribute(
+        lambda this: (
+            this.last_updated_record.close_vnd
+            if this.signal in BotLog.QUANTITY_SIGNALS
+            else None
         )
     )
+    amount_vnd = factory.Maybe(
+        factory.LazyAttribute(lambda this: this.signal in BotLog.AMOUNT_SIGNALS),
+        factory.Faker("random_int", min=1000000, max=50000000, step=1000000),
+        None,
+    )
+    detail = factory.LazyAttribute(
+        lambda this: "Invalid signal: 777" if this.signal == BotLog.Signal.ERR else ""
+    )
     decimal_investment_vnd = factory.Faker("random_int", min=0, max=50000000, step=1000)
     all_time_min_total_vnd = factory.Faker(
         "pydecimal", min_value=0, max_value=50000000, right_digits=3
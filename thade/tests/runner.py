@@ -0,0 +1,34 @@
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from django.test.runner import DiscoverRunner
+
+from projectthade.settings import SCRAPER
+from thade.backtesting import page_cache, price_cache
+
+
+class TestRunner(DiscoverRunner):
+    """Run the tests with the page and price caches in a temporary directory"""
+
+    CACHE_SETTINGS = {"CACHE_DIR": "cophieu68", "PRICE_CACHE_DIR": "prices"}
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_dir = TemporaryDirectory()
+        self.scraper_settings = {
+            key: SCRAPER[key] for key in self.CACHE_SETTINGS if key in SCRAPER
+        }
+        # Tests reset the caches with configure(), which reads these settings
+        for key, name in self.CACHE_SETTINGS.items():
+            SCRAPER[key] = Path(self.cache_dir.name) / name
+        page_cache.configure()
+        price_cache.configure()
+
+    def teardown_test_environment(self, **kwargs):
+        for key in self.CACHE_SETTINGS:
+            SCRAPER.pop(key)
+        SCRAPER.update(self.scraper_settings)
+        page_cache.configure()
+        price_cache.configure()
+        self.cache_dir.cleanup()
+        super().teardown_test_environment(**kwargs)
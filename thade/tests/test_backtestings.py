@@ -1,24 +1,56 @@
+import csv
+import gzip
+import json
+import os
 import warnings
 from datetime import datetime, timedelta
-from time import sleep
-
+from decimal import Decimal
+from io import StringIO
+from secrets import token_hex
+from tempfile import NamedTemporaryFile, TemporaryDirectory
+from threading import Thread
+from time import monotonic, sleep, time
+from unittest.mock import patch
+
+import numpy as np
 import yaml
 from bs4 import BeautifulSoup
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
 from django.utils import timezone
 
-from projectthade.settings import BASE_DIR
+from projectthade.settings import BASE_DIR, HCM_TZ
+from thade.backtesting import http_session, page_cache, price_cache
+from thade.backtesting.page_cache import CachedPage, PageCache
+from thade.backtesting.price_cache import PriceCache, PriceSeries
 from thade.backtesting.scrape_stock import (
+    RateLimiter,
     clear_records,
     fetch_company,
     fetch_records,
     make_soup,
     parse_and_save_record,
+    parse_history_rows,
+    parse_record,
     request_company_desc,
+    request_page,
     request_records,
+    save_records,
+)
+from thade.backtesting.sweep import FIELDS, sweep, write_sweep
+from thade.backtesting.vectorized import (
+    NO_SIGNAL,
+    backtest_company,
+    backtest_moving_average,
+    moving_average_signals,
 )
-from thade.models import Company, Record
+from thade.benchmarks.parse_history import soup_history_rows
+from thade.models import BotLog, Company, Record
+from thade.tests.cophieu68_server import Cophieu68Server
 from thade.tests.models_factory import CompanyFactory, RecordFactory, seed
+from thade.trade_bot.MovingAverage import MovingAverage
+from thade.trade_bot.TradeBot import TradeBot
 
 # Global constant variables
 TEST = yaml.safe_load(open(BASE_DIR / "config.yaml"))["TEST"]
@@ -350,3 +382,587 @@ class ScrapeStockTests(TestCase):
             1,
             "A new record is added and related to the company",
         )
+
+    def test_parse_record_with_last_update(self):
+        """parse_record() returns an unsaved Record, or None when it is not newer than last_update"""
+        company = CompanyFactory(code="AAA")
+        list_stripped_string = [
+            "#1",
+            "16-07-2021",
+            "15.95",
+            "-0.20",
+            "-1.25%",
+            "15.75",
+            "3,757,400",
+            "16.05",
+            "16.05",
+            "15.70",
+            "0",
+            "14,900",
+            "329,800",
+        ]
+        record = parse_record(list_stripped_string, company, AWARE_DATETIME)
+
+        self.assertIsNone(record.id, "The record is not saved")
+        self.assertEqual(record.rid, "AAA20210716")
+        self.assertEqual(record.close_vnd, 15750)
+        self.assertEqual(record.volume, 3757400)
+        self.assertEqual(Record.objects.count(), 0)
+
+        self.assertIsNone(
+            parse_record(
+                list_stripped_string, company, timezone.now() + timedelta(days=1)
+            ),
+            "Records older than last_update are not parsed",
+        )
+
+    def test_save_records(self):
+        """save_records() inserts records in bulk and skips the ones already in database"""
+        company = CompanyFactory()
+        records = RecordFactory.build_batch(20, company=company)
+        RecordFactory(company=company, rid=records[0].rid)
+
+        self.assertEqual(save_records(records), 19, "The duplicated rid is skipped")
+        self.assertEqual(company.record_set.count(), 20)
+        self.assertEqual(save_records(records), 0)
+        self.assertEqual(company.record_set.count(), 20, "Saving twice is a no-op")
+
+    def test_rate_limiter(self):
+        """RateLimiter spaces out requests from concurrent threads"""
+        rate_limiter = RateLimiter(interval=0.05)
+        request_times = []
+
+        def request():
+            rate_limiter.wait()
+            request_times.append(monotonic())
+
+        threads = [Thread(target=request) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        request_times.sort()
+        for previous, current in zip(request_times, request_times[1:]):
+            self.assertGreaterEqual(current - previous, 0.04)
+
+    def request_records_from(self, company, first_day, last_update, workers=4):
+        """request_records() over pages of 10 rows a day, newest first like cophieu68"""
+
+        def history_rows(company_instance, page_number):
+            return [
+                [
+                    f"#{row}",
+                    "{:%d-%m-%Y}".format(first_day - timedelta(days=row)),
+                    "15.95",
+                    "-0.20",
+                    "-1.25%",
+                    "15.75",
+                    "3,757,400",
+                    "16.05",
+                    "16.05",
+                    "15.70",
+                ]
+                for row in range((page_number - 1) * 10, page_number * 10)
+            ]
+
+        with patch(
+            "thade.backtesting.scrape_stock.request_history_rows",
+            side_effect=history_rows,
+        ) as request_history_rows:
+            request_records(company, last_update, workers=workers)
+        return request_history_rows
+
+    def test_request_records_with_concurrent_pages(self):
+        """request_records() saves pages in order and stops at last_update"""
+        company = CompanyFactory(code="AAA")
+        first_day = datetime(2021, 7, 16)
+
+        # VN Market opens at 09:00:00+07:00
+        last_update = HCM_TZ.localize(
+            first_day - timedelta(days=25) + timedelta(hours=9)
+        )
+        request_history_rows = self.request_records_from(
+            company, first_day, last_update
+        )
+
+        self.assertEqual(company.record_set.count(), 25)
+        self.assertEqual(
+            company.record_set.order_by("utc_trading_date").first().rid,
+            "AAA{:%Y%m%d}".format(first_day - timedelta(days=24)),
+        )
+        self.assertLessEqual(
+            request_history_rows.call_count,
+            3 + 4,
+            "At most a page per worker is wasted",
+        )
+
+    def test_request_records_daily_update(self):
+        """request_records() requests a single page when the update ends on it"""
+        company = CompanyFactory(code="AAA")
+        first_day = datetime(2021, 7, 16)
+
+        last_update = HCM_TZ.localize(
+            first_day - timedelta(days=1) + timedelta(hours=9)
+        )
+        request_history_rows = self.request_records_from(
+            company, first_day, last_update
+        )
+
+        self.assertEqual(company.record_set.count(), 1)
+        self.assertEqual(request_history_rows.call_count, 1)
+
+    def test_parse_history_rows(self):
+        """parse_history_rows() extracts record rows like the BeautifulSoup path"""
+        page = (BASE_DIR / "thade/tests/pages/historyprice_AAA_2.html").read_text()
+        rows = parse_history_rows(page)
+
+        self.assertEqual(len(rows), 20, "Header and label rows are skipped")
+        self.assertListEqual(rows, [tuple(row) for row in soup_history_rows(page)])
+        self.assertEqual(rows[0][:2], ("#21", "18-06-2021"))
+
+        self.assertIsNone(parse_history_rows("<html><body></body></html>"))
+        self.assertIsNone(
+            parse_history_rows("<html><head><title>T</title></head></html>"),
+            "Pages without a stock table don't fit scraping structure",
+        )
+
+
+class HttpSessionTests(TestCase):
+    def test_make_soup_reuses_connections(self):
+        """make_soup() keeps its connection alive across requests"""
+        with Cophieu68Server() as server:
+            for page_number in range(1, 4):
+                url = f"https://www.cophieu68.vn/historyprice.php?currentPage={page_number}&id=AAA"
+                self.assertIsInstance(make_soup(url), BeautifulSoup)
+
+        self.assertEqual(len(server.requests), 3)
+        self.assertEqual(len(server.client_ports), 1, "A single TCP connection is used")
+
+    def test_make_soup_retries_failed_requests(self):
+        """make_soup() retries 5xx responses before parsing"""
+        url = "https://www.cophieu68.vn/profilesymbol.php?id=AAA"
+        with Cophieu68Server(failures=2) as server:
+            soup = make_soup(url)
+
+        self.assertEqual(soup.h1.string, "CTCP Nhựa An Phát Xanh - AAA")
+        self.assertEqual(len(server.requests), 3)
+
+    def test_get_session_from_concurrent_threads(self):
+        """Scraping workers asking for the session at once share a single one"""
+        sessions = []
+
+        def request():
+            sessions.append(http_session.get_session())
+
+        with patch.object(http_session, "_session", None):
+            threads = [Thread(target=request) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            http_session.get_session().close()
+
+        self.assertEqual(len({id(session) for session in sessions}), 1)
+
+    def test_make_soup_with_invalid_structure(self):
+        url = "https://www.cophieu68.vn/historyprice.php?currentPage=2&id=XYZ"
+        with Cophieu68Server():
+            with self.assertRaisesMessage(
+                Exception,
+                "Given url doesn't fit scraping structure (Probably due to invalid company code): "
+                + url,
+            ):
+                make_soup(url)
+
+    def test_request_records_from_saved_pages(self):
+        company = CompanyFactory(code="AAA")
+        with Cophieu68Server():
+            request_records(company, workers=2)
+
+        self.assertEqual(company.record_set.count(), 60, "3 pages of 20 records")
+        self.assertEqual(
+            company.record_set.order_by("-utc_trading_date").first().rid, "AAA20210716"
+        )
+
+    def test_request_company_desc_from_saved_pages(self):
+        company = Company(code="AAA")
+        with Cophieu68Server():
+            request_company_desc(company)
+
+        self.assertEqual(company.name, "CTCP Nhựa An Phát Xanh")
+        self.assertEqual(company.website, "anphatbioplastics.com")
+        self.assertEqual(company.stock_exchange, "HOSE")
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        self.cache_dir = TemporaryDirectory()
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
+    def test_fresh_page_is_served_from_cache(self):
+        url = "https://www.cophieu68.vn/profilesymbol.php?id=AAA"
+        with Cophieu68Server(cache_dir=self.cache_dir.name) as server:
+            first_soup = make_soup(url)
+            second_soup = make_soup(url)
+
+        self.assertEqual(len(server.requests), 1, "The second request is not sent")
+        self.assertEqual(first_soup.h1.string, second_soup.h1.string)
+
+    def test_stale_page_is_revalidated(self):
+        url = "https://www.cophieu68.vn/historyprice.php?currentPage=1&id=AAA"
+        with Cophieu68Server() as server:
+            page_cache.configure(directory=self.cache_dir.name, ttl=0)
+            first_page = request_page(url)
+            second_page = request_page(url)
+
+        self.assertEqual(len(server.requests), 2)
+        self.assertEqual(server.not_modified, 1, "The server answered 304 Not Modified")
+        self.assertEqual(first_page, second_page)
+
+    def test_fresh_history_page_is_revalidated(self):
+        """History pages shift by a row every trading day, they are never served unchecked"""
+        url = "https://www.cophieu68.vn/historyprice.php?currentPage=1&id=AAA"
+        with Cophieu68Server(cache_dir=self.cache_dir.name) as server:
+            first_page = request_page(url)
+            second_page = request_page(url)
+
+        self.assertEqual(len(server.requests), 2)
+        self.assertEqual(server.not_modified, 1)
+        self.assertEqual(first_page, second_page)
+
+    def test_least_recently_used_pages_are_evicted(self):
+        cache = PageCache(self.cache_dir.name)
+        for i in range(3):
+            cache.set(CachedPage(f"url{i}", token_hex(2000), fetched_at=time()))
+            # Explicit mtimes, oldest first, whatever the file system's resolution
+            os.utime(cache._path(f"url{i}"), (time() - 100 + i, time() - 100 + i))
+        self.assertIsNotNone(cache.get("url0"), "url0 becomes the most recently used")
+
+        # Room for 3 pages (~2.4KB each) once evicted, not for 4
+        cache.max_bytes = os.path.getsize(cache._path("url0")) * 3.6
+        cache.set(CachedPage("url3", token_hex(2000), fetched_at=time()))
+        self.assertIsNotNone(cache.get("url0"))
+        self.assertIsNone(cache.get("url1"), "url1 is the least recently used")
+        self.assertIsNotNone(cache.get("url2"))
+        self.assertIsNotNone(cache.get("url3"))
+
+    def test_set_keeps_a_running_size(self):
+        cache = PageCache(self.cache_dir.name)
+        for i in range(3):
+            cache.set(CachedPage(f"url{i}", token_hex(2000), fetched_at=time()))
+        cache.set(CachedPage("url0", token_hex(1000), fetched_at=time()))
+        self.assertEqual(
+            cache.size,
+            sum(os.path.getsize(cache._path(f"url{i}")) for i in range(3)),
+        )
+
+        with patch("thade.backtesting.page_cache.os.scandir") as scandir:
+            cache.set(CachedPage("url3", token_hex(2000), fetched_at=time()))
+        scandir.assert_not_called()
+
+        with NamedTemporaryFile(dir=self.cache_dir.name, suffix=".tmp") as f:
+            cache.max_bytes = 0
+            cache.evict()
+            self.assertTrue(os.path.exists(f.name), "Pages being written are kept")
+        self.assertEqual(cache.size, 0)
+
+
+class PriceCacheTests(TestCase):
+    def setUp(self):
+        self.cache_dir = TemporaryDirectory()
+        self.cache = PriceCache(self.cache_dir.name)
+        self.company = seed(records=30, days_from_now=10)
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
+    def assertSeriesEqual(self, series: PriceSeries, company: Company):
+        records = company.record_set.order_by("utc_trading_date")
+        self.assertEqual(len(series), records.count())
+        self.assertListEqual(
+            series.close_vnd.tolist(),
+            list(records.values_list("close_vnd", flat=True)),
+        )
+        self.assertListEqual(
+            series.volume.tolist(), list(records.values_list("volume", flat=True))
+        )
+        self.assertEqual(
+            series.count_until(records.last().utc_trading_date), len(series)
+        )
+
+    def test_load_maps_cached_columns(self):
+        self.assertIsNone(self.cache.get(self.company))
+
+        series = self.cache.load(self.company)
+        self.assertSeriesEqual(series, self.company)
+        self.assertIsInstance(series.close_vnd, np.memmap, "Columns are not copied")
+
+        with self.assertNumQueries(1):
+            self.assertIs(type(self.cache.load(self.company).close_vnd), np.memmap)
+
+    def test_extend_appends_new_records(self):
+        self.cache.load(self.company)
+        newest = self.company.record_set.order_by("utc_trading_date").last()
+        for i in range(1, 6):
+            RecordFactory(
+                company=self.company,
+                utc_trading_date=newest.utc_trading_date + timedelta(days=i),
+            )
+
+        series = self.cache.extend(self.company)
+        self.assertSeriesEqual(series, self.company)
+        self.assertEqual(
+            os.path.getsize(self.cache.company_directory(self.company) / "close_vnd"),
+            35 * 8,
+            "Rows are appended once",
+        )
+
+    def test_load_refreshes_replaced_records(self):
+        old_series = self.cache.load(self.company)
+        record = self.company.record_set.order_by("utc_trading_date").first()
+        record.delete()
+        record.id = None
+        record.save()
+
+        self.assertFalse(old_series.is_current(price_cache.record_stats(self.company)))
+        self.assertSeriesEqual(self.cache.load(self.company), self.company)
+
+    def test_verify_refreshes_records_edited_in_any_column(self):
+        records = list(self.company.record_set.order_by("utc_trading_date")[:2])
+        self.cache.load(self.company)
+        records[0].volume += 100
+        records[0].save()
+        with self.assertNumQueries(1):
+            self.cache.load(self.company)  # Only the cheap fingerprint
+        self.assertSeriesEqual(self.cache.verify(self.company), self.company)
+
+        # Corrected closes keeping their sum
+        records[0].close_vnd += 100
+        records[1].close_vnd -= 100
+        for record in records:
+            record.save()
+        self.assertSeriesEqual(self.cache.verify(self.company), self.company)
+
+    def test_databases_do_not_share_companies(self):
+        self.assertEqual(
+            self.cache.company_directory(self.company),
+            self.cache.directory / connection.settings_dict["NAME"] / self.company.code,
+        )
+
+    def test_clear_records_invalidates_cache(self):
+        price_cache.configure(directory=self.cache_dir.name)
+        try:
+            price_cache.get_price_cache().load(self.company)
+            clear_records(self.company)
+            self.assertIsNone(price_cache.get_price_cache().get(self.company))
+        finally:
+            price_cache.configure()
+
+    def test_from_records_without_cache(self):
+        self.assertSeriesEqual(PriceSeries.from_records(self.company), self.company)
+
+    def test_cumulative_close_vnd(self):
+        series = self.cache.load(self.company)
+        closes = series.close_vnd.tolist()
+        cumulative = series.cumulative_close_vnd
+        self.assertIs(series.cumulative_close_vnd, cumulative, "Computed once")
+        self.assertEqual(len(cumulative), len(closes) + 1)
+        for end in range(len(closes) + 1):
+            self.assertEqual(cumulative[end], sum(closes[:end]))
+
+
+class VectorizedBacktestTests(TestCase):
+    def setUp(self):
+        from thade.tests.records_fixture import close_records
+
+        # Oldest first, as stored by TradeBotTests: 2019-08-21 to 2021-01-01
+        self.close_vnd = np.array(
+            [int(close_record) for close_record in reversed(close_records)]
+        )
+
+    def test_moving_average_signals(self):
+        from thade.tests.records_fixture import signals
+
+        test_signals = moving_average_signals(self.close_vnd)
+        self.assertTrue(np.all(test_signals[:199] == NO_SIGNAL))
+        self.assertListEqual(test_signals[199:][::-1].tolist(), signals)
+
+    def test_moving_average_signals_windows(self):
+        for short_window, long_window in [(0, 200), (200, 50), (50, 50), (-5, 10)]:
+            with self.assertRaises(ValueError):
+                moving_average_signals(self.close_vnd, short_window, long_window)
+
+    def test_backtest_moving_average(self):
+        from thade.tests.records_fixture import balance_vnd, bot_log_signals, stocks
+
+        result = backtest_moving_average(
+            self.close_vnd,
+            balance_vnd=Decimal(200 * 1000000),
+            fee=Decimal(0.0035),
+            stocks=500,
+        )
+
+        # bot_log_signals ends with the DEPLOY log
+        self.assertListEqual(result.signals[::-1].tolist(), bot_log_signals[:-1])
+        self.assertListEqual(result.stocks[::-1][:302].tolist(), stocks)
+        for test_balance, balance in zip(result.balance_vnd[::-1][:302], balance_vnd):
+            self.assertAlmostEqual(test_balance, balance, places=2)
+
+    def test_backtest_company_matches_trade_bot(self):
+        from thade.tests.records_fixture import close_records
+
+        company = CompanyFactory()
+        for i, close_record in enumerate(close_records):
+            RecordFactory(
+                company=company,
+                close_vnd=close_record,
+                utc_trading_date=AWARE_DATETIME.replace(
+                    hour=2, minute=0, second=0, microsecond=0
+                )
+                - timedelta(days=i),
+            )
+        deploy_date = AWARE_DATETIME - timedelta(days=300)
+
+        bot = TradeBot(
+            name="Jester",
+            balance_vnd=Decimal(20 * 1000000),
+            company=company,
+            fee=Decimal(0.0035),
+            algorithm=MovingAverage(),
+            deploy_date=deploy_date,
+        )
+        bot.track()
+        bot.toggle()
+        bot.run()
+
+        result = backtest_company(
+            company,
+            deploy_date,
+            balance_vnd=Decimal(20 * 1000000),
+            fee=Decimal(0.0035),
+        )
+        bot_log = BotLog.objects.exclude(signal=BotLog.Signal.DEPLOY).order_by(
+            "last_updated_record__utc_trading_date"
+        )
+        self.assertListEqual(
+            result.signals.tolist(), list(bot_log.values_list("signal", flat=True))
+        )
+        self.assertEqual(result.stocks[-1], bot.stocks)
+        self.assertEqual(result.control_stocks[-1], bot.control_stocks)
+        self.assertAlmostEqual(
+            result.balance_vnd[-1], float(bot.decimal_balance_vnd), 2
+        )
+        self.assertAlmostEqual(
+            result.all_time_min_total_vnd, float(bot.all_time_min_total_vnd), 2
+        )
+        self.assertAlmostEqual(
+            result.all_time_max_total_vnd, float(bot.all_time_max_total_vnd), 2
+        )
+
+
+class SweepTests(TestCase):
+    def setUp(self):
+        from thade.tests.records_fixture import close_records
+
+        self.company = CompanyFactory()
+        for i, close_record in enumerate(close_records):
+            RecordFactory(
+                company=self.company,
+                close_vnd=close_record,
+                utc_trading_date=AWARE_DATETIME.replace(
+                    hour=2, minute=0, second=0, microsecond=0
+                )
+                - timedelta(days=i),
+            )
+        self.deploy_dates = [
+            AWARE_DATETIME - timedelta(days=300),
+            AWARE_DATETIME - timedelta(days=100),
+        ]
+
+    def test_sweep_grid(self):
+        rows = list(
+            sweep(
+                [self.company],
+                short_windows=[20, 50, 200],
+                long_windows=[100, 200],
+                stocks_per_trade=[50, 100],
+                fees=[Decimal(0.0035)],
+                deploy_dates=self.deploy_dates,
+                workers=0,
+            )
+        )
+        # (20, 100), (20, 200), (50, 100), (50, 200) * 2 stocks_per_trade * 2 deploy dates
+        self.assertEqual(len(rows), 16)
+        self.assertTrue(all(len(row) == len(FIELDS) for row in rows))
+        self.assertFalse(any(row[1] >= row[2] for row in rows))
+
+        result = backtest_company(
+            self.company, self.deploy_dates[0], fee=Decimal(0.0035)
+        )
+        row = next(
+            row
+            for row in rows
+            if row[1:4] == (50, 200, 50) and row[5] == self.deploy_dates[0].isoformat()
+        )
+        self.assertAlmostEqual(row[FIELDS.index("roi")], result.roi, 4)
+        self.assertAlmostEqual(row[FIELDS.index("control_roi")], result.control_roi, 4)
+
+    def test_sweep_without_records_to_backtest(self):
+        rows = list(
+            sweep(
+                [self.company],
+                deploy_dates=[AWARE_DATETIME + timedelta(days=10)],
+                workers=0,
+            )
+        )
+        self.assertEqual(len(rows), 1)
+        self.assertIsNone(rows[0][FIELDS.index("roi")])
+
+    def test_write_sweep_gzip(self):
+        rows = sweep(
+            [self.company],
+            short_windows=[20, 50],
+            deploy_dates=self.deploy_dates,
+            workers=0,
+        )
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, "sweep.csv.gz")
+            self.assertEqual(write_sweep(rows, path), 4)
+            with gzip.open(path, "rt") as f:
+                lines = list(csv.reader(f))
+        self.assertListEqual(lines[0], list(FIELDS))
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(lines[1][0], self.company.code)
+
+
+class BenchmarkCommandTests(TestCase):
+    def test_output_and_compare(self):
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, "benchmark.json")
+            call_command(
+                "benchmark",
+                "get_trade_bot",
+                "parse_and_save",
+                output=path,
+                stdout=StringIO(),
+            )
+            with open(path) as f:
+                saved = json.load(f)
+            self.assertEqual(
+                set(saved["results"]),
+                {
+                    "get_trade_bot",
+                    "get_trade_bots",
+                    "parse_and_save.parse_and_save_record",
+                    "parse_and_save.save_records",
+                },
+            )
+            self.assertGreater(saved["results"]["get_trade_bot"]["seconds_per_bot"], 0)
+
+            stdout = StringIO()
+            call_command("benchmark", "get_trade_bot", compare=path, stdout=stdout)
+            self.assertIn("get_trade_bot.seconds_per_bot: ", stdout.getvalue())
+        self.assertFalse(Company.objects.exists(), "Seeded rows are rolled back")
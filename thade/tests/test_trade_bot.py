@@ -1,14 +1,28 @@
+import csv
+import gzip
 import os
+import subprocess
+import sys
 import warnings
 from decimal import Decimal
 from glob import glob
+from io import BytesIO, StringIO
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
 
 import yaml
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 from django.utils import timezone
 
 from projectthade.settings import BASE_DIR
-from thade.models import Bot, BotLog
+from thade.backtesting.price_cache import PriceSeries
+from thade.instrumentation import Instrumentation, instrument, phase
+from thade.models import Bot, BotLog, BotLogSummary, BotState, Record
 from thade.tests.models_factory import (
     BotFactory,
     BotLogFactory,
@@ -16,9 +30,25 @@ from thade.tests.models_factory import (
     RecordFactory,
     seed,
 )
+from thade.trade_bot import export, money, partitions, registry, retention
 from thade.trade_bot.Algorithm import Algorithm
+from thade.trade_bot.Bar import Bar
+from thade.trade_bot.CompanySeries import CompanySeries
+from thade.trade_bot.money import SCALE
 from thade.trade_bot.MovingAverage import MovingAverage
-from thade.trade_bot.TradeBot import TradeBot, get_trade_bot
+from thade.trade_bot.registry import (
+    get_algorithm_class,
+    load_algorithm,
+    parse_algorithm,
+    register,
+)
+from thade.trade_bot.runner import run_bots
+from thade.trade_bot.TradeBot import (
+    MONEY_ATTRIBUTES,
+    TradeBot,
+    get_trade_bot,
+    get_trade_bots,
+)
 
 # Global constant variables
 TEST = yaml.safe_load(open(BASE_DIR / "config.yaml"))["TEST"]
@@ -55,6 +85,139 @@ class AlgorithmTests(TestCase):
         )
 
 
+class RegistryTests(TestCase):
+    def tearDown(self):
+        registry.ALGORITHMS.pop("Custom", None)
+        registry._classes.pop("Custom", None)
+
+    def test_parse_algorithm(self):
+        self.assertEqual(parse_algorithm("MovingAverage"), ("MovingAverage", [], {}))
+        self.assertEqual(
+            parse_algorithm("MovingAverage(20,long_window=100)"),
+            ("MovingAverage", [20], {"long_window": 100}),
+        )
+        for value in ["", "MovingAverage(", "MovingAverage(a)", "os.system('ls')"]:
+            with self.assertRaises(ValueError):
+                parse_algorithm(value)
+
+    def test_load_algorithm(self):
+        moving_average = load_algorithm(str(MovingAverage(20, 100)))
+        self.assertIsInstance(moving_average, MovingAverage)
+        self.assertEqual(moving_average.short_window, 20)
+        self.assertEqual(moving_average.long_window, 100)
+        self.assertIs(type(load_algorithm("Algorithm")), Algorithm)
+
+        with self.assertRaisesMessage(ValueError, "Unregistered algorithm: Custom"):
+            load_algorithm("Custom")
+        with self.assertRaises(ValueError):
+            load_algorithm("Algorithm(1,2,3)")
+
+    def test_register(self):
+        register("Custom", "thade.trade_bot.MovingAverage.MovingAverage")
+        self.assertIs(get_algorithm_class("Custom"), MovingAverage)
+
+    def test_trade_bot_imports_algorithms_lazily(self):
+        # A fresh interpreter, modules imported by the tests are not reloaded
+        output = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import django, sys; django.setup();"
+                "import thade.trade_bot.runner;"
+                "print(sorted({'numpy', 'faker', 'thade.trade_bot.MovingAverage'} & set(sys.modules)))",
+            ],
+            cwd=BASE_DIR,
+            env={**os.environ, "DJANGO_SETTINGS_MODULE": "projectthade.settings"},
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        self.assertEqual(output.strip(), "[]")
+
+
+class MoneyTests(TestCase):
+    def test_to_fixed(self):
+        self.assertEqual(money.to_fixed(Decimal(20 * 1000000)), 20 * 1000000 * SCALE)
+        self.assertEqual(money.to_fixed(Decimal("0.0035")), 3500)
+        self.assertEqual(money.to_fixed(Decimal(0.0035)), 3500)
+        # Half to even on the 6th decimal place
+        self.assertEqual(money.to_fixed(Decimal("0.0000005")), 0)
+        self.assertEqual(money.to_fixed(Decimal("0.0000015")), 2)
+
+    def test_to_decimal(self):
+        for value in ["200000000.5", "0.0035", "-12.000001"]:
+            self.assertEqual(
+                money.to_decimal(money.to_fixed(Decimal(value))), Decimal(value)
+            )
+
+
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        self.company = seed(records=300, days_from_now=1)
+
+    def tearDown(self):
+        for file in glob(str(BASE_DIR / "thade/trade_bot/logs/Jester_*.txt")):
+            os.remove(file)
+
+    def test_phase_without_instrument(self):
+        with phase("trade_bot.run") as stats:
+            stats.rows += 1
+        with instrument() as instrumentation:
+            pass
+        self.assertDictEqual(instrumentation.report(), {})
+
+    def test_instrument_trade_bot_run(self):
+        bot = TradeBot(
+            name="Jester",
+            balance_vnd=Decimal(200 * 1000000),
+            company=self.company,
+            fee=Decimal(0.0035),
+            algorithm=MovingAverage(),
+            deploy_date=timezone.now() - timezone.timedelta(days=100),
+        )
+        bot.track()
+        bot.toggle()
+        deploy_logs = bot.model.botlog_set.count()
+
+        with instrument() as instrumentation:
+            bot.run()
+        report = instrumentation.report()
+
+        self.assertEqual(report["trade_bot.run"]["calls"], 1)
+        self.assertEqual(report["company_series.load"]["rows"], 300)
+        logs = bot.model.botlog_set.count() - deploy_logs
+        self.assertEqual(report["trade_bot.log"]["rows"], logs)
+        self.assertEqual(report["bot_log.flush"]["rows"], logs)
+        self.assertGreater(report["algorithm.action"]["calls"], 0)
+        for name in ("company_series.load", "bot_log.flush"):
+            self.assertGreater(report[name]["queries"], 0)
+            self.assertLessEqual(
+                report[name]["queries"], report["trade_bot.run"]["queries"]
+            )
+            self.assertLessEqual(
+                report[name]["seconds"], report["trade_bot.run"]["seconds"]
+            )
+
+        merged = Instrumentation()
+        merged.merge(report)
+        merged.merge(report)
+        self.assertEqual(merged.phases["trade_bot.run"].calls, 2)
+        self.assertEqual(merged.phases["bot_log.flush"].rows, 2 * logs)
+
+    def test_prometheus(self):
+        instrumentation = Instrumentation()
+        with instrument(instrumentation):
+            with phase("bot_log.flush") as stats:
+                stats.rows += 3
+                Bot.objects.count()
+        lines = instrumentation.prometheus().splitlines()
+
+        self.assertIn("# TYPE thade_phase_rows_total counter", lines)
+        self.assertIn('thade_phase_calls_total{phase="bot_log.flush"} 1', lines)
+        self.assertIn('thade_phase_queries_total{phase="bot_log.flush"} 1', lines)
+        self.assertIn('thade_phase_rows_total{phase="bot_log.flush"} 3', lines)
+
+
 class MovingAverageTests(TestCase):
     def setUp(self):
         from thade.tests.records_fixture import (
@@ -80,12 +243,12 @@ class MovingAverageTests(TestCase):
         self.assertQuerysetEqual(
             moving_average.data, self.company.record_set.order_by("-utc_trading_date")
         )
-        self.assertQuerysetEqual(moving_average.close_50, self.close_records[:50])
-        self.assertQuerysetEqual(moving_average.close_200, self.close_records[:200])
+        self.assertQuerysetEqual(moving_average.close_short, self.close_records[:50])
+        self.assertQuerysetEqual(moving_average.close_long, self.close_records[:200])
 
         moving_average.compute()
-        self.assertEqual(moving_average.moving_50, 107772)
-        self.assertEqual(moving_average.moving_200, 95046)
+        self.assertEqual(moving_average.moving_short, 107772)
+        self.assertEqual(moving_average.moving_long, 95046)
 
         self.assertEqual(moving_average.action(), Algorithm.BUY)
 
@@ -118,8 +281,8 @@ class MovingAverageTests(TestCase):
                 )
 
                 test_signals.append(moving_average.action())
-                test_moving_50.append(moving_average.moving_50)
-                test_moving_200.append(moving_average.moving_200)
+                test_moving_50.append(moving_average.moving_short)
+                test_moving_200.append(moving_average.moving_long)
             except UserWarning:
                 pass
 
@@ -130,6 +293,86 @@ class MovingAverageTests(TestCase):
         self.assertListEqual(test_moving_200, self.moving_200)
         self.assertListEqual(test_signals, self.signals)
 
+    def test_update_series_on_all_500_records(self):
+        moving_average = MovingAverage()
+        series = list(self.company.record_set.order_by("utc_trading_date"))
+        test_moving_50 = []
+        test_moving_200 = []
+        test_signals = []
+        for end in range(2, len(series) + 1):
+            try:
+                moving_average.update_series(series, end)
+
+                test_signals.append(moving_average.action())
+                test_moving_50.append(moving_average.moving_short)
+                test_moving_200.append(moving_average.moving_long)
+            except UserWarning as e:
+                self.assertEqual(
+                    str(e),
+                    f"Not enough records to compute moving average: {end} < 200",
+                )
+
+        test_moving_50.reverse()
+        test_moving_200.reverse()
+        test_signals.reverse()
+        self.assertListEqual(test_moving_50, self.moving_50)
+        self.assertListEqual(test_moving_200, self.moving_200)
+        self.assertListEqual(test_signals, self.signals)
+
+    def test_warm_up_and_push(self):
+        closes = [int(close_record) for close_record in reversed(self.close_records)]
+        moving_average = MovingAverage()
+
+        moving_average.warm_up(closes[:250])
+        self.assertEqual(len(moving_average.window), 200)
+        self.assertEqual(moving_average.sum_short, sum(closes[200:250]))
+        self.assertEqual(moving_average.sum_long, sum(closes[50:250]))
+
+        for i in range(250, len(closes)):
+            moving_average.push(closes[i])
+            self.assertEqual(moving_average.sum_short, sum(closes[i - 49 : i + 1]))
+            self.assertEqual(moving_average.sum_long, sum(closes[i - 199 : i + 1]))
+
+    def test_update_price_series_with_windows(self):
+        closes = [int(close_record) for close_record in reversed(self.close_records)]
+        series = PriceSeries.from_records(self.company)
+        records = list(self.company.record_set.order_by("utc_trading_date"))
+        prices_moving_average = MovingAverage(short_window=20, long_window=100)
+        records_moving_average = MovingAverage(short_window=20, long_window=100)
+        for end in range(100, len(closes) + 1):
+            prices_moving_average.update_series(series, end)
+            records_moving_average.update_series(records, end)
+
+            self.assertEqual(
+                prices_moving_average.action(), records_moving_average.action()
+            )
+            self.assertEqual(
+                prices_moving_average.moving_short, sum(closes[end - 20 : end]) / 20
+            )
+            self.assertEqual(
+                prices_moving_average.moving_long, sum(closes[end - 100 : end]) / 100
+            )
+            self.assertEqual(
+                prices_moving_average.moving_long, records_moving_average.moving_long
+            )
+
+        with self.assertRaisesMessage(
+            UserWarning, "Not enough records to compute moving average: 99 < 100"
+        ):
+            prices_moving_average.update_series(series, 99)
+
+    def test_windows(self):
+        self.assertEqual(str(MovingAverage()), "MovingAverage")
+        self.assertEqual(str(MovingAverage(50, 200)), "MovingAverage")
+        self.assertEqual(
+            str(MovingAverage(20, 100)),
+            "MovingAverage(short_window=20,long_window=100)",
+        )
+        with self.assertRaises(ValueError):
+            MovingAverage(200, 50)
+        with self.assertRaises(ValueError):
+            MovingAverage(0, 50)
+
 
 class TradeBotTests(TestCase):
     def setUp(self):
@@ -150,8 +393,9 @@ class TradeBotTests(TestCase):
 
     @classmethod
     def tearDownClass(cls):
-        for file in glob(str(BASE_DIR / r"thade/trade_bot/logs/Jester_*.txt")):
+        for file in glob(str(BASE_DIR / r"thade/trade_bot/logs/Jester*_*.txt")):
             os.remove(file)
+        super().tearDownClass()
 
     def test_name_longer_than_34_chars(self):
         long_name = "thisisanamethatislongerthan34characters"
@@ -769,6 +1013,47 @@ class TradeBotTests(TestCase):
         self.assertEqual(bot.model.botlog_set.all()[4].signal, BotLog.Signal.ERR)
         self.assertIn(log_str_err, bot.model.botlog_set.all()[4].log_str)
 
+    def test_log_columns(self):
+        bot = TradeBot(
+            name="Jester",
+            balance_vnd=Decimal(200 * 1000000),
+            company=self.company,
+            fee=Decimal("0.0035"),
+            algorithm=Algorithm(),
+            deploy_date=AWARE_DATETIME,
+        )
+        bot.track()
+        messages = [f"{bot.name} is deployed"]
+        bot.invest(Decimal("1000000.5"))
+        messages.append("Invest 1000000.5 VND")
+        for signal in (Algorithm.BUY, Algorithm.HOLD, Algorithm.SELL, Algorithm.SELL):
+            log_str, result_signal = bot.action(signal)
+            bot.log(log_str, result_signal)
+            messages.append(log_str)
+        bot.withdraw(Decimal(1000))
+        messages.append("Withdraw 1000 VND")
+        bot.log("Invalid signal: 777", BotLog.Signal.ERR)
+        messages.append("Invalid signal: 777")
+
+        bot_logs = list(bot.model.botlog_set.order_by("id"))
+        self.assertListEqual([bot_log.message for bot_log in bot_logs], messages)
+        self.assertEqual(
+            bot_logs[2].log_str,
+            "{:%Y-%m-%d}: BUY 50 {}".format(
+                bot.last_updated_record.utc_trading_date, self.company.code
+            ),
+        )
+        self.assertEqual(bot_logs[2].quantity, 50)
+        self.assertEqual(bot_logs[2].price_vnd, bot.last_updated_record.close_vnd)
+        self.assertEqual(bot_logs[5].signal, BotLog.Signal.NOT_SELL)
+        self.assertEqual(bot_logs[5].quantity, 50)
+        self.assertEqual(bot_logs[1].amount_vnd, Decimal("1000000.5"))
+        for bot_log in (bot_logs[0], bot_logs[3]):
+            self.assertIsNone(bot_log.quantity)
+            self.assertIsNone(bot_log.price_vnd)
+            self.assertIsNone(bot_log.amount_vnd)
+            self.assertEqual(bot_log.detail, "")
+
     def test_run_when_bot_inactive(self):
         bot = TradeBot(
             name="Jester",
@@ -812,6 +1097,53 @@ class TradeBotTests(TestCase):
                 - timezone.timedelta(days=i),
             )
 
+    def test_run_buffers_bot_logs(self):
+        bot = TradeBot(
+            name="Jester",
+            balance_vnd=Decimal(200 * 1000000),
+            company=self.company,
+            fee=Decimal(0.0035),
+            algorithm=Algorithm(),
+            deploy_date=AWARE_DATETIME - timezone.timedelta(days=30),
+        )
+
+        bot.track()
+        bot.toggle()
+
+        with CaptureQueriesContext(connection) as context:
+            bot.run(flush_size=10)
+        inserts = [
+            query
+            for query in context.captured_queries
+            if query["sql"].startswith('INSERT INTO "thade_botlog"')
+        ]
+        self.assertEqual(len(inserts), 3, "30 rows are flushed 10 at a time")
+        self.assertEqual(BotLog.objects.count(), 31)
+        self.assertIsNone(bot.log_buffer)
+
+    def test_run_without_buffering_bot_logs(self):
+        bot = TradeBot(
+            name="Jester",
+            balance_vnd=Decimal(200 * 1000000),
+            company=self.company,
+            fee=Decimal(0.0035),
+            algorithm=Algorithm(),
+            deploy_date=AWARE_DATETIME - timezone.timedelta(days=30),
+        )
+
+        bot.track()
+        bot.toggle()
+
+        with CaptureQueriesContext(connection) as context:
+            bot.run(flush_size=None)
+        inserts = [
+            query
+            for query in context.captured_queries
+            if query["sql"].startswith('INSERT INTO "thade_botlog"')
+        ]
+        self.assertEqual(len(inserts), 30, "Every row is inserted on its own")
+        self.assertEqual(BotLog.objects.count(), 31)
+
     def test_run_moving_average(self):
         from thade.tests.records_fixture import balance_vnd, bot_log_signals, stocks
 
@@ -845,12 +1177,228 @@ class TradeBotTests(TestCase):
         self.assertQuerysetEqual(test_stocks, stocks)
         self.assertQuerysetEqual(test_decimal_balance_vnd, balance_vnd)
 
+    def test_run_moving_average_without_replay(self):
+        from thade.tests.records_fixture import balance_vnd, bot_log_signals, stocks
+
+        bot = TradeBot(
+            name="Jester",
+            balance_vnd=Decimal(200 * 1000000),
+            stocks=500,
+            company=self.company,
+            fee=Decimal(0.0035),
+            algorithm=MovingAverage(),
+            deploy_date=AWARE_DATETIME - timezone.timedelta(days=499),
+        )
+
+        bot.track()
+        bot.toggle()
+
+        bot.run(replay=False)
+        bot_log = BotLog.objects.order_by("-last_updated_record__utc_trading_date")
+        self.assertEqual(bot_log.count(), 500)
+
+        test_bot_log_signals = bot_log.values_list("signal", flat=True)
+        test_stocks = bot_log[:302].values_list("stocks", flat=True)
+        test_decimal_balance_vnd = bot_log[:302].values_list(
+            "decimal_balance_vnd", flat=True
+        )
+        self.assertQuerysetEqual(test_bot_log_signals, bot_log_signals)
+        self.assertQuerysetEqual(test_stocks, stocks)
+        self.assertQuerysetEqual(test_decimal_balance_vnd, balance_vnd)
+
+    def test_run_on_shared_company_series(self):
+        def deploy(name, days, stocks_per_trade, fee):
+            bot = TradeBot(
+                name=name,
+                balance_vnd=Decimal(200 * 1000000),
+                company=self.company,
+                fee=fee,
+                algorithm=MovingAverage(),
+                stocks_per_trade=stocks_per_trade,
+                deploy_date=AWARE_DATETIME - timezone.timedelta(days=days),
+            )
+            bot.track()
+            bot.toggle()
+            return bot
+
+        settings = [(300, 50, Decimal(0.0035)), (450, 20, Decimal(0.001))]
+        alone_bots = [deploy("Jester", *setting) for setting in settings]
+        for bot in alone_bots:
+            bot.run()
+
+        company_series = CompanySeries(self.company)
+        shared_bots = [deploy("JesterShared", *setting) for setting in settings]
+        with CaptureQueriesContext(connection) as context:
+            for bot in shared_bots:
+                bot.run(company_series=company_series)
+        self.assertFalse(
+            any('FROM "thade_record"' in query["sql"] for query in context),
+            "Records are loaded once",
+        )
+        self.assertListEqual(list(company_series.signals), [("MovingAverage", None)])
+        self.assertEqual(
+            company_series.signals["MovingAverage", None][0],
+            len(self.company.record_set.all()) - 450 + 1,
+        )
+
+        for alone_bot, shared_bot in zip(alone_bots, shared_bots):
+            self.assertEqual(
+                shared_bot.decimal_balance_vnd, alone_bot.decimal_balance_vnd
+            )
+            self.assertEqual(shared_bot.stocks, alone_bot.stocks)
+            self.assertEqual(
+                shared_bot.control_decimal_balance_vnd,
+                alone_bot.control_decimal_balance_vnd,
+            )
+            self.assertEqual(
+                shared_bot.all_time_max_total_vnd, alone_bot.all_time_max_total_vnd
+            )
+            self.assertListEqual(
+                list(
+                    shared_bot.model.botlog_set.order_by("id").values_list(
+                        "signal", flat=True
+                    )
+                ),
+                list(
+                    alone_bot.model.botlog_set.order_by("id").values_list(
+                        "signal", flat=True
+                    )
+                ),
+            )
+
+    def test_signals_of_fee_dependent_algorithms(self):
+        class FeeAware(Algorithm):
+            name = "FeeAware"
+
+            def action(self):
+                return self.BUY if self.TRADE_FEE < Decimal("0.002") else self.SELL
+
+        company_series = CompanySeries(self.company)
+        start = len(company_series.bars) - 10
+        cheap, expensive = FeeAware(Decimal("0.001")), FeeAware(Decimal("0.0035"))
+        self.assertEqual(set(company_series.signals_of(cheap, start)), {Algorithm.BUY})
+        self.assertEqual(
+            set(company_series.signals_of(expensive, start)), {Algorithm.SELL}
+        )
+        self.assertEqual(len(company_series.signals), 2)
+
+    def test_replay_on_bars(self):
+        bot = TradeBot(
+            name="Jester",
+            balance_vnd=Decimal(200 * 1000000),
+            company=self.company,
+            fee=Decimal(0.0035),
+            algorithm=MovingAverage(),
+            deploy_date=AWARE_DATETIME - timezone.timedelta(days=300),
+        )
+        bot.track()
+        bot.toggle()
+
+        company_series = CompanySeries(self.company)
+        self.assertTrue(all(type(bar) is Bar for bar in company_series.bars))
+        self.assertEqual(len(company_series.bars), len(company_series.prices))
+        newest_record = self.company.record_set.order_by("utc_trading_date").last()
+        self.assertEqual(company_series.bars[-1].id, newest_record.id)
+
+        bot.run(company_series=company_series)
+        self.assertIs(type(bot.last_updated_record), Record)
+        self.assertEqual(bot.last_updated_record, newest_record)
+        self.assertListEqual(
+            list(
+                bot.model.botlog_set.exclude(signal=BotLog.Signal.DEPLOY)
+                .order_by("id")
+                .values_list("last_updated_record_id", flat=True)
+            ),
+            [bar.id for bar in company_series.bars[-300:]],
+        )
+
+    def test_bars_of_sub_second_records(self):
+        newest_record = self.company.record_set.order_by("utc_trading_date").last()
+        sub_second_record = RecordFactory(
+            company=self.company,
+            utc_trading_date=newest_record.utc_trading_date
+            + timezone.timedelta(days=1, microseconds=500000),
+        )
+
+        with self.assertNumQueries(3):  # Cache fingerprint, columns, newest record
+            company_series = CompanySeries(self.company)
+        self.assertEqual(len(company_series.bars), len(company_series.prices))
+        self.assertEqual(
+            company_series.bars[-1],
+            Bar(
+                sub_second_record.id,
+                sub_second_record.rid,
+                sub_second_record.utc_trading_date,
+                sub_second_record.close_vnd,
+            ),
+        )
+        self.assertEqual(
+            company_series.index_of(sub_second_record.utc_trading_date),
+            len(company_series.bars) - 1,
+        )
+        self.assertEqual(
+            company_series.record(len(company_series.bars) - 1), sub_second_record
+        )
+
+    def test_run_with_fixed_point(self):
+        def deploy(name, fee):
+            bot = TradeBot(
+                name=name,
+                balance_vnd=Decimal("200000000.5"),
+                company=self.company,
+                fee=fee,
+                algorithm=MovingAverage(),
+                stocks_per_trade=50,
+                deploy_date=AWARE_DATETIME - timezone.timedelta(days=450),
+            )
+            bot.track()
+            bot.toggle()
+            return bot
+
+        money_fields = [
+            "signal",
+            "decimal_balance_vnd",
+            "stocks",
+            "decimal_investment_vnd",
+            "all_time_min_total_vnd",
+            "all_time_max_total_vnd",
+            "control_decimal_balance_vnd",
+            "control_stocks",
+        ]
+        for fee in [Decimal("0.0035"), Decimal(0.0035), Decimal("0.001")]:
+            decimal_bot = deploy("Jester", fee)
+            decimal_bot.run()
+            fixed_point_bot = deploy("JesterFixed", fee)
+            fixed_point_bot.run(fixed_point=True)
+
+            self.assertFalse(fixed_point_bot.fixed_point)
+            for name in MONEY_ATTRIBUTES:
+                self.assertIsInstance(getattr(fixed_point_bot, name), Decimal)
+                self.assertAlmostEqual(
+                    getattr(fixed_point_bot, name), getattr(decimal_bot, name), 9
+                )
+            self.assertListEqual(
+                list(
+                    fixed_point_bot.model.botlog_set.order_by("id").values_list(
+                        *money_fields
+                    )
+                ),
+                list(
+                    decimal_bot.model.botlog_set.order_by("id").values_list(
+                        *money_fields
+                    )
+                ),
+            )
+            decimal_bot.model.delete()
+            fixed_point_bot.model.delete()
+
     def test_get_trade_bot(self):
         bot = BotFactory(company=self.company)
         for i in range(20):
             BotLogFactory(bot=bot, last_updated_record=bot.company.record_set.all()[i])
 
         last_log: BotLog = bot.botlog_set.last()
+        BotState.from_log(last_log).save()
 
         trade_bot = get_trade_bot(bot)
 
@@ -879,3 +1427,445 @@ class TradeBotTests(TestCase):
         self.assertEqual(trade_bot.is_active, bot.is_active)
         self.assertTrue(trade_bot.is_tracking)
         self.assertEqual(trade_bot.model, bot)
+
+    def test_get_trade_bots(self):
+        bots = []
+        for name in ("Jester", "Joker", "Bishop"):
+            bot = TradeBot(
+                name=name,
+                balance_vnd=Decimal(20 * 1000000),
+                company=self.company,
+                fee=Decimal(0.0035),
+                algorithm=MovingAverage(short_window=20, long_window=100),
+                deploy_date=AWARE_DATETIME - timezone.timedelta(days=300),
+            )
+            bot.track()
+            bot.toggle()
+            bot.run()
+            bots.append(bot)
+        logs = BotLog.objects.count()
+
+        with CaptureQueriesContext(connection) as queries:
+            trade_bots = get_trade_bots(
+                Bot.objects.filter(name__in=["Jester", "Joker", "Bishop"]).order_by(
+                    "id"
+                )
+            )
+            for trade_bot in trade_bots:
+                self.assertEqual(trade_bot.company.code, self.company.code)
+                self.assertIsNotNone(trade_bot.last_updated_record.utc_trading_date)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(BotLog.objects.count(), logs)
+
+        for bot, trade_bot in zip(bots, trade_bots):
+            last_log = bot.model.botlog_set.order_by("id").last()
+            state = BotState.objects.get(bot=bot.model)
+            for field in BotState.FIELDS:
+                self.assertEqual(getattr(state, field), getattr(last_log, field))
+            self.assertEqual(trade_bot.bid, bot.bid)
+            self.assertEqual(trade_bot.algorithm.short_window, 20)
+            self.assertEqual(
+                trade_bot.decimal_balance_vnd, last_log.decimal_balance_vnd
+            )
+            self.assertEqual(trade_bot.stocks, bot.stocks)
+            self.assertEqual(trade_bot.control_stocks, bot.control_stocks)
+            self.assertEqual(trade_bot.last_updated_record, bot.last_updated_record)
+            self.assertTrue(trade_bot.is_active)
+
+        # Bot models already loaded with their company
+        models = list(Bot.objects.select_related("company").order_by("id"))
+        with self.assertNumQueries(1):
+            self.assertListEqual(
+                [trade_bot.bid for trade_bot in get_trade_bots(models)],
+                [bot.bid for bot in bots],
+            )
+
+        bot = BotFactory(company=self.company)
+        with self.assertRaises(BotState.DoesNotExist):
+            get_trade_bot(bot)
+
+    def test_bot_state(self):
+        bot = TradeBot(
+            name="Jester",
+            balance_vnd=Decimal(20 * 1000000),
+            company=self.company,
+            fee=Decimal("0.0035"),
+            algorithm=MovingAverage(),
+            deploy_date=AWARE_DATETIME - timezone.timedelta(days=300),
+        )
+        self.assertFalse(BotState.objects.exists())
+        bot.track()
+        self.assertEqual(bot.model.state.decimal_balance_vnd, Decimal(20 * 1000000))
+
+        bot.invest(Decimal(1000000))
+        bot.toggle()
+        bot.run(flush_size=100)
+        bot.invest(Decimal(1000000))
+        state = BotState.objects.get(bot=bot.model)
+        last_log = bot.model.botlog_set.order_by("id").last()
+        self.assertEqual(last_log.signal, BotLog.Signal.INVEST)
+        for field in BotState.FIELDS:
+            self.assertEqual(getattr(state, field), getattr(last_log, field))
+        self.assertEqual(state.last_updated_record, bot.last_updated_record)
+        self.assertEqual(state.stocks, bot.stocks)
+
+        bot.model.delete()
+        self.assertFalse(BotState.objects.exists())
+
+    def test_get_trade_bot_with_algorithm_windows(self):
+        bot = TradeBot(
+            name="Jester",
+            balance_vnd=Decimal(20 * 1000000),
+            company=self.company,
+            fee=Decimal(0.0035),
+            algorithm=MovingAverage(short_window=20, long_window=100),
+        )
+        bot.track()
+        self.assertEqual(
+            bot.model.algorithm, "MovingAverage(short_window=20,long_window=100)"
+        )
+
+        trade_bot = get_trade_bot(bot.model)
+        self.assertIsInstance(trade_bot.algorithm, MovingAverage)
+        self.assertEqual(trade_bot.algorithm.short_window, 20)
+        self.assertEqual(trade_bot.algorithm.long_window, 100)
+
+        # Positional windows, as stored before parameters were named
+        bot.model.algorithm = "MovingAverage(30,120)"
+        self.assertEqual(get_trade_bot(bot.model).algorithm.long_window, 120)
+
+        for algorithm in [
+            "MovingAverage(100,20)",
+            "MovingAverage(a)",
+            "MovingAverage(window=20)",
+            "Unknown",
+        ]:
+            bot.model.algorithm = algorithm
+            with self.assertWarns(UserWarning):
+                trade_bot = get_trade_bot(bot.model)
+            self.assertIs(type(trade_bot.algorithm), Algorithm)
+
+
+class BotLogStorageTests(TestCase):
+    def setUp(self):
+        from thade.tests.records_fixture import close_records
+
+        self.company = CompanyFactory()
+        for i, close_record in enumerate(close_records):
+            RecordFactory(
+                company=self.company,
+                close_vnd=close_record,
+                utc_trading_date=AWARE_DATETIME.replace(
+                    hour=2, minute=0, second=0, microsecond=0
+                )
+                - timezone.timedelta(days=i),
+            )
+        self.bot = TradeBot(
+            name="Jester",
+            balance_vnd=Decimal(20 * 1000000),
+            company=self.company,
+            fee=Decimal("0.0035"),
+            algorithm=MovingAverage(),
+            deploy_date=AWARE_DATETIME - timezone.timedelta(days=300),
+        )
+        self.bot.track()
+        self.bot.toggle()
+        self.bot.run()
+
+    def tearDown(self):
+        for file in glob(str(BASE_DIR / "thade/trade_bot/logs/Jester_*.txt")):
+            os.remove(file)
+
+    def count_rows(self, table: str) -> int:
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM "{table}"')
+            return cursor.fetchone()[0]
+
+    def test_partition_bot_logs(self):
+        logs = self.bot.model.botlog_set.count()
+        self.assertEqual(self.count_rows(partitions.DEFAULT_PARTITION), logs)
+        for log in self.bot.model.botlog_set.all():
+            self.assertEqual(
+                log.utc_trading_date, log.last_updated_record.utc_trading_date
+            )
+
+        created = partitions.partition_bot_logs(months_ahead=1)
+        self.assertEqual(sum(created.values()), logs)
+        self.assertEqual(created["thade_botlog_202101"], 1)
+        self.assertEqual(self.count_rows(partitions.DEFAULT_PARTITION), 0)
+        self.assertEqual(self.count_rows("thade_botlog_202012"), 31)
+        self.assertIn("thade_botlog_202012", partitions.partitions())
+        self.assertEqual(self.bot.model.botlog_set.count(), logs)
+        self.assertDictEqual(partitions.partition_bot_logs(months_ahead=1), {})
+
+        self.bot.invest(Decimal(1000000))
+        self.assertEqual(self.count_rows("thade_botlog_202101"), 2)
+        self.assertEqual(self.count_rows(partitions.DEFAULT_PARTITION), 0)
+
+    def test_compact_bot_logs(self):
+        daily_logs = BotLog.objects.filter(signal__in=retention.COMPACTED_SIGNALS)
+        expected = {}
+        for signal, utc_trading_date in daily_logs.values_list(
+            "signal", "utc_trading_date"
+        ):
+            key = (partitions.month_of(utc_trading_date), signal)
+            expected[key] = expected.get(key, 0) + 1
+        kept = list(
+            BotLog.objects.exclude(signal__in=retention.COMPACTED_SIGNALS)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        state = BotState.objects.get(bot=self.bot.model)
+        self.assertTrue(kept)
+        self.assertTrue(expected)
+
+        deleted = retention.compact_bot_logs(retention_months=1)
+        self.assertEqual(sum(deleted.values()), sum(expected.values()))
+        self.assertFalse(daily_logs.exists())
+        self.assertListEqual(
+            list(BotLog.objects.order_by("id").values_list("id", flat=True)), kept
+        )
+        self.assertDictEqual(
+            {
+                (summary.month, summary.signal): summary.count
+                for summary in BotLogSummary.objects.filter(bot=self.bot.model)
+            },
+            expected,
+        )
+        self.assertEqual(
+            BotState.objects.get(bot=self.bot.model).decimal_balance_vnd,
+            state.decimal_balance_vnd,
+        )
+        self.assertDictEqual(retention.compact_bot_logs(retention_months=1), {})
+
+        # Rows logged into a month after it was compacted add up to its summary
+        month, signal = next(iter(expected))
+        record = (
+            self.company.record_set.filter(utc_trading_date__gte=month)
+            .order_by("utc_trading_date")
+            .first()
+        )
+        BotLogFactory(bot=self.bot.model, last_updated_record=record, signal=signal)
+        self.assertEqual(retention.compact_month(month), 1)
+        # Writers of the month wait for the compaction's transaction
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT relation::regclass::text FROM pg_locks"
+                " WHERE pid = pg_backend_pid() AND mode = 'ShareRowExclusiveLock'"
+            )
+            self.assertIn(
+                cursor.fetchone()[0],
+                (partitions.partition_name(month), partitions.DEFAULT_PARTITION),
+            )
+        summary = BotLogSummary.objects.get(
+            bot=self.bot.model, month=month, signal=signal
+        )
+        self.assertEqual(summary.count, expected[month, signal] + 1)
+        self.assertLessEqual(summary.first_utc_trading_date, record.utc_trading_date)
+
+        with self.assertRaises(UserWarning):
+            retention.compact_bot_logs(retention_months=0)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.company = seed(records=120, days_from_now=1)
+        self.bots = []
+        for name in ("Jester", "Joker"):
+            bot = TradeBot(
+                name=name,
+                balance_vnd=Decimal(20 * 1000000),
+                company=self.company,
+                fee=Decimal("0.0035"),
+                algorithm=MovingAverage(short_window=5, long_window=20),
+                deploy_date=timezone.now() - timezone.timedelta(days=100),
+            )
+            bot.track()
+            bot.invest(Decimal("1000000.5"))
+            bot.toggle()
+            bot.run()
+            self.bots.append(bot)
+
+    def tearDown(self):
+        for name in ("Jester", "Joker"):
+            for file in glob(str(BASE_DIR / f"thade/trade_bot/logs/{name}_*.txt")):
+                os.remove(file)
+
+    def expected_ids(self, bots) -> list:
+        return list(
+            BotLog.objects.filter(bot__in=[bot.model for bot in bots])
+            .order_by("bot_id", "id")
+            .values_list("id", flat=True)
+        )
+
+    def test_export_csv(self):
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, "bot_logs.csv.gz")
+            stdout = StringIO()
+            call_command(
+                "export_bot_logs",
+                self.bots[1].bid,
+                output=path,
+                chunk_size=7,
+                stdout=stdout,
+            )
+            with gzip.open(path, "rt") as f:
+                rows = list(csv.DictReader(f))
+        self.assertIn(f"exported to {path}", stdout.getvalue())
+        self.assertListEqual(list(rows[0]), list(export.COLUMNS))
+        self.assertListEqual(
+            [int(row["id"]) for row in rows], self.expected_ids(self.bots[1:])
+        )
+        self.assertEqual(rows[1]["signal"], BotLog.Signal.INVEST)
+        self.assertEqual(Decimal(rows[1]["amount_vnd"]), Decimal("1000000.5"))
+        self.assertEqual(rows[1]["bid"], self.bots[1].bid)
+
+        with self.assertRaises(CommandError):
+            call_command("export_bot_logs", "UNKNOWN", output=path)
+
+    def test_export_failure_leaves_no_file(self):
+        def fail(f, *args):
+            f.write(b"half an export")
+            raise RuntimeError("Connection lost")
+
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, "bot_logs.csv.gz")
+            with patch(
+                "thade.management.commands.export_bot_logs.export_bot_logs",
+                side_effect=fail,
+            ), self.assertRaises(RuntimeError):
+                call_command("export_bot_logs", output=path)
+            self.assertListEqual(os.listdir(directory), [])
+
+    def test_export_parquet_and_arrow(self):
+        import pyarrow
+        import pyarrow.parquet
+
+        expected = self.expected_ids(self.bots)
+        for file_format, read in (
+            ("parquet", pyarrow.parquet.read_table),
+            ("arrow", lambda f: pyarrow.ipc.open_stream(f).read_all()),
+        ):
+            f = BytesIO()
+            export.export_bot_logs(f, file_format, chunk_size=50)
+            f.seek(0)
+            table = read(f)
+            self.assertListEqual(table.column("id").to_pylist(), expected)
+            self.assertEqual(table.schema, export._schema())
+            invest = table.slice(1, 1).to_pylist()[0]
+            self.assertEqual(invest["signal"], BotLog.Signal.INVEST)
+            self.assertEqual(invest["amount_vnd"], Decimal("1000000.5"))
+
+        for file_format, chunk_size in (("xlsx", 10), ("parquet", 0)):
+            with self.assertRaises(UserWarning, msg="Raised before exporting"):
+                export.stream_bot_logs(file_format, chunk_size=chunk_size)
+
+    def test_export_view(self):
+        url = reverse("thade:export_bot_logs")
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        self.client.force_login(
+            User.objects.create_user("analyst", password="analyst", is_staff=True)
+        )
+        response = self.client.get(
+            url, {"bid": self.bots[0].bid, "format": "csv.gz", "chunk_size": 10}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn("bot_logs.csv.gz", response["Content-Disposition"])
+        rows = list(
+            csv.DictReader(
+                StringIO(gzip.decompress(b"".join(response.streaming_content)).decode())
+            )
+        )
+        self.assertListEqual(
+            [int(row["id"]) for row in rows], self.expected_ids(self.bots[:1])
+        )
+
+        for params in ({"format": "xlsx"}, {"chunk_size": "0"}, {"bid": "UNKNOWN"}):
+            self.assertEqual(self.client.get(url, params).status_code, 400)
+
+        with patch(
+            "thade.trade_bot.export._pyarrow",
+            side_effect=ImportError("Exporting parquet or arrow requires pyarrow"),
+        ):
+            response = self.client.get(url, {"format": "parquet"})
+        self.assertEqual(response.status_code, 501, "Not the client's fault")
+
+
+class RunnerTests(TransactionTestCase):
+    def setUp(self):
+        from thade.tests.records_fixture import close_records
+
+        self.company = CompanyFactory()
+        for i, close_record in enumerate(close_records):
+            RecordFactory(
+                company=self.company,
+                close_vnd=close_record,
+                utc_trading_date=AWARE_DATETIME.replace(
+                    hour=2, minute=0, second=0, microsecond=0
+                )
+                - timezone.timedelta(days=i),
+            )
+
+    def tearDown(self):
+        for name in ("Jester", "Joker", "Bishop", "Knight"):
+            for file in glob(str(BASE_DIR / f"thade/trade_bot/logs/{name}_*.txt")):
+                os.remove(file)
+
+    def deploy_bots(self, names: list) -> list:
+        bot_ids = []
+        for name in names:
+            bot = TradeBot(
+                name=name,
+                balance_vnd=Decimal(20 * 1000000),
+                company=self.company,
+                fee=Decimal(0.0035),
+                algorithm=MovingAverage(),
+                deploy_date=AWARE_DATETIME - timezone.timedelta(days=300),
+            )
+            bot.track()
+            bot.toggle()
+            bot_ids.append(bot.model.id)
+        return bot_ids
+
+    def test_run_bots_in_worker_processes(self):
+        serial_report = run_bots(self.deploy_bots(["Jester", "Joker"]), workers=0)
+        bot_ids = self.deploy_bots(["Bishop", "Knight"])
+        missing_bot_id = Bot.objects.order_by("id").last().id + 1
+        report = run_bots(
+            bot_ids + [missing_bot_id],
+            workers=2,
+            max_pending=1,
+        )
+
+        self.assertEqual(report.workers, 2)
+        self.assertEqual(len(report.succeeded), 2)
+        self.assertEqual(report.failed[0].bot_id, missing_bot_id)
+        self.assertEqual(
+            report.failed[0].error, "DoesNotExist: Bot matching query does not exist."
+        )
+        for serial_result, result in zip(serial_report.results, report.succeeded):
+            self.assertEqual(result.balance_vnd, serial_result.balance_vnd)
+            self.assertEqual(result.stocks, serial_result.stocks)
+            self.assertEqual(result.control_roi, serial_result.control_roi)
+            self.assertEqual(
+                BotLog.objects.filter(bot_id=result.bot_id).count(),
+                BotLog.objects.filter(bot_id=serial_result.bot_id).count(),
+            )
+        self.assertEqual(report.mean_roi, serial_report.mean_roi)
+        self.assertIsNone(report.instrumentation)
+
+    def test_run_bots_instrumented(self):
+        bot_ids = self.deploy_bots(["Jester", "Joker"])
+        deploy_logs = BotLog.objects.filter(bot_id__in=bot_ids).count()
+        report = run_bots(bot_ids, workers=2, instrumented=True)
+
+        self.assertEqual(len(report.succeeded), 2)
+        for result in report.results:
+            self.assertEqual(result.instrumentation["trade_bot.run"]["calls"], 1)
+        self.assertEqual(report.instrumentation.phases["trade_bot.run"].calls, 2)
+        self.assertEqual(
+            report.instrumentation.phases["trade_bot.log"].rows,
+            BotLog.objects.filter(bot_id__in=bot_ids).count() - deploy_logs,
+        )
@@ -4,12 +4,18 @@ from django.db.models import QuerySet
 
 
 class Algorithm:
+    name = "Algorithm"  # Registered name in thade.trade_bot.registry
+    # Whether action() depends on TRADE_FEE. Bots of a company share the signals of algorithms
+    # with the same str(), and with the same fee unless this is False (see CompanySeries).
+    uses_fee = True
+
     BUY = 0
     SELL = 1
     HOLD = 2
 
     def __init__(self, fee=Decimal(0)):
         self.data = QuerySet()
+        self.end = 0
         self.TRADE_FEE = fee
 
     def set_fee(self, fee: Decimal):
@@ -22,11 +28,32 @@ class Algorithm:
         self.data = data
         self._extract()
 
+    def update_series(self, series, end: int = None):
+        """
+        Feed in-memory records to the algorithm instead of a QuerySet.
+
+        :param series: Records of a company ordered by utc_trading_date (oldest first), or its PriceSeries
+        :param end: Only series[:end] is visible to the algorithm (default: the whole series)
+        """
+        self.data = series
+        self.end = len(series) if end is None else end
+        self._extract()
+
     def compute(self):
         self._extract()
 
     def action(self):
         self.compute()
 
+    def parameters(self) -> dict:
+        """Constructor arguments stored in Bot.algorithm, those left to their defaults can be omitted"""
+        return {}
+
     def __str__(self):
-        return "Algorithm"
+        parameters = self.parameters()
+        if not parameters:
+            return self.name
+        return "{}({})".format(
+            self.name,
+            ",".join(f"{key}={value!r}" for key, value in parameters.items()),
+        )
@@ -0,0 +1,14 @@
+from datetime import datetime
+from typing import NamedTuple
+
+
+class Bar(NamedTuple):
+    """
+    A company's trading day as stepped through by TradeBot's replay: the Record fields
+    the bot reads, without the model instance's state and caches.
+    """
+
+    id: int
+    rid: str
+    utc_trading_date: datetime
+    close_vnd: int
@@ -0,0 +1,42 @@
+from django.db import transaction
+
+from thade.instrumentation import phase
+from thade.models import BotLog, BotState
+
+
+def save_bot_logs(bot_logs: list):
+    """Insert BotLog rows and move their bots' BotState to the latest of them, atomically"""
+    with transaction.atomic():
+        BotLog.objects.bulk_create(bot_logs)
+        latest_logs = {bot_log.bot_id: bot_log for bot_log in bot_logs}
+        for bot_log in latest_logs.values():
+            BotState.from_log(bot_log).save()
+
+
+class BotLogBuffer:
+    def __init__(self, flush_size=256):
+        """
+        Accumulate BotLog rows in memory and write them in bulk.
+
+        :param flush_size: Number of buffered rows that triggers a flush
+        """
+        if flush_size < 1:
+            raise UserWarning(f"flush_size must be a positive integer: {flush_size}")
+        self.flush_size = flush_size
+        self.logs = []
+
+    def add(self, bot_log: BotLog):
+        self.logs.append(bot_log)
+        if len(self.logs) >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        """Insert every buffered row and update the bot's state within a single transaction"""
+        if self.logs:
+            with phase("bot_log.flush") as stats:
+                save_bot_logs(self.logs)
+                stats.rows += len(self.logs)
+            self.logs = []
+
+    def __len__(self):
+        return len(self.logs)
@@ -0,0 +1,85 @@
+from datetime import datetime
+
+import numpy as np
+
+from thade.backtesting.price_cache import load_price_series, to_datetime, to_datetime64
+from thade.instrumentation import phase
+from thade.models import Company, Record
+from thade.trade_bot.Algorithm import Algorithm
+from thade.trade_bot.Bar import Bar
+
+
+def signal_key(algorithm: Algorithm) -> tuple:
+    """Algorithms with the same key compute the same signals on the same prices"""
+    return str(algorithm), algorithm.TRADE_FEE if algorithm.uses_fee else None
+
+
+class CompanySeries:
+    def __init__(self, company: Company):
+        """
+        A company's records loaded once and replayed by every bot trading it.
+        Algorithms only see prices, so each distinct algorithm's signals are computed once
+        and every bot applies its own position and fee logic on top of them.
+
+        :param company: The company to load records of
+        """
+        self.company = company
+        self.bars = []
+        self._records = {}  # index: Record hydrated from bars[index]
+        with phase("company_series.load") as stats:
+            self.prices = load_price_series(company)
+            # Bars are built from the cached columns, a bar per price
+            self.bars = [
+                Bar(int(id), rid.decode(), to_datetime(date), int(close_vnd))
+                for id, rid, date, close_vnd in zip(
+                    self.prices.id,
+                    self.prices.rid,
+                    self.prices.utc_trading_date,
+                    self.prices.close_vnd,
+                )
+            ]
+            if self.bars:
+                # Caught up bots all end on the newest record
+                self.record(len(self.bars) - 1)
+            stats.rows += len(self.bars)
+        self.signals = (
+            {}
+        )  # signal_key(algorithm): (first end, signal per end from first end)
+
+    def record(self, index: int) -> Record:
+        """The Record of bars[index], queried once and shared by the bots"""
+        if index not in self._records:
+            self._records[index] = Record.objects.get(id=self.bars[index].id)
+        return self._records[index]
+
+    def index_of(self, date: datetime) -> int:
+        """Index of the first record traded on or after date"""
+        return int(np.searchsorted(self.prices.utc_trading_date, to_datetime64(date)))
+
+    def _signal(self, algorithm: Algorithm, end: int):
+        try:
+            with phase("algorithm.update"):
+                algorithm.update_series(self.prices, end)
+            with phase("algorithm.action"):
+                return algorithm.action()
+        except UserWarning as e:
+            return e
+
+    def signals_of(self, algorithm: Algorithm, start: int) -> list:
+        """
+        The algorithm's signal once bars[:end] are visible, for every end from start + 2
+        (the bar after bars[start]) to len(bars).
+
+        :param algorithm: Signals are shared by algorithms with the same signal_key
+        :param start: Index of the bot's last_updated_record
+        :return: algorithm.action() per end, or the UserWarning raised instead
+        """
+        key = signal_key(algorithm)
+        first_end, signals = self.signals.get(key, (len(self.bars) + 1, []))
+        if start + 2 < first_end:
+            signals = [
+                self._signal(algorithm, end) for end in range(start + 2, first_end)
+            ] + signals
+            first_end = start + 2
+            self.signals[key] = (first_end, signals)
+        return signals[start + 2 - first_end :]
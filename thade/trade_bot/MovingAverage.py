@@ -1,41 +1,135 @@
+from collections import deque
+
 from django.db.models import QuerySet
 from numpy import mean
 
+from thade.backtesting.price_cache import PriceSeries
 from thade.trade_bot.Algorithm import Algorithm
 
 
 class MovingAverage(Algorithm):
-    def __init__(self):
+    name = "MovingAverage"
+    uses_fee = False
+
+    SHORT_WINDOW = 50
+    LONG_WINDOW = 200
+
+    def __init__(self, short_window=SHORT_WINDOW, long_window=LONG_WINDOW):
+        """
+        BUY while the short moving average of close prices is above the long one, SELL otherwise.
+
+        :param short_window: Length of the short moving average
+        :param long_window: Length of the long moving average, also the records needed to compute a signal
+        """
         super().__init__()
-        self.close_50 = QuerySet()
-        self.close_200 = QuerySet()
-        self.moving_50 = 0
-        self.moving_200 = 0
+        if not 0 < short_window < long_window:
+            raise ValueError(
+                f"Windows must satisfy 0 < short < long: {short_window}, {long_window}"
+            )
+        self.short_window = short_window
+        self.long_window = long_window
+
+        self.close_short = QuerySet()
+        self.close_long = QuerySet()
+        self.moving_short = 0
+        self.moving_long = 0
+
+        # Rolling state used when the algorithm is fed in-memory records
+        self.window = deque(maxlen=long_window)
+        self.sum_short = 0
+        self.sum_long = 0
+        self.streamed = None  # (series, end) the rolling window has consumed
+
+    def warm_up(self, closes):
+        """
+        Reset the rolling windows from historical close prices.
+
+        :param closes: Close prices (VND) ordered by utc_trading_date (oldest first)
+        """
+        self.window.clear()
+        self.sum_short = 0
+        self.sum_long = 0
+        for close in list(closes)[-self.long_window :]:
+            self.push(close)
+
+    def push(self, close: int):
+        """Slide the rolling windows forward by one close price in O(1)"""
+        if len(self.window) >= self.short_window:
+            self.sum_short -= self.window[-self.short_window]
+        if len(self.window) == self.long_window:
+            self.sum_long -= self.window[0]
+        self.window.append(close)
+        self.sum_short += close
+        self.sum_long += close
+
+    def _stream(self):
+        if self.streamed is not None and self.streamed[0] is self.data:
+            if self.streamed[1] == self.end:
+                return
+            if self.streamed[1] == self.end - 1:
+                self.push(self.data[self.end - 1].close_vnd)
+                self.streamed = (self.data, self.end)
+                return
+
+        self.warm_up(
+            record.close_vnd
+            for record in self.data[max(self.end - self.long_window, 0) : self.end]
+        )
+        self.streamed = (self.data, self.end)
 
     def _extract(self):
-        if self.data.count() < 200:
+        if isinstance(self.data, QuerySet):
+            count = self.data.count()
+        elif isinstance(self.data, PriceSeries):
+            # Means are read off the series' shared cumulative sum, nothing to slide
+            count = self.end
+        else:
+            self._stream()
+            count = self.end
+
+        if count < self.long_window:
             raise UserWarning(
-                "Not enough records to compute moving average: {} < 200".format(
-                    self.data.count()
+                "Not enough records to compute moving average: {} < {}".format(
+                    count, self.long_window
                 )
             )
-        else:
+        elif isinstance(self.data, QuerySet):
             self.data = self.data.order_by("-utc_trading_date")
             close_records = self.data.values_list("close_vnd", flat=True)
-            self.close_50 = close_records[:50]
-            self.close_200 = close_records[:200]
+            self.close_short = close_records[: self.short_window]
+            self.close_long = close_records[: self.long_window]
 
     def compute(self):
         super().compute()
-        self.moving_50 = mean(self.close_50)
-        self.moving_200 = mean(self.close_200)
+        if isinstance(self.data, QuerySet):
+            self.moving_short = mean(self.close_short)
+            self.moving_long = mean(self.close_long)
+        elif isinstance(self.data, PriceSeries):
+            cumulative = self.data.cumulative_close_vnd
+            self.moving_short = (
+                int(cumulative[self.end] - cumulative[self.end - self.short_window])
+                / self.short_window
+            )
+            self.moving_long = (
+                int(cumulative[self.end] - cumulative[self.end - self.long_window])
+                / self.long_window
+            )
+        else:
+            self.moving_short = self.sum_short / self.short_window
+            self.moving_long = self.sum_long / self.long_window
 
     def action(self):
         super().action()
-        if self.moving_50 >= self.moving_200:
+        if self.moving_short >= self.moving_long:
             return self.BUY
-        elif self.moving_50 < self.moving_200:
+        elif self.moving_short < self.moving_long:
             return self.SELL
 
-    def __str__(self):
-        return "MovingAverage"
+    def parameters(self) -> dict:
+        # Bots deployed before windows were configurable are stored as plain "MovingAverage"
+        if (self.short_window, self.long_window) == (
+            self.SHORT_WINDOW,
+            self.LONG_WINDOW,
+        ):
+            return {}
+        return {"short_window": self.short_window, "long_window": self.long_window}
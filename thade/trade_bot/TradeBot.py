@@ -1,14 +1,31 @@
 import os
 import warnings
 from decimal import Decimal
+from typing import TYPE_CHECKING
 
+from django.db.models import QuerySet
 from django.utils import timezone
-from faker import Faker
 
 from projectthade.settings import BASE_DIR
-from thade.models import Bot, BotLog, Company, Record
+from thade.instrumentation import phase
+from thade.models import Bot, BotLog, BotState, Company, Record
+from thade.trade_bot import money
 from thade.trade_bot.Algorithm import Algorithm
-from thade.trade_bot.MovingAverage import MovingAverage
+from thade.trade_bot.BotLogBuffer import BotLogBuffer, save_bot_logs
+from thade.trade_bot.registry import load_algorithm
+
+if TYPE_CHECKING:
+    # Pulls NumPy in, imported on the first replay instead
+    from thade.trade_bot.CompanySeries import CompanySeries
+
+# Attributes in VND, converted to fixed-point integers by TradeBot.run(fixed_point=True)
+MONEY_ATTRIBUTES = (
+    "decimal_balance_vnd",
+    "decimal_investment_vnd",
+    "all_time_min_total_vnd",
+    "all_time_max_total_vnd",
+    "control_decimal_balance_vnd",
+)
 
 
 class TradeBot:
@@ -61,6 +78,8 @@ class TradeBot:
         self.algorithm.set_fee(fee)
 
         if self.name is None:
+            from faker import Faker  # Slow to import, only needed for unnamed bots
+
             fake = Faker()
             self.name = fake.first_name()
         elif len(self.name) > 34 or self.name.find(" ") != -1:
@@ -78,6 +97,10 @@ class TradeBot:
         self.control_decimal_balance_vnd = control_decimal_balance_vnd or balance_vnd
         self.control_stocks = control_stocks or stocks
 
+        # Money attributes hold Decimal VND, or fixed-point integers while running with fixed_point
+        self.fixed_point = False
+        self._unit, self._buy_rate, self._sell_rate = 1, 1 + fee, 1 - fee
+
         if last_update_record is None:
             # Get last_updated_record which is the nearest to deployed date
             self.last_updated_record = (
@@ -97,7 +120,8 @@ class TradeBot:
                     )
                 )
         elif (
-            last_update_record.id is None or last_update_record.company != self.company
+            last_update_record.id is None
+            or last_update_record.company_id != self.company.id
         ):
             raise UserWarning(
                 "last_update_record must exists in database and"
@@ -135,7 +159,10 @@ class TradeBot:
             self.is_active = model.is_active
             self.is_tracking = True
 
-        self.log(f"{self.name} is deployed", BotLog.Signal.DEPLOY)
+        self.log_buffer = None
+        if model is None:
+            # A bot rebuilt from its model was deployed already
+            self.log(f"{self.name} is deployed", BotLog.Signal.DEPLOY)
 
     def track(self):
         """
@@ -176,7 +203,7 @@ class TradeBot:
         self.decimal_balance_vnd += balance_vnd
         self.decimal_investment_vnd += balance_vnd
         self.control_decimal_balance_vnd += balance_vnd
-        self.log(f"Invest {balance_vnd} VND", BotLog.Signal.INVEST)
+        self.log(f"Invest {balance_vnd} VND", BotLog.Signal.INVEST, balance_vnd)
 
     def withdraw(self, balance_vnd: int):
         """
@@ -191,7 +218,7 @@ class TradeBot:
             self.decimal_balance_vnd -= balance_vnd
             self.decimal_investment_vnd -= balance_vnd
             self.control_decimal_balance_vnd -= balance_vnd
-            self.log(f"Withdraw {balance_vnd} VND", BotLog.Signal.WITHDRAW)
+            self.log(f"Withdraw {balance_vnd} VND", BotLog.Signal.WITHDRAW, balance_vnd)
         elif balance_vnd > self.decimal_balance_vnd:
             warnings.warn(
                 f"Not enough balance_vnd to withdraw: {balance_vnd} > {self.decimal_balance_vnd}"
@@ -201,31 +228,135 @@ class TradeBot:
                 f"Not enough control_balance_vnd to withdraw: {balance_vnd} > {self.control_decimal_balance_vnd}"
             )
 
-    def run(self):
+    def run(
+        self,
+        replay=True,
+        flush_size=256,
+        company_series: "CompanySeries" = None,
+        fixed_point=False,
+    ):
+        """
+        Catch the bot up from its last_updated_record to the company's newest record.
+
+        :param replay: Load the company's records once and step through them in memory.
+            Set False to query the database for every trading day.
+        :param flush_size: Buffer BotLog rows and bulk insert them every flush_size rows.
+            Set None to insert every row as soon as it is logged.
+        :param company_series: Records and signals shared with other bots of the company
+            (replay only, default: loaded for this bot alone)
+        :param fixed_point: Trade with integer money (see thade.trade_bot.money) instead of Decimal.
+            Saved BotLogs are the same as long as the fee has no more than 6 decimal places.
+        """
         if self.is_active:
-            newest_records = self.company.record_set.order_by(
-                "-utc_trading_date"
-            ).first()
-            while self.last_updated_record != newest_records:
-                # Move to the next record after last_update_record
-                self.last_updated_record = (
+            with phase("trade_bot.run"):
+                if self.is_tracking and flush_size is not None:
+                    self.log_buffer = BotLogBuffer(flush_size)
+                if fixed_point:
+                    self._to_fixed_point()
+                try:
+                    if replay:
+                        if company_series is None:
+                            from thade.trade_bot.CompanySeries import CompanySeries
+
+                            company_series = CompanySeries(self.company)
+                        self._replay(company_series)
+                    else:
+                        self._query_each_day()
+                finally:
+                    if self.log_buffer is not None:
+                        self.log_buffer.flush()
+                        self.log_buffer = None
+                    if fixed_point:
+                        self._to_decimal()
+        else:
+            warnings.warn(
+                "This bot is currently inactive. (Run self.toggle() to active)"
+            )
+
+    def _to_fixed_point(self):
+        for name in MONEY_ATTRIBUTES:
+            setattr(self, name, money.to_fixed(getattr(self, name)))
+        fee = money.to_fixed(self.fee)
+        self._unit, self._buy_rate, self._sell_rate = (
+            money.SCALE,
+            money.SCALE + fee,
+            money.SCALE - fee,
+        )
+        self.fixed_point = True
+
+    def _to_decimal(self):
+        for name in MONEY_ATTRIBUTES:
+            setattr(self, name, money.to_decimal(getattr(self, name)))
+        self._unit, self._buy_rate, self._sell_rate = 1, 1 + self.fee, 1 - self.fee
+        self.fixed_point = False
+
+    def _decimal(self, value) -> Decimal:
+        """A money attribute in VND, converted if it is fixed-point"""
+        return money.to_decimal(value) if self.fixed_point else value
+
+    def _query_each_day(self):
+        newest_records = self.company.record_set.order_by("-utc_trading_date").first()
+        while self.last_updated_record != newest_records:
+            # Move to the next record after last_update_record
+            self.last_updated_record = (
+                self.company.record_set.filter(
+                    utc_trading_date__gt=self.last_updated_record.utc_trading_date
+                )
+                .order_by("-utc_trading_date")
+                .last()
+            )
+
+            # Feed new data to the algorithm
+            self._step(
+                lambda: self.algorithm.update_data(
                     self.company.record_set.filter(
-                        utc_trading_date__gt=self.last_updated_record.utc_trading_date
+                        utc_trading_date__lte=self.last_updated_record.utc_trading_date
                     )
-                    .order_by("-utc_trading_date")
-                    .last()
                 )
+            )
 
-                # Feed new data to the algorithm
+    def _replay(self, company_series: "CompanySeries"):
+        if company_series.company.id != self.company.id:
+            raise UserWarning(
+                f"company_series must belong to the same company as the bot: {company_series.company}"
+            )
+        series = company_series.bars
+        start = company_series.index_of(self.last_updated_record.utc_trading_date)
+        signals = company_series.signals_of(self.algorithm, start)
+        end = start + 1
+        try:
+            for end, signal in zip(range(start + 2, len(series) + 1), signals):
+                # Move to the next bar after last_update_record
+                self.last_updated_record = series[end - 1]
+
+                self._act(signal)
+        finally:
+            if end > start + 1:
+                # Outside the loop, last_updated_record is a Record again
+                self.last_updated_record = company_series.record(end - 1)
+
+    def _step(self, update_algorithm):
+        try:
+            with phase("algorithm.update"):
+                update_algorithm()
+            with phase("algorithm.action"):
+                signal = self.algorithm.action()
+        except UserWarning as e:
+            signal = e
+
+        self._act(signal)
+
+    def _act(self, signal):
+        """Trade on the algorithm's signal, or log the UserWarning it raised instead"""
+        if isinstance(signal, UserWarning):
+            log_str = str(signal)
+            result_signal = BotLog.Signal.ERR
+        else:
+            with phase("trade_bot.action") as stats:
+                stats.rows += 1
                 try:
-                    self.algorithm.update_data(
-                        self.company.record_set.filter(
-                            utc_trading_date__lte=self.last_updated_record.utc_trading_date
-                        )
-                    )
-
                     # BUY, SELL or HOLD?
-                    log_str, result_signal = self.action(self.algorithm.action())
+                    log_str, result_signal = self.action(signal)
 
                     # Update statistics
                     self.statistics()
@@ -233,18 +364,14 @@ class TradeBot:
                     log_str = str(e)
                     result_signal = BotLog.Signal.ERR
 
-                self.log(log_str, result_signal)
-        else:
-            warnings.warn(
-                "This bot is currently inactive. (Run self.toggle() to active)"
-            )
+        self.log(log_str, result_signal)
 
     def action(self, signal: int):
         if signal == Algorithm.BUY:
             buy_cost = (
                 self.last_updated_record.close_vnd
                 * self.stocks_per_trade
-                * (1 + self.fee)
+                * self._buy_rate
             )
             if self.decimal_balance_vnd >= buy_cost:
                 self.decimal_balance_vnd -= buy_cost
@@ -261,7 +388,7 @@ class TradeBot:
                 self.decimal_balance_vnd += (
                     self.last_updated_record.close_vnd
                     * self.stocks_per_trade
-                    * (1 - self.fee)
+                    * self._sell_rate
                 )
                 self.stocks -= self.stocks_per_trade
                 log_str = "SELL {} {}".format(self.stocks_per_trade, self.company.code)
@@ -279,26 +406,50 @@ class TradeBot:
 
         return log_str, result_signal
 
-    def log(self, log_str: str, result_signal: BotLog.Signal):
-        """Log bot's actions out into a txt file if not tracking through Database"""
-        print("=============================")
-        print(log_str)
-        if self.is_tracking:
-            BotLog.objects.create(
-                bot=self.model,
-                last_updated_record=self.last_updated_record,
-                decimal_balance_vnd=self.decimal_balance_vnd,
-                stocks=self.stocks,
-                signal=result_signal,
-                log_str="{}: {}".format(timezone.now(), log_str),
-                decimal_investment_vnd=self.decimal_investment_vnd,
-                all_time_min_total_vnd=self.all_time_min_total_vnd,
-                all_time_max_total_vnd=self.all_time_max_total_vnd,
-                control_decimal_balance_vnd=self.control_decimal_balance_vnd,
-                control_stocks=self.control_stocks,
-            )
-        else:
-            self.write_txt(log_str)
+    def log(
+        self, log_str: str, result_signal: BotLog.Signal, amount_vnd: Decimal = None
+    ):
+        """
+        Log bot's actions out into a txt file if not tracking through Database
+
+        :param log_str: Printed, saved in BotLog.detail for ERR only, the rest is rendered back from columns
+        :param result_signal: BotLog.Signal of the action
+        :param amount_vnd: The Balance invested or withdrawn (VND)
+        """
+        with phase("trade_bot.log") as stats:
+            stats.rows += 1
+            print("=============================")
+            print(log_str)
+            if self.is_tracking:
+                bot_log = BotLog(
+                    bot=self.model,
+                    # A Bar while replaying, only its id is needed
+                    last_updated_record_id=self.last_updated_record.id,
+                    utc_trading_date=self.last_updated_record.utc_trading_date,
+                    decimal_balance_vnd=self._decimal(self.decimal_balance_vnd),
+                    stocks=self.stocks,
+                    signal=result_signal,
+                    decimal_investment_vnd=self._decimal(self.decimal_investment_vnd),
+                    all_time_min_total_vnd=self._decimal(self.all_time_min_total_vnd),
+                    all_time_max_total_vnd=self._decimal(self.all_time_max_total_vnd),
+                    control_decimal_balance_vnd=self._decimal(
+                        self.control_decimal_balance_vnd
+                    ),
+                    control_stocks=self.control_stocks,
+                )
+                if result_signal in BotLog.QUANTITY_SIGNALS:
+                    bot_log.quantity = self.stocks_per_trade
+                    bot_log.price_vnd = self.last_updated_record.close_vnd
+                elif result_signal in BotLog.AMOUNT_SIGNALS:
+                    bot_log.amount_vnd = amount_vnd
+                elif result_signal == BotLog.Signal.ERR:
+                    bot_log.detail = log_str[:128]
+                if self.log_buffer is None:
+                    save_bot_logs([bot_log])
+                else:
+                    self.log_buffer.add(bot_log)
+            else:
+                self.write_txt(log_str)
 
     def write_txt(self, log_str: str):
         with open(
@@ -315,17 +466,17 @@ class TradeBot:
             )
 
     def statistics(self):
-        value_in_stocks = self.last_updated_record.close_vnd * self.stocks
+        value_in_stocks = self.last_updated_record.close_vnd * self.stocks * self._unit
         total = self.decimal_balance_vnd + value_in_stocks
         self.all_time_min_total_vnd = min(self.all_time_min_total_vnd, total)
         self.all_time_max_total_vnd = max(self.all_time_max_total_vnd, total)
 
         buy_stocks = int(
             self.control_decimal_balance_vnd
-            // (self.last_updated_record.close_vnd * (1 + self.fee))
+            // (self.last_updated_record.close_vnd * self._buy_rate)
         )
         self.control_decimal_balance_vnd -= (
-            buy_stocks * self.last_updated_record.close_vnd * (1 + self.fee)
+            buy_stocks * self.last_updated_record.close_vnd * self._buy_rate
         )
         self.control_stocks += buy_stocks
 
@@ -369,32 +520,55 @@ class TradeBot:
         return self.bid
 
 
-def get_trade_bot(bot: Bot):
-    """Get TradeBot object from Bot model"""
-    last_log: BotLog = bot.botlog_set.last()
+def get_trade_bot(bot: Bot, state: BotState = None):
+    """
+    Get TradeBot object from Bot model, without writing to database
 
-    if bot.algorithm == "MovingAverage":
-        bot_algorithm = MovingAverage()
-    elif bot.algorithm == "Algorithm":
-        bot_algorithm = Algorithm()
-    else:
+    :param bot: Bot model, select its company along to save a query
+    :param state: The BotState of the bot with its last_updated_record (default: queried)
+    """
+    if state is None:
+        state = BotState.objects.select_related("last_updated_record").get(bot=bot)
+
+    try:
+        bot_algorithm = load_algorithm(bot.algorithm)
+    except ValueError:
         warnings.warn(f"Unknown algorithm (default to Algorithm()): {bot.algorithm}")
         bot_algorithm = Algorithm()
 
     return TradeBot(
-        balance_vnd=last_log.decimal_balance_vnd,
+        balance_vnd=state.decimal_balance_vnd,
         company=bot.company,
         fee=bot.fee,
         algorithm=bot_algorithm,
         name=bot.name,
-        stocks=last_log.stocks,
+        stocks=state.stocks,
         stocks_per_trade=bot.stocks_per_trade,
         deploy_date=bot.deploy_date,
-        decimal_investment_vnd=last_log.decimal_investment_vnd,
-        all_time_min_total_vnd=last_log.all_time_min_total_vnd,
-        all_time_max_total_vnd=last_log.all_time_max_total_vnd,
-        control_decimal_balance_vnd=last_log.control_decimal_balance_vnd,
-        control_stocks=last_log.control_stocks,
-        last_update_record=last_log.last_updated_record,
+        decimal_investment_vnd=state.decimal_investment_vnd,
+        all_time_min_total_vnd=state.all_time_min_total_vnd,
+        all_time_max_total_vnd=state.all_time_max_total_vnd,
+        control_decimal_balance_vnd=state.control_decimal_balance_vnd,
+        control_stocks=state.control_stocks,
+        last_update_record=state.last_updated_record,
         model=bot,
     )
+
+
+def get_trade_bots(bots) -> list:
+    """
+    Get TradeBot objects from many Bot models in a constant number of queries
+
+    :param bots: Bot queryset (e.g. Bot.objects.filter(is_active=True)), loaded in a single query,
+        or Bot models with their company selected
+    :return: TradeBot of every bot, in the order of bots
+    """
+    if isinstance(bots, QuerySet):
+        bots = list(bots.select_related("company", "state__last_updated_record"))
+        states = {bot.id: bot.state for bot in bots if hasattr(bot, "state")}
+    else:
+        bots = list(bots)
+        states = BotState.objects.select_related("last_updated_record").in_bulk(
+            [bot.id for bot in bots]
+        )
+    return [get_trade_bot(bot, states.get(bot.id)) for bot in bots]
@@ -0,0 +1,182 @@
+import csv
+import gzip
+import io
+from contextlib import contextmanager
+from itertools import islice
+
+from thade.models import BotLog
+
+# Exported column: BotLog field it is read from
+COLUMNS = {
+    "id": "id",
+    "bid": "bot__bid",
+    "utc_trading_date": "utc_trading_date",
+    "signal": "signal",
+    "quantity": "quantity",
+    "price_vnd": "price_vnd",
+    "amount_vnd": "amount_vnd",
+    "detail": "detail",
+    "decimal_balance_vnd": "decimal_balance_vnd",
+    "stocks": "stocks",
+    "decimal_investment_vnd": "decimal_investment_vnd",
+    "all_time_min_total_vnd": "all_time_min_total_vnd",
+    "all_time_max_total_vnd": "all_time_max_total_vnd",
+    "control_decimal_balance_vnd": "control_decimal_balance_vnd",
+    "control_stocks": "control_stocks",
+    "last_updated_record_id": "last_updated_record_id",
+}
+
+# Format: content type. parquet and arrow (IPC stream) need pyarrow
+FORMATS = {
+    "csv.gz": "application/gzip",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+class _Pipe(io.RawIOBase):
+    """Write-only file holding what was written until drained"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("Exporting parquet or arrow requires pyarrow") from None
+    return pyarrow
+
+
+def _schema():
+    pa = _pyarrow()
+    money = pa.decimal128(16, 4)
+    types = {
+        "id": pa.int64(),
+        "bid": pa.string(),
+        "utc_trading_date": pa.timestamp("us", tz="UTC"),
+        "signal": pa.dictionary(pa.int8(), pa.string()),
+        "quantity": pa.int32(),
+        "price_vnd": pa.int32(),
+        "amount_vnd": money,
+        "detail": pa.string(),
+        "decimal_balance_vnd": money,
+        "stocks": pa.int32(),
+        "decimal_investment_vnd": money,
+        "all_time_min_total_vnd": money,
+        "all_time_max_total_vnd": money,
+        "control_decimal_balance_vnd": money,
+        "control_stocks": pa.int32(),
+        "last_updated_record_id": pa.int64(),
+    }
+    return pa.schema([(column, types[column]) for column in COLUMNS])
+
+
+@contextmanager
+def _csv_writer(pipe: _Pipe):
+    with io.TextIOWrapper(
+        gzip.GzipFile(fileobj=pipe, mode="wb"), newline="", write_through=True
+    ) as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        yield writer.writerows
+
+
+@contextmanager
+def _arrow_writer(pipe: _Pipe, file_format: str):
+    pa = _pyarrow()
+    schema = _schema()
+    if file_format == "parquet":
+        import pyarrow.parquet as pq
+
+        writer = pq.ParquetWriter(pipe, schema, compression="zstd")
+    else:
+        writer = pa.ipc.new_stream(
+            pipe, schema, options=pa.ipc.IpcWriteOptions(compression="zstd")
+        )
+
+    def write_rows(rows: list):
+        columns = zip(*rows)
+        writer.write_batch(
+            pa.record_batch(
+                [
+                    pa.array(column, type=field.type)
+                    for column, field in zip(columns, schema)
+                ],
+                schema=schema,
+            )
+        )
+
+    with writer:
+        yield write_rows
+
+
+def stream_bot_logs(file_format="csv.gz", bot_ids=None, chunk_size=10000):
+    """
+    Export BotLogs chunk by chunk through a server-side cursor, in constant memory.
+    Arguments are checked before anything is exported, e.g. before a streamed response starts.
+
+    :param file_format: One of FORMATS
+    :param bot_ids: Primary keys of the bots to export (default: every bot)
+    :param chunk_size: Rows fetched and written at once
+    :return: Generator of the exported bytes, ordered by bot then id
+    """
+    if file_format not in FORMATS:
+        raise UserWarning(f"Unknown export format: {file_format}")
+    if chunk_size < 1:
+        raise UserWarning(f"chunk_size must be a positive integer: {chunk_size}")
+    if file_format != "csv.gz":
+        _pyarrow()
+
+    bot_logs = BotLog.objects.order_by("bot_id", "id")
+    if bot_ids is not None:
+        bot_logs = bot_logs.filter(bot_id__in=list(bot_ids))
+    return _stream(bot_logs, file_format, chunk_size)
+
+
+def _stream(bot_logs, file_format: str, chunk_size: int):
+    rows = bot_logs.values_list(*COLUMNS.values()).iterator(chunk_size=chunk_size)
+
+    pipe = _Pipe()
+    if file_format == "csv.gz":
+        writer = _csv_writer(pipe)
+    else:
+        writer = _arrow_writer(pipe, file_format)
+    with writer as write_rows:
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            write_rows(chunk)
+            yield pipe.drain()
+    yield pipe.drain()
+
+
+def export_bot_logs(f, file_format="csv.gz", bot_ids=None, chunk_size=10000) -> int:
+    """
+    Write BotLogs into a binary file, see stream_bot_logs.
+
+    :return: Bytes written
+    """
+    written = 0
+    for data in stream_bot_logs(file_format, bot_ids, chunk_size):
+        written += f.write(data)
+    return written
@@ -0,0 +1,27 @@
+from decimal import ROUND_HALF_EVEN, Decimal
+
+# Fixed-point money: integer amounts of 1/SCALE VND.
+# Bot.fee is stored with 6 decimal places, so with the same scale prices (whole VND),
+# fees and balances multiply into exact integers: a trade never rounds.
+DECIMAL_PLACES = 6
+SCALE = 10**DECIMAL_PLACES
+
+_QUANTUM = Decimal(1).scaleb(-DECIMAL_PLACES)
+
+
+def to_fixed(value: Decimal) -> int:
+    """
+    Convert VND (or a fee) to fixed-point units.
+    The only lossy step: digits past the 6th decimal place are rounded half to even,
+    the rounding Bot.fee gets when it is saved.
+    """
+    return int(
+        Decimal(value)
+        .quantize(_QUANTUM, rounding=ROUND_HALF_EVEN)
+        .scaleb(DECIMAL_PLACES)
+    )
+
+
+def to_decimal(value: int) -> Decimal:
+    """Convert fixed-point units back to VND, exactly"""
+    return Decimal(value).scaleb(-DECIMAL_PLACES)
@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta, timezone
+
+from django.db import connection, transaction
+
+from thade.models import BotLog
+
+# BotLog is partitioned by range of utc_trading_date (PostgreSQL), one partition per month.
+# Rows of months without their partition land in the default partition until partition_bot_logs.
+TABLE = BotLog._meta.db_table
+DEFAULT_PARTITION = f"{TABLE}_default"
+
+
+def month_of(date: datetime) -> datetime:
+    """First instant of the UTC month of a date"""
+    return date.astimezone(timezone.utc).replace(
+        day=1, hour=0, minute=0, second=0, microsecond=0
+    )
+
+
+def next_month(month: datetime) -> datetime:
+    return month_of(month.replace(day=28) + timedelta(days=4))
+
+
+def partition_name(month: datetime) -> str:
+    return f"{TABLE}_{month:%Y%m}"
+
+
+def partitions() -> list:
+    """Names of BotLog's partitions, the default one included"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits"
+            " JOIN pg_class parent ON parent.oid = pg_inherits.inhparent"
+            " JOIN pg_class child ON child.oid = pg_inherits.inhrelid"
+            " WHERE parent.relname = %s ORDER BY child.relname",
+            [TABLE],
+        )
+        return [name for name, in cursor.fetchall()]
+
+
+def lock_month(month: datetime):
+    """
+    Block writes to the partition of a month (the default one if the month has none)
+    until the end of the current transaction, reads go on.
+
+    :param month: Any date of the month
+    """
+    name = partition_name(month_of(month))
+    if name not in partitions():
+        name = DEFAULT_PARTITION
+    with connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE "{name}" IN SHARE ROW EXCLUSIVE MODE')
+
+
+def create_partition(month: datetime) -> int:
+    """
+    Create the partition of a month and move its rows out of the default partition, atomically.
+
+    :param month: Any date of the month
+    :return: Rows moved from the default partition
+    """
+    start = month_of(month)
+    end = next_month(start)
+    name = partition_name(start)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'CREATE TABLE "{name}" (LIKE "{TABLE}" INCLUDING DEFAULTS)')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM "{DEFAULT_PARTITION}"'
+            " WHERE utc_trading_date >= %s AND utc_trading_date < %s RETURNING *)"
+            f' INSERT INTO "{name}" SELECT * FROM moved',
+            [start, end],
+        )
+        moved = cursor.rowcount
+        cursor.execute(
+            f'ALTER TABLE "{TABLE}" ATTACH PARTITION "{name}"'
+            " FOR VALUES FROM (%s) TO (%s)",
+            [start, end],
+        )
+    return moved
+
+
+def partition_bot_logs(months_ahead=3) -> dict:
+    """
+    Create the missing monthly partitions: those of rows in the default partition,
+    then those of the coming months so that new rows skip the default partition.
+
+    :param months_ahead: Months after the current one to create partitions for
+    :return: {partition name: rows moved from the default partition}
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT DISTINCT date_trunc('month', utc_trading_date AT TIME ZONE 'UTC')"
+            f' FROM "{DEFAULT_PARTITION}"'
+        )
+        months = {month.replace(tzinfo=timezone.utc) for month, in cursor.fetchall()}
+
+    month = month_of(datetime.now(timezone.utc))
+    for _ in range(months_ahead + 1):
+        months.add(month)
+        month = next_month(month)
+
+    existing = set(partitions())
+    created = {}
+    for month in sorted(months):
+        if partition_name(month) not in existing:
+            created[partition_name(month)] = create_partition(month)
+    return created
@@ -0,0 +1,74 @@
+import ast
+from importlib import import_module
+from threading import Lock
+
+from projectthade.settings import TRADE_BOT
+from thade.trade_bot.Algorithm import Algorithm
+
+# Bot.algorithm name: dotted path of the class. Modules are only imported once a bot uses them
+ALGORITHMS = {
+    "Algorithm": "thade.trade_bot.Algorithm.Algorithm",
+    "MovingAverage": "thade.trade_bot.MovingAverage.MovingAverage",
+    **(TRADE_BOT.get("ALGORITHMS") or {}),
+}
+
+_classes = {}
+_classes_lock = Lock()
+
+
+def register(name: str, path: str):
+    """
+    Make an algorithm loadable by get_trade_bot without importing it.
+
+    :param name: The class' name attribute, which str(algorithm) starts with
+    :param path: Dotted path of the class, e.g. "thade.trade_bot.MovingAverage.MovingAverage"
+    """
+    with _classes_lock:
+        ALGORITHMS[name] = path
+        _classes.pop(name, None)
+
+
+def get_algorithm_class(name: str) -> type:
+    """Import a registered algorithm on first use"""
+    with _classes_lock:
+        if name not in _classes:
+            try:
+                module_path, class_name = ALGORITHMS[name].rsplit(".", 1)
+            except KeyError:
+                raise ValueError(f"Unregistered algorithm: {name}") from None
+            _classes[name] = getattr(import_module(module_path), class_name)
+        return _classes[name]
+
+
+def parse_algorithm(value: str) -> tuple:
+    """
+    Split str(algorithm) into its name and constructor arguments
+
+    :param value: "Name" or "Name(arg, ..., key=arg, ...)" with literal arguments
+    :return: (name, args, kwargs)
+    """
+    try:
+        call = ast.parse(value, mode="eval").body
+        if isinstance(call, ast.Name):
+            return call.id, [], {}
+        if isinstance(call, ast.Call) and isinstance(call.func, ast.Name):
+            return (
+                call.func.id,
+                [ast.literal_eval(arg) for arg in call.args],
+                {
+                    keyword.arg: ast.literal_eval(keyword.value)
+                    for keyword in call.keywords
+                },
+            )
+    except (SyntaxError, ValueError):
+        pass
+    raise ValueError(f"Malformed algorithm: {value}")
+
+
+def load_algorithm(value: str) -> Algorithm:
+    """Create the algorithm stored in Bot.algorithm, raises ValueError if it can't be created"""
+    name, args, kwargs = parse_algorithm(value)
+    try:
+        return get_algorithm_class(name)(*args, **kwargs)
+    except TypeError as e:
+        raise ValueError(f"Invalid arguments of {name}: {e}") from None
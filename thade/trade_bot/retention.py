@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta, timezone
+
+from django.db import transaction
+from django.db.models import Count, Max, Min
+
+from projectthade.settings import TRADE_BOT
+from thade.models import BotLog, BotLogSummary
+from thade.trade_bot.partitions import lock_month, month_of, next_month
+
+# Daily rows of days without a trade, rolled up into BotLogSummary once out of retention.
+# Trades, investments, withdrawals and deployments are kept for good.
+COMPACTED_SIGNALS = (BotLog.Signal.HOLD, BotLog.Signal.NOT_BUY, BotLog.Signal.NOT_SELL)
+
+# Months of trading days whose daily rows are kept as they are
+RETENTION_MONTHS = TRADE_BOT.get("BOT_LOG_RETENTION_MONTHS", 12)
+
+
+def compact_month(month: datetime) -> int:
+    """
+    Roll the daily rows of a month up into BotLogSummary, one row per bot and signal.
+
+    :param month: Any date of the month
+    :return: BotLog rows deleted
+    """
+    start = month_of(month)
+    daily_logs = BotLog.objects.filter(
+        utc_trading_date__gte=start,
+        utc_trading_date__lt=next_month(start),
+        signal__in=COMPACTED_SIGNALS,
+    )
+    with transaction.atomic():
+        # Rows logged between the roll up and the delete would be deleted without being counted
+        lock_month(start)
+        summaries = {
+            (summary.bot_id, summary.signal): summary
+            for summary in BotLogSummary.objects.select_for_update().filter(month=start)
+        }
+        new_summaries = []
+        for group in daily_logs.values("bot_id", "signal").annotate(
+            count=Count("id"),
+            first=Min("utc_trading_date"),
+            last=Max("utc_trading_date"),
+        ):
+            summary = summaries.get((group["bot_id"], group["signal"]))
+            if summary is None:
+                new_summaries.append(
+                    BotLogSummary(
+                        bot_id=group["bot_id"],
+                        month=start,
+                        signal=group["signal"],
+                        count=group["count"],
+                        first_utc_trading_date=group["first"],
+                        last_utc_trading_date=group["last"],
+                    )
+                )
+            else:
+                # Rows logged after the month was compacted, e.g. by a late deployed bot
+                summary.count += group["count"]
+                summary.first_utc_trading_date = min(
+                    summary.first_utc_trading_date, group["first"]
+                )
+                summary.last_utc_trading_date = max(
+                    summary.last_utc_trading_date, group["last"]
+                )
+        BotLogSummary.objects.bulk_create(new_summaries)
+        BotLogSummary.objects.bulk_update(
+            summaries.values(),
+            ["count", "first_utc_trading_date", "last_utc_trading_date"],
+        )
+        deleted, _ = daily_logs.delete()
+    return deleted
+
+
+def compact_bot_logs(retention_months: int = None) -> dict:
+    """
+    Compact the months of trading days older than the retention, one transaction per month.
+
+    :param retention_months: Months kept as they are, the current one included
+        (default: TRADE_BOT.BOT_LOG_RETENTION_MONTHS, 12)
+    :return: {month: BotLog rows deleted}
+    """
+    if retention_months is None:
+        retention_months = RETENTION_MONTHS
+    if retention_months < 1:
+        raise UserWarning(
+            f"retention_months must be a positive integer: {retention_months}"
+        )
+
+    cutoff = month_of(datetime.now(timezone.utc))
+    for _ in range(retention_months - 1):
+        cutoff = month_of(cutoff - timedelta(days=1))
+
+    oldest = BotLog.objects.filter(
+        utc_trading_date__lt=cutoff, signal__in=COMPACTED_SIGNALS
+    ).aggregate(oldest=Min("utc_trading_date"))["oldest"]
+    deleted = {}
+    month = month_of(oldest) if oldest is not None else cutoff
+    while month < cutoff:
+        deleted[month] = compact_month(month)
+        month = next_month(month)
+    return deleted
@@ -0,0 +1,296 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import nullcontext
+from decimal import Decimal
+from time import monotonic
+
+import django
+from django.db import connections
+
+from thade.instrumentation import Instrumentation, instrument
+from thade.models import Bot
+from thade.trade_bot.TradeBot import TradeBot, get_trade_bot
+
+
+class BotResult:
+    def __init__(
+        self,
+        bot_id: int,
+        bid: str = None,
+        seconds: float = 0.0,
+        error: str = None,
+        investment_vnd: Decimal = None,
+        balance_vnd: Decimal = None,
+        stocks: int = None,
+        control_balance_vnd: Decimal = None,
+        control_stocks: int = None,
+        close_vnd: int = None,
+        statistics: str = None,
+        instrumentation: dict = None,
+    ):
+        """
+        Outcome of running a bot in a worker process, sent back to the parent.
+
+        :param bot_id: Primary key of the bot's model
+        :param bid: The bot's bid (None if its model could not be loaded)
+        :param seconds: Time spent loading and running the bot
+        :param error: "ExceptionType: message" if the run failed
+        :param investment_vnd: Total investment put into the bot
+        :param balance_vnd: Balance after the run
+        :param stocks: Held stocks after the run
+        :param control_balance_vnd: BUY and HOLD balance after the run
+        :param control_stocks: BUY and HOLD stocks after the run
+        :param close_vnd: Close price of the bot's last_updated_record
+        :param statistics: TradeBot.output_statistics()
+        :param instrumentation: Instrumentation.report() of loading and running the bot, if instrumented
+        """
+        self.bot_id = bot_id
+        self.bid = bid
+        self.seconds = seconds
+        self.error = error
+        self.investment_vnd = investment_vnd
+        self.balance_vnd = balance_vnd
+        self.stocks = stocks
+        self.control_balance_vnd = control_balance_vnd
+        self.control_stocks = control_stocks
+        self.close_vnd = close_vnd
+        self.statistics = statistics
+        self.instrumentation = instrumentation
+
+    @classmethod
+    def from_trade_bot(cls, bot_id: int, bot: TradeBot, seconds: float):
+        return cls(
+            bot_id,
+            bid=bot.bid,
+            seconds=seconds,
+            investment_vnd=bot.decimal_investment_vnd,
+            balance_vnd=bot.decimal_balance_vnd,
+            stocks=bot.stocks,
+            control_balance_vnd=bot.control_decimal_balance_vnd,
+            control_stocks=bot.control_stocks,
+            close_vnd=bot.last_updated_record.close_vnd,
+            statistics=bot.output_statistics(),
+        )
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    @property
+    def total_vnd(self) -> Decimal:
+        return self.balance_vnd + self.close_vnd * self.stocks
+
+    @property
+    def control_total_vnd(self) -> Decimal:
+        return self.control_balance_vnd + self.close_vnd * self.control_stocks
+
+    @property
+    def roi(self) -> Decimal:
+        return (self.total_vnd / self.investment_vnd - 1) * 100
+
+    @property
+    def control_roi(self) -> Decimal:
+        return (self.control_total_vnd / self.investment_vnd - 1) * 100
+
+
+class RunReport:
+    def __init__(self, results: list, seconds: float, workers: int):
+        """
+        Aggregated results of run_bots.
+
+        :param results: BotResult of every bot, in the order the bots were given
+        :param seconds: Wall time of the whole run
+        :param workers: Worker processes used (0: the bots ran in the calling process)
+        """
+        self.results = results
+        self.seconds = seconds
+        self.workers = workers
+
+    @property
+    def instrumentation(self) -> Instrumentation:
+        """Phases of every instrumented bot added up (None if the bots were not instrumented)"""
+        reports = [
+            result.instrumentation
+            for result in self.results
+            if result.instrumentation is not None
+        ]
+        if not reports:
+            return None
+        instrumentation = Instrumentation()
+        for report in reports:
+            instrumentation.merge(report)
+        return instrumentation
+
+    @property
+    def succeeded(self) -> list:
+        return [result for result in self.results if result.ok]
+
+    @property
+    def failed(self) -> list:
+        return [result for result in self.results if not result.ok]
+
+    @property
+    def mean_roi(self) -> Decimal:
+        succeeded = self.succeeded
+        if not succeeded:
+            return None
+        return sum(result.roi for result in succeeded) / len(succeeded)
+
+    @property
+    def mean_control_roi(self) -> Decimal:
+        succeeded = self.succeeded
+        if not succeeded:
+            return None
+        return sum(result.control_roi for result in succeeded) / len(succeeded)
+
+    def __str__(self):
+        output_str = "{} bot(s) ran in {:.2f}s on {} worker(s): {} succeeded, {} failed\n".format(
+            len(self.results),
+            self.seconds,
+            self.workers,
+            len(self.succeeded),
+            len(self.failed),
+        )
+        if self.succeeded:
+            output_str += "{:15}: {:.2f}%\n".format("Mean ROI", self.mean_roi)
+            output_str += "{:15}: {:.2f}%\n".format(
+                "Mean control ROI", self.mean_control_roi
+            )
+        for result in self.failed:
+            output_str += "{:15}: {}\n".format(
+                result.bid or f"Bot {result.bot_id}", result.error
+            )
+        return output_str
+
+
+def init_worker():
+    """Set up Django in a worker process of a ProcessPoolExecutor"""
+    # No-op when the worker is forked from an already set up parent
+    django.setup()
+
+
+def run_company_bots(
+    bot_ids: list, flush_size=256, fixed_point=False, instrumented=False
+) -> list:
+    """
+    Load bots of the same company from database and catch them up on a single CompanySeries,
+    in whichever process calls it.
+
+    :param bot_ids: Primary keys of the bots' models
+    :param flush_size: Passed to TradeBot.run
+    :param fixed_point: Passed to TradeBot.run
+    :param instrumented: Report the phases of every bot in its BotResult (see thade.instrumentation)
+    :return: BotResult of every bot, in the order of bot_ids
+    """
+    from thade.trade_bot.CompanySeries import CompanySeries  # Imports NumPy
+
+    bot_models = Bot.objects.select_related(
+        "company", "state__last_updated_record"
+    ).in_bulk(bot_ids)
+    company_series = None
+    results = []
+    for bot_id in bot_ids:
+        started = monotonic()
+        bot_model = bot_models.get(bot_id)
+        if bot_model is None:
+            results.append(
+                BotResult(
+                    bot_id, error="DoesNotExist: Bot matching query does not exist."
+                )
+            )
+            continue
+
+        with instrument() if instrumented else nullcontext() as instrumentation:
+            try:
+                bot = get_trade_bot(bot_model, getattr(bot_model, "state", None))
+                if company_series is None:
+                    company_series = CompanySeries(bot_model.company)
+                bot.run(
+                    flush_size=flush_size,
+                    company_series=company_series,
+                    fixed_point=fixed_point,
+                )
+            except Exception as e:
+                result = BotResult(
+                    bot_id,
+                    bid=bot_model.bid,
+                    seconds=monotonic() - started,
+                    error=f"{type(e).__name__}: {e}",
+                )
+            else:
+                result = BotResult.from_trade_bot(bot_id, bot, monotonic() - started)
+        if instrumentation is not None:
+            result.instrumentation = instrumentation.report()
+        results.append(result)
+    return results
+
+
+def run_bots(
+    bot_ids,
+    workers: int = None,
+    max_pending: int = None,
+    flush_size=256,
+    fixed_point=False,
+    instrumented=False,
+):
+    """
+    Run bots across a pool of worker processes, each with its own database connection.
+    Bots of the same company run in the same worker on a shared CompanySeries.
+
+    :param bot_ids: Primary keys of the bots' models
+    :param workers: Worker processes (default: number of CPUs). Set 0 to run the bots one by one in this process
+    :param max_pending: Companies handed to the pool at once (default: 2 * workers), bounds memory with many bots
+    :param flush_size: Passed to TradeBot.run
+    :param fixed_point: Passed to TradeBot.run
+    :param instrumented: Passed to run_company_bots, phases add up in RunReport.instrumentation
+    :return: RunReport of the bots, in the order of bot_ids
+    """
+    started = monotonic()
+    bot_ids = list(bot_ids)
+
+    # Missing bots are grouped under None and reported by run_company_bots
+    company_ids = dict(
+        Bot.objects.filter(id__in=bot_ids).values_list("id", "company_id")
+    )
+    groups = {}
+    for bot_id in bot_ids:
+        groups.setdefault(company_ids.get(bot_id), []).append(bot_id)
+
+    results = {}
+    if workers == 0:
+        for group in groups.values():
+            for result in run_company_bots(
+                group, flush_size, fixed_point, instrumented
+            ):
+                results[result.bot_id] = result
+        return RunReport(
+            [results[bot_id] for bot_id in bot_ids], monotonic() - started, workers
+        )
+
+    workers = workers or os.cpu_count()
+    max_pending = max_pending or 2 * workers
+
+    # Forked workers must not inherit and share the parent's connections
+    connections.close_all()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+        pending = set()
+        for group in groups.values():
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for result in future.result():
+                        results[result.bot_id] = result
+            pending.add(
+                executor.submit(
+                    run_company_bots, group, flush_size, fixed_point, instrumented
+                )
+            )
+
+        for future in wait(pending).done:
+            for result in future.result():
+                results[result.bot_id] = result
+
+    return RunReport(
+        [results[bot_id] for bot_id in bot_ids], monotonic() - started, workers
+    )
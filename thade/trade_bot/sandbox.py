@@ -1,25 +1,32 @@
 from decimal import Decimal
 from multiprocessing import Process
-from threading import Thread
 from time import sleep
 
 from django.utils import timezone
 
 from thade.backtesting.scrape_stock import fetch_records, update_records
+from thade.instrumentation import Instrumentation
 from thade.models import Bot, Company
 from thade.trade_bot.MovingAverage import MovingAverage
-from thade.trade_bot.TradeBot import TradeBot, get_trade_bot
-
-
-def run_bot(bot: TradeBot):
-    bot.run()
+from thade.trade_bot.runner import RunReport, run_bots
+from thade.trade_bot.TradeBot import TradeBot
 
 
 def update_bot_records(code: str):
     update_records(code)
 
 
-def run_demo_bots(balance_vnd=Decimal(20 * 1000000), days=365):
+def write_metrics(report: RunReport, path: str):
+    """Print the phases of instrumented bots and save them as Prometheus metrics"""
+    instrumentation = report.instrumentation or Instrumentation()
+    print(instrumentation)
+    with open(path, "w") as f:
+        f.write(instrumentation.prometheus())
+
+
+def run_demo_bots(
+    balance_vnd=Decimal(20 * 1000000), days=365, workers=None, metrics=None
+):
     codes = ["MWG", "MSN", "VJC", "VHM", "NVL", "VIC", "VCB", "FPT"]
     bots = []
 
@@ -50,23 +57,21 @@ def run_demo_bots(balance_vnd=Decimal(20 * 1000000), days=365):
         bots.append(bot)
 
     print("+====================================+")
-    threads_run = []
 
     # Run TradeBots
-    for bot in bots:
-        t = Thread(target=run_bot, kwargs={"bot": bot})
-        threads_run.append(t)
-        t.start()
-
-    for t in threads_run:
-        t.join()
-
-    for bot in bots:
-        print(bot.output_statistics())
+    report = run_bots(
+        [bot.model.id for bot in bots],
+        workers=workers,
+        instrumented=metrics is not None,
+    )
+    for result in report.results:
+        print(result.statistics or result.error)
+    print(report)
+    if metrics is not None:
+        write_metrics(report, metrics)
 
 
-def run_active_demo_bots(update=False):
-    bots = []
+def run_active_demo_bots(update=False, workers=None, metrics=None):
     active_bots_queryset = Bot.objects.filter(is_active=True)
 
     # Update active TradeBots' company records
@@ -83,19 +88,16 @@ def run_active_demo_bots(update=False):
         for p in processes_update:
             p.join()
 
-    threads_run = []
-    for bot_model in active_bots_queryset:
-        bot = get_trade_bot(bot_model)
-        bots.append(bot)
-        t = Thread(target=run_bot, kwargs={"bot": bot})
-        threads_run.append(t)
-        t.start()
-
-    for t in threads_run:
-        t.join()
-
-    for bot in bots:
-        print(bot.output_statistics())
+    report = run_bots(
+        active_bots_queryset.values_list("id", flat=True),
+        workers=workers,
+        instrumented=metrics is not None,
+    )
+    for result in report.results:
+        print(result.statistics or result.error)
+    print(report)
+    if metrics is not None:
+        write_metrics(report, metrics)
 
 
 def run_a_demo_bot():
@@ -108,5 +110,5 @@ def run_a_demo_bot():
     )
     bot.track()
     bot.toggle()
-    run_bot(bot)
+    bot.run()
     bot.output_statistics()
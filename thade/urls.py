@@ -0,0 +1,9 @@
+from django.urls import path
+
+from thade import views
+
+app_name = "thade"
+
+urlpatterns = [
+    path("bot_logs/export", views.export_bot_logs, name="export_bot_logs"),
+]
@@ -1,3 +1,43 @@
-from django.shortcuts import render
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
+from django.views.decorators.http import require_GET
 
-# Create your views here.
+from thade.models import Bot
+from thade.trade_bot.export import FORMATS, stream_bot_logs
+
+
+@staff_member_required
+@require_GET
+def export_bot_logs(request):
+    """
+    Stream BotLogs as they are exported, see thade.trade_bot.export.
+
+    Query parameters: format (default: csv.gz), bid (repeatable, default: all bots), chunk_size
+    """
+    file_format = request.GET.get("format", "csv.gz")
+    try:
+        chunk_size = int(request.GET.get("chunk_size", 10000))
+    except ValueError:
+        return HttpResponseBadRequest("chunk_size must be an integer")
+
+    bot_ids = None
+    bids = request.GET.getlist("bid")
+    if bids:
+        bot_ids = list(Bot.objects.filter(bid__in=bids).values_list("id", flat=True))
+        if len(bot_ids) != len(set(bids)):
+            return HttpResponseBadRequest("Unknown bots")
+
+    # Invalid arguments raise here, not once the 200 response is streaming
+    try:
+        content = stream_bot_logs(file_format, bot_ids, chunk_size)
+    except UserWarning as e:
+        return HttpResponseBadRequest(str(e))
+    except ImportError as e:
+        # The request is fine, the server is missing pyarrow
+        return HttpResponse(
+            f"Export format unavailable on this server: {e}", status=501
+        )
+
+    response = StreamingHttpResponse(content, content_type=FORMATS[file_format])
+    response["Content-Disposition"] = f'attachment; filename="bot_logs.{file_format}"'
+    return response